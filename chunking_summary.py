@@ -1,7 +1,7 @@
-import json
 import pandas as pd
 from collections import defaultdict
 import logging
+from modules.chunking.chunk_io import iter_chunks
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -9,12 +9,11 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 # Load phrase and fragment chunks
 def load_chunks(path):
     logging.info(f"Loading chunks from {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)["chunks"]
+    return list(iter_chunks(path))
 
-phrase_data = load_chunks("data/processed_chunks/phrases.json")
-fragment_data = load_chunks("data/processed_chunks/fragments.json")
-line_data = load_chunks("data/processed_chunks/lines.json")
+phrase_data = load_chunks("data/processed_chunks/phrases.jsonl")
+fragment_data = load_chunks("data/processed_chunks/fragments.jsonl")
+line_data = load_chunks("data/processed_chunks/lines.jsonl")
 
 logging.info("Calculating fragment stats...")
 fragment_lengths = [chunk["word_count"] for chunk in fragment_data]
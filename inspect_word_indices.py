@@ -1,5 +1,5 @@
-import json
 import spacy
+from modules.chunking.chunk_io import iter_chunks
 
 def _tokenize_line_spacy(text):
     """Tokenize the line as done in line_chunker.py (excluding punctuation and spaces, no merging)."""
@@ -7,10 +7,8 @@ def _tokenize_line_spacy(text):
     tokens = [token.text for token in doc if not token.is_space and not token.is_punct]
     return tokens
 
-def load_lines(path="data/processed_chunks/lines.json"):
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        return data["chunks"]
+def load_lines(path="data/processed_chunks/lines.jsonl"):
+    return list(iter_chunks(path))
 
 def find_line(chunks, title, act, scene, line):
     for chunk in chunks:
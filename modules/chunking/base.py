@@ -9,6 +9,8 @@ import json
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional, Union
 
+from .chunk_io import write_chunks
+
 
 class ChunkBase(ABC):
     """Base class for all text chunkers in the Shakespeare AI project.
@@ -81,10 +83,10 @@ class ChunkBase(ABC):
         return raw_chunks
     
     def save_chunks(self, output_path: str) -> None:
-        """Save processed chunks to a JSON file.
+        """Save processed chunks to a JSON file, or as JSONL with an offset index for a .jsonl path.
         
         Args:
-            output_path (str): Path where the JSON file will be saved
+            output_path (str): Path where the file will be saved
             
         Raises:
             ValueError: If no chunks have been processed
@@ -92,6 +94,10 @@ class ChunkBase(ABC):
         if not self.chunks:
             raise ValueError("No chunks to save. Process a text first.")
         
+        if output_path.endswith(".jsonl"):
+            write_chunks(self.chunks, output_path, self.chunk_type)
+            return
+        
         # Ensure directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
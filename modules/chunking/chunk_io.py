@@ -0,0 +1,285 @@
+"""
+Streaming chunk files for the chunking pipeline.
+
+Chunks are stored as JSONL, one chunk per line, next to a sidecar index
+that maps each chunk_id and (title, act, scene, line) location to the byte
+offset of its line. Readers stream the file instead of loading a whole
+{"chunks": [...]} document, and look single chunks up through the index.
+Legacy JSON chunk documents can still be read.
+
+Both files are written under temporary names and renamed into place on
+close. The index records the size and mtime of the data file it
+describes; an index that does not match its data file is ignored and
+rebuilt by scanning.
+"""
+import os
+import json
+import threading
+from collections.abc import Sequence
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from modules.utils.logger import CustomLogger
+
+INDEX_SUFFIX = ".index.json"
+TMP_SUFFIX = ".tmp"
+
+LocationKey = Tuple[str, str, str, str]
+
+
+def index_path(path: str) -> str:
+    """Sidecar index of a JSONL chunk file (lines.jsonl -> lines.index.json)."""
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def resolve_chunk_path(path: str) -> str:
+    """
+    The chunk file to read for a path given with either extension.
+
+    Prefers the JSONL file, then a legacy JSON document of the same name;
+    if neither exists the path is returned unchanged.
+    """
+    base = os.path.splitext(path)[0]
+    for candidate in (base + ".jsonl", base + ".json"):
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+
+def _location_value(value: Any) -> str:
+    """None, "" and "null" are the same missing act or scene, as in the validator."""
+    return "" if value is None or value == "" or value == "null" else str(value)
+
+
+def location_key(title: Any, act: Any, scene: Any, line: Any) -> LocationKey:
+    return str(title), _location_value(act), _location_value(scene), str(line)
+
+
+class ChunkWriter:
+    """
+    Append-only JSONL chunk writer that builds the sidecar index as it goes.
+
+    Only the index (ids, offsets and locations) is kept in memory. Chunks
+    go to a temporary file; close() writes the index and renames both into
+    place, so readers never see a new data file with an old index. An
+    exception inside a with block discards the partial output instead.
+    """
+
+    def __init__(self, path: str, chunk_type: str):
+        self.path = path
+        self.chunk_type = chunk_type
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._tmp_path = path + TMP_SUFFIX
+        self._file: Optional[BinaryIO] = open(self._tmp_path, 'wb')
+        self._offset = 0
+        self.ids: List[str] = []
+        self.offsets: List[int] = []
+        self._titles: Dict[str, int] = {}
+        self.locations: List[List[Any]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def write(self, chunks: Iterable[Dict[str, Any]]) -> None:
+        for chunk in chunks:
+            encoded = json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n"
+            self._file.write(encoded)
+            self.ids.append(chunk["chunk_id"])
+            self.offsets.append(self._offset)
+            title, act, scene, line = location_key(
+                chunk.get("title", ""), chunk.get("act"), chunk.get("scene"), chunk.get("line")
+            )
+            self.locations.append([self._titles.setdefault(title, len(self._titles)), act, scene, line])
+            self._offset += len(encoded)
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        # The rename keeps the mtime, so the stat taken here matches the final data file
+        stat = os.stat(self._tmp_path)
+        tmp_index_path = index_path(self.path) + TMP_SUFFIX
+        with open(tmp_index_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "chunk_type": self.chunk_type,
+                "total_chunks": self.count,
+                "data_size": stat.st_size,
+                "data_mtime_ns": stat.st_mtime_ns,
+                "ids": self.ids,
+                "offsets": self.offsets,
+                "titles": list(self._titles),
+                "locations": self.locations,
+            }, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(self._tmp_path, self.path)
+        os.replace(tmp_index_path, index_path(self.path))
+
+    def abort(self) -> None:
+        """Discard what was written; the previous chunk file, if any, is left in place."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class ChunkFile(Sequence):
+    """
+    Read-only view of a JSONL chunk file.
+
+    Iterating streams the file one chunk at a time; indexing, get and
+    find_line seek to a single chunk through the sidecar index, which is
+    loaded on first use. A missing index, or one written for another
+    version of the data file, is rebuilt by scanning the file. The file
+    is opened together with the index, so seeks always read the version
+    the index describes.
+    """
+
+    def __init__(self, path: str, logger: Optional[CustomLogger] = None):
+        self.path = path
+        self.logger = logger or CustomLogger("ChunkFile")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Missing chunk file: {path}")
+        self._index: Optional[Dict[str, Any]] = None
+        self._row_of: Optional[Dict[str, int]] = None
+        self._line_rows: Optional[Dict[LocationKey, int]] = None
+        self._handle: Optional[BinaryIO] = None
+        self._lock = threading.RLock()
+
+    @property
+    def index(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._index is None:
+                self._handle = open(self.path, 'rb')
+                self._index = self._load_index(os.fstat(self._handle.fileno()))
+            return self._index
+
+    def _load_index(self, stat: os.stat_result) -> Dict[str, Any]:
+        if not os.path.exists(index_path(self.path)):
+            self.logger.warning(f"⚠️ No index for {self.path}; scanning the file to build one")
+            return self._scan_index()
+        with open(index_path(self.path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("data_size") != stat.st_size or index.get("data_mtime_ns") != stat.st_mtime_ns:
+            self.logger.warning(f"⚠️ Index of {self.path} does not match the file; scanning the file to rebuild it")
+            return self._scan_index()
+        return index
+
+    def _scan_index(self) -> Dict[str, Any]:
+        """Index the file behind the open handle, even if self.path has been replaced since."""
+        ids, offsets, locations, titles = [], [], [], {}
+        offset = 0
+        self._handle.seek(0)
+        for raw in self._handle:
+            if raw.strip():
+                chunk = json.loads(raw)
+                title, act, scene, line = location_key(
+                    chunk.get("title", ""), chunk.get("act"), chunk.get("scene"), chunk.get("line")
+                )
+                ids.append(chunk["chunk_id"])
+                offsets.append(offset)
+                locations.append([titles.setdefault(title, len(titles)), act, scene, line])
+            offset += len(raw)
+        return {"ids": ids, "offsets": offsets, "titles": list(titles), "locations": locations}
+
+    @property
+    def ids(self) -> List[str]:
+        return self.index["ids"]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for raw in f:
+                if raw.strip():
+                    yield json.loads(raw)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._read_row(row) for row in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(f"Chunk row {item} out of range for {self.path}")
+        return self._read_row(item)
+
+    def _read_row(self, row: int) -> Dict[str, Any]:
+        with self._lock:
+            offset = self.index["offsets"][row]
+            self._handle.seek(offset)
+            return json.loads(self._handle.readline())
+
+    def get(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        """Chunk with this id, or None."""
+        if self._row_of is None:
+            self._row_of = {cid: row for row, cid in enumerate(self.ids)}
+        row = self._row_of.get(chunk_id)
+        return self._read_row(row) if row is not None else None
+
+    def find_line(self, title: str, act: Any, scene: Any, line: Any) -> Optional[Dict[str, Any]]:
+        """
+        First chunk at a title/act/scene/line location, or None.
+
+        Missing act or scene values (None, "", "null") match each other.
+        """
+        if self._line_rows is None:
+            titles = self.index["titles"]
+            self._line_rows = {}
+            for row, (title_code, row_act, row_scene, row_line) in enumerate(self.index["locations"]):
+                self._line_rows.setdefault((titles[title_code], row_act, row_scene, row_line), row)
+        row = self._line_rows.get(location_key(title, act, scene, line))
+        return self._read_row(row) if row is not None else None
+
+    def close(self) -> None:
+        """Release the file; the next lookup reopens it and reloads the index."""
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+            self._index = None
+            self._row_of = None
+            self._line_rows = None
+
+
+def iter_chunks(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the chunks of a JSONL chunk file, or of a legacy JSON document."""
+    path = resolve_chunk_path(path)
+    if path.endswith(".jsonl"):
+        yield from ChunkFile(path)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from json.load(f).get("chunks", [])
+
+
+def open_chunks(path: str, logger: Optional[CustomLogger] = None) -> "Sequence[Dict[str, Any]]":
+    """
+    Chunks of a file as a sequence: a streaming ChunkFile for JSONL, a list for legacy JSON.
+    """
+    path = resolve_chunk_path(path)
+    if path.endswith(".jsonl"):
+        return ChunkFile(path, logger=logger)
+    return list(iter_chunks(path))
+
+
+def write_chunks(chunks: Iterable[Dict[str, Any]], path: str, chunk_type: str) -> int:
+    """
+    Write chunks as JSONL with their sidecar index.
+
+    Returns:
+        Number of chunks written
+    """
+    with ChunkWriter(path, chunk_type) as writer:
+        writer.write(chunks)
+    return writer.count
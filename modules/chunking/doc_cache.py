@@ -0,0 +1,93 @@
+"""
+Shared spaCy parse cache for the chunking pipeline.
+
+The line pass stores each line's parsed Doc keyed by its chunk_id, so the
+phrase and fragment chunkers can reuse those parses instead of running the
+pipeline over the same text again.
+"""
+import os
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from modules.utils.logger import CustomLogger
+
+DEFAULT_DOC_CACHE_PATH = "data/processed_chunks/line_docs"
+DOCS_FILE = "docs.spacy"
+IDS_FILE = "ids.json"
+
+# Everything the chunkers read: token text and spacing, POS tags and the dependency tree
+DOC_ATTRS = ["ORTH", "SPACY", "TAG", "POS", "HEAD", "DEP", "SENT_START"]
+
+
+class DocCache:
+    """
+    Parsed line Docs keyed by line chunk_id, saved as a spaCy DocBin.
+
+    Docs are only deserialized on load; lookups return them directly.
+    """
+
+    def __init__(self, logger: Optional[CustomLogger] = None):
+        self.logger = logger or CustomLogger("DocCache")
+        self._docs: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, chunk_id: str, doc: Any) -> None:
+        self._docs[chunk_id] = doc
+
+    def clear(self) -> None:
+        self._docs.clear()
+
+    def get(self, chunk_id: str, text: Optional[str] = None, needs_parse: bool = False) -> Optional[Any]:
+        """
+        Cached Doc for a line chunk, or None.
+
+        Args:
+            chunk_id: Line chunk id
+            text: If given, the Doc is only returned when it was parsed from exactly this text
+            needs_parse: Only return Docs carrying a dependency parse
+        """
+        doc = self._docs.get(chunk_id)
+        if doc is None or (text is not None and doc.text != text):
+            return None
+        if needs_parse and not doc.has_annotation("DEP"):
+            return None
+        return doc
+
+    def save(self, path: str = DEFAULT_DOC_CACHE_PATH) -> str:
+        from spacy.tokens import DocBin
+
+        os.makedirs(path, exist_ok=True)
+        ids: List[str] = list(self._docs)
+        doc_bin = DocBin(attrs=DOC_ATTRS)
+        for chunk_id in ids:
+            doc_bin.add(self._docs[chunk_id])
+        doc_bin.to_disk(os.path.join(path, DOCS_FILE))
+        with open(os.path.join(path, IDS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(ids, f)
+        self.logger.info(f"Saved {len(ids)} parsed lines to {path}")
+        return path
+
+    @classmethod
+    def load(cls, vocab: Any, path: str = DEFAULT_DOC_CACHE_PATH, logger: Optional[CustomLogger] = None) -> "DocCache":
+        """Load a saved cache; vocab is the loaded pipeline's (nlp.vocab)."""
+        from spacy.tokens import DocBin
+
+        cache = cls(logger=logger)
+        start = time.time()
+        with open(os.path.join(path, IDS_FILE), 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+        docs = DocBin().from_disk(os.path.join(path, DOCS_FILE)).get_docs(vocab)
+        for chunk_id, doc in zip(ids, docs):
+            cache.add(chunk_id, doc)
+        cache.logger.info(f"Loaded {len(cache)} parsed lines from {path} in {time.time() - start:.2f}s")
+        return cache
+
+
+def load_doc_cache(vocab: Any, path: str = DEFAULT_DOC_CACHE_PATH, logger: Optional[CustomLogger] = None) -> Optional[DocCache]:
+    """Load the cache at path if one was saved there, else None."""
+    if not os.path.exists(os.path.join(path, IDS_FILE)):
+        return None
+    return DocCache.load(vocab, path, logger=logger)
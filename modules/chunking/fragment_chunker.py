@@ -7,6 +7,8 @@ fragments (3-8 words) based on semantic groupings, preserving metadata.
 import re
 from typing import List, Dict, Any, Optional
 from .base import ChunkBase
+from .doc_cache import DocCache
+from .text_utils import count_syllables, normalize_quotes
 from modules.utils.logger import CustomLogger
 
 try:
@@ -27,10 +29,18 @@ class FragmentChunker(ChunkBase):
     preserving references to the parent line and avoiding overlap.
     """
 
-    def __init__(self, min_words: int = 3, max_words: int = 8, logger: Optional[CustomLogger] = None):
+    def __init__(
+        self,
+        min_words: int = 3,
+        max_words: int = 8,
+        logger: Optional[CustomLogger] = None,
+        doc_cache: Optional[DocCache] = None
+    ):
         super().__init__(chunk_type='fragment')
         self.logger = logger or CustomLogger("FragmentChunker")
         self.logger.info("Initializing FragmentChunker")
+        # Line parses from the line pass; lines missing from it (or cached without a parse) are parsed here
+        self.doc_cache = doc_cache
 
         self.min_words = min_words
         self.max_words = max_words
@@ -42,28 +52,10 @@ class FragmentChunker(ChunkBase):
 
     def _normalize_quotes(self, line: str) -> str:
         """Replace curly quotes/apostrophes with plain ASCII."""
-        replacements = {
-            "\u2018": "'",
-            "\u2019": "'",
-            "\u201C": '"',
-            "\u201D": '"',
-        }
-        for old, new in replacements.items():
-            line = line.replace(old, new)
-        return line
+        return normalize_quotes(line)
 
     def _count_syllables(self, word: str) -> int:
-        # Skip if it's punctuation or doesn't contain at least one letter
-        if not any(c.isalpha() for c in word):
-            return 0
-
-        word = word.lower()
-        if len(word) <= 3:
-            return 1
-        if word.endswith('e'):
-            word = word[:-1]
-        vowels = re.findall(r'[aeiouy]+', word)
-        return max(1, len(vowels))
+        return count_syllables(word)
 
     def _process_line_with_spacy(self, line: str) -> List[Any]:
         """Process a line with spaCy, excluding punctuation and whitespace."""
@@ -100,8 +92,13 @@ class FragmentChunker(ChunkBase):
             # Normalize the text
             line_text = self._normalize_quotes(line_text)
 
-            # Process the full line with spaCy
-            line_doc = nlp(line_text) if SPACY_AVAILABLE else None
+            # Process the full line with spaCy, reusing the line pass's parse when there is one
+            line_doc = None
+            if SPACY_AVAILABLE:
+                if self.doc_cache is not None:
+                    line_doc = self.doc_cache.get(line_id, text=line_text, needs_parse=True)
+                if line_doc is None:
+                    line_doc = nlp(line_text)
             
             # Get tokens without punctuation and whitespace
             if SPACY_AVAILABLE and line_doc:
@@ -8,9 +8,11 @@ We can therefore reference, for example, "line 28 of Act II, Scene II, in Macbet
 import re
 import time
 import os
-import json
-from typing import List, Dict, Any, Tuple, Optional
+from typing import Iterator, List, Dict, Any, Tuple, Optional
 from .base import ChunkBase
+from .doc_cache import DEFAULT_DOC_CACHE_PATH, DocCache
+from .chunk_io import write_chunks
+from .text_utils import count_syllables, normalize_quotes
 from modules.utils.logger import CustomLogger
 
 try:
@@ -23,27 +25,81 @@ try:
 except ImportError:
     SPACY_AVAILABLE = False
 
-def _normalize_quotes(line: str) -> str:
-    """Replace curly quotes/apostrophes with plain ASCII."""
-    replacements = {
-        "\u2018": "'",
-        "\u2019": "'",
-        "\u201C": '"',
-        "\u201D": '"',
-    }
-    for old, new in replacements.items():
-        line = line.replace(old, new)
-    return line
+# (chunk number, title, line in scene, act, scene, normalized text) from the structural pass
+LocatedLine = Tuple[int, str, int, Optional[str], Optional[str], str]
+
+# Known Shakespeare titles (use uppercase for matching); each starts a new work
+SHAKESPEARE_TITLES = frozenset({
+    "THE SONNETS",
+    "ALL'S WELL THAT ENDS WELL",
+    "THE TRAGEDY OF ANTONY AND CLEOPATRA",
+    "AS YOU LIKE IT",
+    "THE COMEDY OF ERRORS",
+    "THE TRAGEDY OF CORIOLANUS",
+    "CYMBELINE",
+    "THE TRAGEDY OF HAMLET, PRINCE OF DENMARK",
+    "THE FIRST PART OF KING HENRY THE FOURTH",
+    "THE SECOND PART OF KING HENRY THE FOURTH",
+    "THE LIFE OF KING HENRY THE FIFTH",
+    "THE FIRST PART OF HENRY THE SIXTH",
+    "THE SECOND PART OF KING HENRY THE SIXTH",
+    "THE THIRD PART OF KING HENRY THE SIXTH",
+    "KING HENRY THE EIGHTH",
+    "THE LIFE AND DEATH OF KING JOHN",
+    "THE TRAGEDY OF JULIUS CAESAR",
+    "THE TRAGEDY OF KING LEAR",
+    "LOVE'S LABOUR'S LOST",
+    "THE TRAGEDY OF MACBETH",
+    "MEASURE FOR MEASURE",
+    "THE MERCHANT OF VENICE",
+    "THE MERRY WIVES OF WINDSOR",
+    "A MIDSUMMER NIGHT'S DREAM",
+    "MUCH ADO ABOUT NOTHING",
+    "THE TRAGEDY OF OTHELLO, THE MOOR OF VENICE",
+    "PERICLES, PRINCE OF TYRE",
+    "KING RICHARD THE SECOND",
+    "KING RICHARD THE THIRD",
+    "THE TRAGEDY OF ROMEO AND JULIET",
+    "THE TAMING OF THE SHREW",
+    "THE TEMPEST",
+    "THE LIFE OF TIMON OF ATHENS",
+    "THE TRAGEDY OF TITUS ANDRONICUS",
+    "TROILUS AND CRESSIDA",
+    "TWELFTH NIGHT; OR, WHAT YOU WILL",
+    "THE TWO GENTLEMEN OF VERONA",
+    "THE TWO NOBLE KINSMEN",
+    "A WINTER'S TALE",
+    "A LOVER'S COMPLAINT",
+    "THE PASSIONATE PILGRIM",
+    "THE PHOENIX AND THE TURTLE",
+    "THE RAPE OF LUCRECE",
+    "VENUS AND ADONIS"
+})
+
+DEFAULT_PIPE_BATCH_SIZE = 1000
+# Only tokens and POS tags are used; skipping these components makes tagging several times faster
+UNUSED_PIPES = ("parser", "ner", "lemmatizer")
 
 class LineChunker(ChunkBase):
     """Chunker for processing Shakespeare's text into full lines,
     resetting line numbering at each new scene (and new play title).
     """
     
-    def __init__(self, logger: Optional[CustomLogger] = None):
+    def __init__(
+        self,
+        logger: Optional[CustomLogger] = None,
+        batch_size: int = DEFAULT_PIPE_BATCH_SIZE,
+        n_process: int = 1,
+        doc_cache: Optional[DocCache] = None
+    ):
         super().__init__(chunk_type='line')
         self.logger = logger or CustomLogger("LineChunker")
         self.logger.info("Initializing LineChunker")
+        # Passed to nlp.pipe for the tagging pass; n_process > 1 tags in worker processes
+        self.batch_size = batch_size
+        self.n_process = n_process
+        # When set, each line's parse is kept for the phrase and fragment chunkers
+        self.doc_cache = doc_cache
         
         if not SPACY_AVAILABLE:
             self.logger.warning("spaCy is not available - using fallback tokenization")
@@ -59,53 +115,7 @@ class LineChunker(ChunkBase):
         # All-caps lines
         self.all_caps_pattern = re.compile(r'^[A-Z\s.,;:!?]+$')
         
-        # Known Shakespeare titles (use uppercase for matching).
-        self.shakespeare_titles = {
-            "THE SONNETS",
-            "ALL'S WELL THAT ENDS WELL",
-            "THE TRAGEDY OF ANTONY AND CLEOPATRA",
-            "AS YOU LIKE IT",
-            "THE COMEDY OF ERRORS",
-            "THE TRAGEDY OF CORIOLANUS",
-            "CYMBELINE",
-            "THE TRAGEDY OF HAMLET, PRINCE OF DENMARK",
-            "THE FIRST PART OF KING HENRY THE FOURTH",
-            "THE SECOND PART OF KING HENRY THE FOURTH",
-            "THE LIFE OF KING HENRY THE FIFTH",
-            "THE FIRST PART OF HENRY THE SIXTH",
-            "THE SECOND PART OF KING HENRY THE SIXTH",
-            "THE THIRD PART OF KING HENRY THE SIXTH",
-            "KING HENRY THE EIGHTH",
-            "THE LIFE AND DEATH OF KING JOHN",
-            "THE TRAGEDY OF JULIUS CAESAR",
-            "THE TRAGEDY OF KING LEAR",
-            "LOVE'S LABOUR'S LOST",
-            "THE TRAGEDY OF MACBETH",
-            "MEASURE FOR MEASURE",
-            "THE MERCHANT OF VENICE",
-            "THE MERRY WIVES OF WINDSOR",
-            "A MIDSUMMER NIGHT'S DREAM",
-            "MUCH ADO ABOUT NOTHING",
-            "THE TRAGEDY OF OTHELLO, THE MOOR OF VENICE",
-            "PERICLES, PRINCE OF TYRE",
-            "KING RICHARD THE SECOND",
-            "KING RICHARD THE THIRD",
-            "THE TRAGEDY OF ROMEO AND JULIET",
-            "THE TAMING OF THE SHREW",
-            "THE TEMPEST",
-            "THE LIFE OF TIMON OF ATHENS",
-            "THE TRAGEDY OF TITUS ANDRONICUS",
-            "TROILUS AND CRESSIDA",
-            "TWELFTH NIGHT; OR, WHAT YOU WILL",
-            "THE TWO GENTLEMEN OF VERONA",
-            "THE TWO NOBLE KINSMEN",
-            "A WINTER'S TALE",
-            "A LOVER'S COMPLAINT",
-            "THE PASSIONATE PILGRIM",
-            "THE PHOENIX AND THE TURTLE",
-            "THE RAPE OF LUCRECE",
-            "VENUS AND ADONIS"
-        }
+        self.shakespeare_titles = set(SHAKESPEARE_TITLES)
         
         # Track detected titles, acts, and scenes for validation
         self.titles_detected = set()
@@ -115,17 +125,7 @@ class LineChunker(ChunkBase):
         self.logger.debug("Compiled regular expressions for text parsing")
     
     def _count_syllables(self, word: str) -> int:
-        # Skip if it's punctuation or doesn't contain at least one letter
-        if not any(c.isalpha() for c in word):
-            return 0
-
-        word = word.lower()
-        if len(word) <= 3:
-            return 1
-        if word.endswith('e'):
-            word = word[:-1]
-        vowels = re.findall(r'[aeiouy]+', word)
-        return max(1, len(vowels))
+        return count_syllables(word)
     
     def _process_line_with_spacy(self, line: str) -> Tuple[List[str], List[str], int]:
         """Use spaCy for tokenization/POS, excluding punctuation and whitespace."""
@@ -145,6 +145,37 @@ class LineChunker(ChunkBase):
             pos_tags = [""] * len(words)
             return words, pos_tags, len(words)
     
+    def _fallback_tokens(self, line: str) -> Tuple[List[str], List[str], int]:
+        words = re.findall(r"\b\w[\w']*\b", line)
+        return words, [""] * len(words), len(words)
+
+    def _process_lines_with_spacy(self, lines: List[str]) -> Iterator[Tuple[List[str], List[str], int, Any]]:
+        """
+        Tokenize and tag many lines in batches with nlp.pipe, yielding results in input order.
+
+        Same output per line as _process_line_with_spacy, plus the line's Doc
+        (None without spaCy). The parser only runs when a doc cache is
+        kept, since the fragment chunker needs the dependency tree. If the
+        batched run fails, the remaining lines are processed one at a time.
+        """
+        if not SPACY_AVAILABLE:
+            for line in lines:
+                yield self._fallback_tokens(line) + (None,)
+            return
+
+        unused = [name for name in UNUSED_PIPES if not (name == "parser" and self.doc_cache is not None)]
+        disable = [name for name in unused if name in nlp.pipe_names]
+        done = 0
+        try:
+            for doc in nlp.pipe(lines, batch_size=self.batch_size, n_process=self.n_process, disable=disable):
+                tokens = [token for token in doc if not token.is_punct and not token.is_space]
+                done += 1
+                yield [token.text for token in tokens], [token.pos_ for token in tokens], len(tokens), doc
+        except Exception as e:
+            self.logger.error(f"spaCy batch error after {done} lines: {e}")
+            for line in lines[done:]:
+                yield self._process_line_with_spacy(line) + (None,)
+
     def _is_structural_line(self, line: str) -> bool:
         """Check if line is an act/scene line or all-caps structural text."""
         if self.act_pattern.match(line):
@@ -155,11 +186,15 @@ class LineChunker(ChunkBase):
             return True
         return False
     
-    def chunk_text(self, text: str) -> List[Dict[str, Any]]:
-        start_time = time.time()
-        self.logger.info("Starting text chunking process")
-        self.logger.debug(f"Input text length: {len(text)} chars")
-        
+    def locate_lines(self, text: str) -> List[LocatedLine]:
+        """
+        Structural pass: find the spoken lines and their title/act/scene/line numbers.
+
+        Also resets and fills the detection tracking used by the summary.
+
+        Returns:
+            (chunk number, title, line in scene, act, scene, normalized text) per spoken line
+        """
         lines = text.split('\n')
         self.logger.debug(f"Split text into {len(lines)} raw lines")
         
@@ -173,7 +208,7 @@ class LineChunker(ChunkBase):
         # We'll keep a separate line index that resets each time we detect a new scene or new title
         scene_line_index = 0
         
-        chunks = []
+        located: List[LocatedLine] = []
         
         # Reset tracking dictionaries for validation
         self.titles_detected = set()
@@ -186,7 +221,7 @@ class LineChunker(ChunkBase):
                 continue
             
             # Normalize quotes
-            line = _normalize_quotes(line)
+            line = normalize_quotes(line)
             
             # Check if line matches a known Shakespeare title (in uppercase)
             if line.upper() in self.shakespeare_titles:
@@ -260,24 +295,6 @@ class LineChunker(ChunkBase):
             chunk_counter += 1
             scene_line_index += 1
             
-            words, pos_tags, word_count = self._process_line_with_spacy(line)
-            total_syllables = sum(self._count_syllables(w) for w in words)
-            
-            chunk = {
-                "chunk_id": f"chunk_{chunk_counter}",
-                "title": current_title,
-                # This 'line' is the line number within the current scene
-                "line": scene_line_index,  
-                "act": current_act,
-                "scene": current_scene,
-                "text": line,
-                "word_index": f"0,{word_count - 1}",
-                "syllables": total_syllables,
-                "POS": pos_tags,
-                "mood": "neutral",
-                "word_count": word_count
-            }
-            
             # Log warning for incomplete metadata
             if current_act is None or current_scene is None:
                 self.logger.warning(
@@ -285,11 +302,52 @@ class LineChunker(ChunkBase):
                     f"act={current_act}, scene={current_scene}, line={scene_line_index}: {line[:50]}..."
                 )
             
-            chunks.append(chunk)
-            self.logger.debug(
-                f"Created chunk_{chunk_counter} for title='{current_title}', "
-                f"Act={current_act}, Scene={current_scene}, line_in_scene={scene_line_index}"
-            )
+            located.append((chunk_counter, current_title, scene_line_index, current_act, current_scene, line))
+        
+        return located
+
+    def build_chunk(self, entry: LocatedLine, words: List[str], pos_tags: List[str], word_count: int) -> Dict[str, Any]:
+        """Line chunk for a located line from its tokens and POS tags."""
+        counter, title, line_number, act, scene, line = entry
+        total_syllables = sum(self._count_syllables(w) for w in words)
+        
+        chunk = {
+            "chunk_id": f"chunk_{counter}",
+            "title": title,
+            # This 'line' is the line number within the current scene
+            "line": line_number,  
+            "act": act,
+            "scene": scene,
+            "text": line,
+            "word_index": f"0,{word_count - 1}",
+            "syllables": total_syllables,
+            "POS": pos_tags,
+            "mood": "neutral",
+            "word_count": word_count
+        }
+        self.logger.debug(
+            f"Created chunk_{counter} for title='{title}', "
+            f"Act={act}, Scene={scene}, line_in_scene={line_number}"
+        )
+        return chunk
+
+    def chunk_text(self, text: str) -> List[Dict[str, Any]]:
+        start_time = time.time()
+        self.logger.info("Starting text chunking process")
+        self.logger.debug(f"Input text length: {len(text)} chars")
+        
+        # Phase 1: structural pass assigning title/act/scene/line numbers
+        located = self.locate_lines(text)
+        
+        # Phase 2: tokenize and tag all spoken lines in batches, then attach in order
+        structure_time = time.time() - start_time
+        self.logger.info(f"Structural pass found {len(located)} spoken lines in {structure_time:.2f}s")
+        chunks = []
+        analyses = self._process_lines_with_spacy([entry[-1] for entry in located])
+        for entry, (words, pos_tags, word_count, doc) in zip(located, analyses):
+            if self.doc_cache is not None and doc is not None:
+                self.doc_cache.add(f"chunk_{entry[0]}", doc)
+            chunks.append(self.build_chunk(entry, words, pos_tags, word_count))
         
         self.chunks = chunks
         elapsed = time.time() - start_time
@@ -358,11 +416,12 @@ class LineChunker(ChunkBase):
 
 if __name__ == "__main__":
     input_file = "data/processed_texts/complete_shakespeare_ready.txt"
-    output_file = "data/processed_chunks/lines.json"
+    output_file = "data/processed_chunks/lines.jsonl"
     logger = CustomLogger("LineChunkerMain", log_level="INFO")
     
     try:
-        chunker = LineChunker(logger=logger)
+        doc_cache = DocCache(logger=logger) if SPACY_AVAILABLE else None
+        chunker = LineChunker(logger=logger, n_process=max(1, (os.cpu_count() or 1) - 1), doc_cache=doc_cache)
         logger.info(f"Reading input file: {input_file}")
         try:
             with open(input_file, 'r', encoding='utf-8') as f:
@@ -382,13 +441,11 @@ if __name__ == "__main__":
         logger.info(f"Saving chunks to: {output_file}")
         
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'chunk_type': 'line',
-                    'chunks': chunks,
-                    'total_chunks': len(chunks)
-                }, f, indent=2)
+            write_chunks(chunks, output_file, 'line')
             logger.info("Chunks saved successfully!")
+            if doc_cache is not None:
+                # Reused by run_phrase_and_fragment_chunking.py instead of re-parsing every line
+                doc_cache.save(DEFAULT_DOC_CACHE_PATH)
         except Exception as e:
             logger.critical(f"Error saving output file: {str(e)}")
             exit(1)
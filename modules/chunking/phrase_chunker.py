@@ -5,8 +5,10 @@ This module provides functionality to chunk Shakespeare's text into phrases
 based on punctuation breaks, preserving the relationship to parent lines.
 """
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from .base import ChunkBase
+from .doc_cache import DocCache
+from .text_utils import count_syllables, normalize_quotes
 from modules.utils.logger import CustomLogger
 
 try:
@@ -27,10 +29,12 @@ class PhraseChunker(ChunkBase):
     and maintains the relationship to the original line.
     """
 
-    def __init__(self, logger: Optional[CustomLogger] = None):
+    def __init__(self, logger: Optional[CustomLogger] = None, doc_cache: Optional[DocCache] = None):
         super().__init__(chunk_type='phrase')
         self.logger = logger or CustomLogger("PhraseChunker")
         self.logger.info("Initializing PhraseChunker")
+        # Line parses from the line pass; lines missing from it are parsed here
+        self.doc_cache = doc_cache
 
         if not SPACY_AVAILABLE:
             self.logger.warning("spaCy is not available - using fallback tokenization")
@@ -41,28 +45,10 @@ class PhraseChunker(ChunkBase):
 
     def _normalize_quotes(self, line: str) -> str:
         """Replace curly quotes/apostrophes with plain ASCII."""
-        replacements = {
-            "\u2018": "'",
-            "\u2019": "'",
-            "\u201C": '"',
-            "\u201D": '"',
-        }
-        for old, new in replacements.items():
-            line = line.replace(old, new)
-        return line
+        return normalize_quotes(line)
 
     def _count_syllables(self, word: str) -> int:
-        # Skip if it's punctuation or doesn't contain at least one letter
-        if not any(c.isalpha() for c in word):
-            return 0
-
-        word = word.lower()
-        if len(word) <= 3:
-            return 1
-        if word.endswith('e'):
-            word = word[:-1]
-        vowels = re.findall(r'[aeiouy]+', word)
-        return max(1, len(vowels))
+        return count_syllables(word)
 
     def _process_line_with_spacy(self, line: str) -> List[Any]:
         """Process a line with spaCy, excluding punctuation and whitespace."""
@@ -83,6 +69,40 @@ class PhraseChunker(ChunkBase):
             words = re.findall(r"\b\w[\w']*\b", line)
             return words
 
+    def _line_doc(self, line_id: str, line_text: str) -> Any:
+        """The line's Doc from the doc cache, parsing the line only if it is not there."""
+        doc = self.doc_cache.get(line_id, text=line_text) if self.doc_cache is not None else None
+        return doc if doc is not None else nlp(line_text)
+
+    @staticmethod
+    def _slice_phrase(
+        line_doc: Any, line_text: str, phrase: str, cursor: int, word_position: Dict[int, int]
+    ) -> Optional[Tuple[List[str], int, int, int]]:
+        """
+        Words of a phrase and their line word indices, cut from the parent Doc.
+
+        Args:
+            cursor: Character offset in line_text to search for the phrase from
+
+        Returns:
+            (words, start index, end index, cursor after the phrase), or None
+            if the phrase cannot be located
+        """
+        # A trailing comma may have been re-attached after stripping, so search without it
+        body = phrase[:-1] if phrase.endswith(',') else phrase
+        start = line_text.find(body, cursor)
+        if start < 0:
+            return None
+        span = line_doc.char_span(start, start + len(body), alignment_mode="expand")
+        if span is None:
+            return None
+        tokens = [t for t in span if not t.is_punct and not t.is_space]
+        end = start + len(body)
+        if not tokens:
+            return [], -1, -1, end
+        first = word_position[tokens[0].i]
+        return [t.text for t in tokens], first, first + len(tokens) - 1, end
+
     def chunk_from_line_chunks(self, line_chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         self.logger.info("Starting phrase chunking from line chunks")
         self.logger.debug(f"Processing {len(line_chunks)} line chunks")
@@ -96,8 +116,20 @@ class PhraseChunker(ChunkBase):
             # Normalize the text
             line_text = self._normalize_quotes(line_text)
 
+            # Parse the line once (or reuse the line pass's parse); phrases are sliced from it
+            line_doc = None
+            if SPACY_AVAILABLE:
+                try:
+                    line_doc = self._line_doc(line_id, line_text)
+                except Exception as e:
+                    self.logger.error(f"spaCy error: {e}")
+
             # Process line with spaCy and get word tokens (no punctuation/whitespace)
-            tokens = self._process_line_with_spacy(line_text)
+            if line_doc is not None:
+                tokens = [t for t in line_doc if not t.is_punct and not t.is_space]
+                word_position = {t.i: n for n, t in enumerate(tokens)}
+            else:
+                tokens = self._process_line_with_spacy(line_text)
             
             # Get just the text of each token
             if SPACY_AVAILABLE and all(hasattr(t, 'text') for t in tokens):
@@ -135,15 +167,20 @@ class PhraseChunker(ChunkBase):
                             final_phrases.append(cleaned)
 
             used_indices = set()
+            cursor = 0
 
             for phrase_idx, phrase in enumerate(final_phrases):
-                # Process the phrase with spaCy, excluding punctuation/whitespace
-                phrase_tokens = self._process_line_with_spacy(phrase)
-                
-                if SPACY_AVAILABLE and all(hasattr(t, 'text') for t in phrase_tokens):
-                    phrase_words = [t.text for t in phrase_tokens]
+                sliced = self._slice_phrase(line_doc, line_text, phrase, cursor, word_position) if line_doc is not None else None
+                if sliced is not None:
+                    phrase_words, phrase_start, phrase_end, cursor = sliced
                 else:
-                    phrase_words = phrase_tokens
+                    # Process the phrase with spaCy, excluding punctuation/whitespace
+                    phrase_tokens = self._process_line_with_spacy(phrase)
+                    
+                    if SPACY_AVAILABLE and all(hasattr(t, 'text') for t in phrase_tokens):
+                        phrase_words = [t.text for t in phrase_tokens]
+                    else:
+                        phrase_words = phrase_tokens
                 
                 phrase_text = " ".join(phrase_words).strip()
 
@@ -153,20 +190,25 @@ class PhraseChunker(ChunkBase):
                 if not phrase_words:
                     continue
 
-                try:
-                    # Find the first matching slice in token_words
-                    for i in range(len(token_words) - len(phrase_words) + 1):
-                        if token_words[i:i+len(phrase_words)] == phrase_words:
-                            phrase_start = i
-                            phrase_end = i + len(phrase_words) - 1
-                            if any(idx in used_indices for idx in range(phrase_start, phrase_end + 1)):
-                                raise ValueError("Overlapping phrase indices")
-                            break
-                    else:
-                        raise ValueError("Phrase words not aligned")
-                except ValueError:
-                    self.logger.warning(f"Could not align phrase in token list: {phrase_words}")
-                    continue
+                if sliced is not None:
+                    if any(idx in used_indices for idx in range(phrase_start, phrase_end + 1)):
+                        self.logger.warning(f"Could not align phrase in token list: {phrase_words}")
+                        continue
+                else:
+                    try:
+                        # Find the first matching slice in token_words
+                        for i in range(len(token_words) - len(phrase_words) + 1):
+                            if token_words[i:i+len(phrase_words)] == phrase_words:
+                                phrase_start = i
+                                phrase_end = i + len(phrase_words) - 1
+                                if any(idx in used_indices for idx in range(phrase_start, phrase_end + 1)):
+                                    raise ValueError("Overlapping phrase indices")
+                                break
+                        else:
+                            raise ValueError("Phrase words not aligned")
+                    except ValueError:
+                        self.logger.warning(f"Could not align phrase in token list: {phrase_words}")
+                        continue
 
                 phrase_pos_tags = token_pos[phrase_start:phrase_end + 1] if len(token_pos) > phrase_end else []
                 total_syllables = sum(self._count_syllables(str(word)) for word in phrase_words)
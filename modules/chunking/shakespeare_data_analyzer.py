@@ -1,12 +1,13 @@
 # shakespeare_data_analyzer.py
 
-import json
 import os
 import logging
 from collections import defaultdict, Counter
-from typing import Dict, Set, List, Tuple, Any, Optional, Union, DefaultDict
+from typing import Dict, Set, List, Tuple, Any, Optional, Sequence, Union, DefaultDict
 from datetime import datetime
 
+from modules.chunking.chunk_io import open_chunks, resolve_chunk_path
+
 # Define custom type for our work statistics
 WorkStats = Dict[str, Union[Set[str], DefaultDict[str, Set[str]], int, List[Tuple[int, Optional[int], str]]]]
 
@@ -40,22 +41,16 @@ def analyze_shakespeare_data(json_path: str, logger: logging.Logger) -> None:
     Analyze the Shakespeare lines data for metadata issues.
     
     Args:
-        json_path: Path to the lines.json file
+        json_path: Path to the lines file (JSONL, or a legacy lines.json document)
         logger: Logger for output
     """
-    # Load the JSON data
+    # Open the chunk file; JSONL chunks are streamed on each pass rather than held in memory
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data: Dict[str, Any] = json.load(f)
+        chunks: Sequence[Dict[str, Any]] = open_chunks(resolve_chunk_path(json_path))
     except Exception as e:
-        logger.error(f"Error loading JSON file: {e}")
-        return
-    
-    if "chunks" not in data:
-        logger.error("Error: JSON data doesn't contain 'chunks' key")
+        logger.error(f"Error loading chunk file: {e}")
         return
     
-    chunks: List[Dict[str, Any]] = data["chunks"]
     logger.info(f"Total chunks: {len(chunks)}")
     
     # Create data structures to track statistics
@@ -329,7 +324,7 @@ def analyze_shakespeare_data(json_path: str, logger: logging.Logger) -> None:
 from typing import cast
 
 if __name__ == "__main__":
-    lines_json_path = "data/processed_chunks/lines.json"
+    lines_json_path = "data/processed_chunks/lines.jsonl"
     log_file = "shakespeare_data_analysis.log"
     
     logger = setup_logging(log_file)
@@ -0,0 +1,269 @@
+"""
+Sharded chunking driver for Shakespeare AI project.
+
+Splits the cleaned complete-works text at title lines and chunks each work
+in its own worker process (each with its own spaCy pipeline) using the
+single-pass pipeline. Per-work results are cached under the hash of the
+work's text, so re-chunking the corpus only processes works whose text
+changed. The per-work files are then merged in text order with chunk ids
+renumbered to the same global ids a single run over the whole text gives.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import line_chunker as line_chunker_module
+from .line_chunker import DEFAULT_PIPE_BATCH_SIZE, SHAKESPEARE_TITLES
+from .unified_pipeline import DEFAULT_INPUT_PATH, DEFAULT_OUTPUT_DIR, OUTPUT_FILES, UnifiedChunker
+from .chunk_io import ChunkFile, ChunkWriter
+from .text_utils import normalize_quotes
+from modules.utils.logger import CustomLogger
+
+DEFAULT_CACHE_DIR = "data/processed_chunks/work_cache"
+# Bump when the chunkers change what they produce for the same text
+CACHE_VERSION = "1"
+MANIFEST_FILE = "manifest.json"
+
+# chunk_12, phrase_chunk_12_3, fragment_chunk_12_0: the number is the line's global position
+_CHUNK_ID_PATTERN = re.compile(r"^((?:phrase_|fragment_)?chunk_)(\d+)(_\d+)?$")
+
+# One chunker per worker process, created by _init_worker
+_worker_chunker: Optional[UnifiedChunker] = None
+
+
+@dataclass
+class Work:
+    """One work of the complete text: its position, title line and text (title line included)."""
+    ordinal: int
+    title: str
+    text: str
+
+    @property
+    def key(self) -> str:
+        """Cache key: hash of the text and of everything else that decides its chunks."""
+        digest = hashlib.sha256()
+        for part in (CACHE_VERSION, _pipeline_id(), self.text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()[:24]
+
+
+def _pipeline_id() -> str:
+    """The spaCy model in use, since tags and parses depend on it."""
+    if not line_chunker_module.SPACY_AVAILABLE:
+        return "fallback"
+    meta = line_chunker_module.nlp.meta
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+
+def split_works(text: str) -> List[Work]:
+    """
+    Split the complete text before every title line LineChunker recognizes.
+
+    Text before the first title becomes an "Unknown" work. The line chunker
+    resets act, scene and line numbering at each title, so chunking the
+    works separately gives the same chunks as chunking the whole text.
+    """
+    works: List[Work] = []
+    title = "Unknown"
+    current: List[str] = []
+
+    def flush():
+        if any(line.strip() for line in current):
+            works.append(Work(len(works), title, "\n".join(current)))
+
+    for raw_line in text.split("\n"):
+        line = normalize_quotes(raw_line.strip())
+        if line and line.upper() in SHAKESPEARE_TITLES:
+            flush()
+            title, current = line, []
+        current.append(raw_line)
+    flush()
+    return works
+
+
+def shift_chunk_id(chunk_id: str, offset: int) -> str:
+    """Move a line, phrase or fragment id by offset lines (chunk_3 -> chunk_103 for offset 100)."""
+    match = _CHUNK_ID_PATTERN.match(chunk_id)
+    if match is None or not offset:
+        return chunk_id
+    prefix, number, suffix = match.groups()
+    return f"{prefix}{int(number) + offset}{suffix or ''}"
+
+
+def _init_worker(batch_size: int) -> None:
+    global _worker_chunker
+    _worker_chunker = UnifiedChunker(logger=CustomLogger("ShardWorker"), batch_size=batch_size)
+
+
+def _chunk_work(task: Tuple[str, str, str, str, int]) -> Tuple[str, Dict[str, int]]:
+    """
+    Chunk one work into its cache entry (run inside a worker process).
+
+    Args:
+        task: (cache key, title, work text, cache dir, nlp.pipe batch size)
+
+    Returns:
+        (cache key, chunk counts per chunk type)
+    """
+    key, title, text, cache_dir, batch_size = task
+    if _worker_chunker is None:
+        _init_worker(batch_size)
+
+    # Written under a temporary name and renamed, so a crashed run never leaves a half entry
+    final_dir = os.path.join(cache_dir, key)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    writers = {
+        chunk_type: ChunkWriter(os.path.join(tmp_dir, filename), chunk_type)
+        for chunk_type, filename in OUTPUT_FILES.items()
+    }
+    try:
+        counts = _worker_chunker.run(text, writers)
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    for writer in writers.values():
+        writer.close()
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"title": title, "counts": counts}, f, indent=2)
+
+    if os.path.exists(final_dir):
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, final_dir)
+    return key, counts
+
+
+def _cached_counts(cache_dir: str, key: str) -> Optional[Dict[str, int]]:
+    manifest_path = os.path.join(cache_dir, key, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)["counts"]
+
+
+def chunk_sharded(
+    input_path: str = DEFAULT_INPUT_PATH,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_PIPE_BATCH_SIZE,
+    prune: bool = False,
+    logger: Optional[CustomLogger] = None
+) -> Dict[str, Any]:
+    """
+    Chunk the complete text work by work and merge the results into lines/phrases/fragments.jsonl.
+
+    Args:
+        workers: Worker processes for the works that need chunking; 1 runs
+            them in this process. Defaults to one less than the CPU count.
+        prune: Delete cache entries of works that are no longer in the text
+
+    Returns:
+        Stats: works, works chunked, works served from the cache, chunk counts per type
+    """
+    logger = logger or CustomLogger("ShardedChunker")
+    start_time = time.time()
+    logger.info(f"Reading input file: {input_path}")
+    with open(input_path, 'r', encoding='utf-8') as f:
+        works = split_works(f.read())
+    os.makedirs(cache_dir, exist_ok=True)
+
+    keys = [work.key for work in works]
+    counts_by_key: Dict[str, Dict[str, int]] = {}
+    # Works with identical text (repeated title lines, say) are chunked once
+    pending: Dict[str, Work] = {}
+    for work, key in zip(works, keys):
+        if key in counts_by_key or key in pending:
+            continue
+        cached = _cached_counts(cache_dir, key)
+        if cached is not None:
+            counts_by_key[key] = cached
+        else:
+            pending[key] = work
+    logger.info(f"📊 {len(works)} works: {len(pending)} to chunk, the rest unchanged since the last run")
+
+    tasks = [(key, work.title, work.text, cache_dir, batch_size) for key, work in pending.items()]
+    workers = workers or max(1, (os.cpu_count() or 1) - 1)
+    workers = min(workers, len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(batch_size,)) as pool:
+            results = list(pool.map(_chunk_work, tasks))
+    else:
+        results = [_chunk_work(task) for task in tasks]
+    counts_by_key.update(results)
+    for key, work in pending.items():
+        logger.info(f"✅ Chunked '{work.title}': {counts_by_key[key]['line']} lines")
+
+    # Merge in text order; ids are shifted by the number of lines in the works before
+    writers = {
+        chunk_type: ChunkWriter(os.path.join(output_dir, filename), chunk_type)
+        for chunk_type, filename in OUTPUT_FILES.items()
+    }
+    offset = 0
+    try:
+        for key in keys:
+            for chunk_type, filename in OUTPUT_FILES.items():
+                entry = ChunkFile(os.path.join(cache_dir, key, filename), logger=logger)
+                writers[chunk_type].write(_shifted(chunk, offset) for chunk in entry)
+            offset += counts_by_key[key]["line"]
+    except BaseException:
+        # Keep the previous merged files rather than replacing them with partial ones
+        for writer in writers.values():
+            writer.abort()
+        raise
+    for writer in writers.values():
+        writer.close()
+
+    if prune:
+        current = set(keys)
+        stale = [name for name in os.listdir(cache_dir) if name not in current]
+        for name in stale:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        logger.info(f"🧹 Pruned {len(stale)} stale work cache entries")
+
+    stats = {
+        "works": len(works),
+        "chunked": len(pending),
+        "cached": len(works) - sum(1 for key in keys if key in pending),
+        "counts": {chunk_type: writer.count for chunk_type, writer in writers.items()},
+    }
+    logger.info(
+        f"🎉 Sharded chunking done in {time.time() - start_time:.2f}s: {stats['counts']['line']} lines, "
+        f"{stats['counts']['phrase']} phrases, {stats['counts']['fragment']} fragments → {output_dir}"
+    )
+    return stats
+
+
+def _shifted(chunk: Dict[str, Any], offset: int) -> Dict[str, Any]:
+    chunk["chunk_id"] = shift_chunk_id(chunk["chunk_id"], offset)
+    if "source_chunk_id" in chunk:
+        chunk["source_chunk_id"] = shift_chunk_id(chunk["source_chunk_id"], offset)
+    return chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk the complete works one work per process, reusing unchanged works")
+    parser.add_argument("--input", default=DEFAULT_INPUT_PATH, help="Cleaned complete-works text file")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory for the merged chunk files")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Per-work chunk cache")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count - 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_PIPE_BATCH_SIZE, help="Lines per nlp.pipe batch")
+    parser.add_argument("--prune", action="store_true", help="Delete cache entries for works no longer in the text")
+    args = parser.parse_args()
+
+    logger = CustomLogger("ShardedChunkerMain", log_level="INFO")
+    chunk_sharded(args.input, args.output_dir, args.cache_dir, args.workers, args.batch_size, args.prune, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
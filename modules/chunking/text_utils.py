@@ -0,0 +1,38 @@
+"""
+Text helpers shared by the line, phrase and fragment chunkers.
+
+Every level must normalize quotes and count syllables the same way, or
+word indices and syllable counts drift between a line and its phrases and
+fragments. The chunkers' methods delegate here.
+"""
+import re
+from functools import lru_cache
+
+# Curly quotes/apostrophes to plain ASCII
+_QUOTE_TABLE = str.maketrans({
+    "\u2018": "'",
+    "\u2019": "'",
+    "\u201C": '"',
+    "\u201D": '"',
+})
+_VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+
+
+def normalize_quotes(line: str) -> str:
+    """Replace curly quotes/apostrophes with plain ASCII."""
+    return line.translate(_QUOTE_TABLE)
+
+
+@lru_cache(maxsize=65536)
+def count_syllables(word: str) -> int:
+    """Rough syllable count of one word: vowel groups, ignoring a final 'e'; 0 for punctuation."""
+    # Skip if it's punctuation or doesn't contain at least one letter
+    if not any(c.isalpha() for c in word):
+        return 0
+
+    word = word.lower()
+    if len(word) <= 3:
+        return 1
+    if word.endswith('e'):
+        word = word[:-1]
+    return max(1, len(_VOWEL_GROUPS.findall(word)))
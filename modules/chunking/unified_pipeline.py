@@ -0,0 +1,146 @@
+"""
+Single-pass chunking pipeline for Shakespeare AI project.
+
+Reads the cleaned text once and produces the line, phrase and fragment
+chunks together. Spoken lines are tagged and parsed in one nlp.pipe stream;
+each batch of parsed lines is turned into line chunks and immediately cut
+into phrases and fragments from the same Docs, and all three levels are
+appended to their output files as they are produced. Nothing is re-read
+from the lines file and no line is parsed twice.
+"""
+import os
+import time
+import argparse
+from itertools import islice
+from typing import Dict, Optional
+
+from .line_chunker import DEFAULT_PIPE_BATCH_SIZE, LineChunker, SPACY_AVAILABLE
+from .phrase_chunker import PhraseChunker
+from .fragment_chunker import FragmentChunker
+from .doc_cache import DocCache
+from .chunk_io import ChunkWriter
+from modules.utils.logger import CustomLogger
+
+DEFAULT_INPUT_PATH = "data/processed_texts/complete_shakespeare_ready.txt"
+DEFAULT_OUTPUT_DIR = "data/processed_chunks"
+OUTPUT_FILES = {
+    "line": "lines.jsonl",
+    "phrase": "phrases.jsonl",
+    "fragment": "fragments.jsonl",
+}
+
+
+class UnifiedChunker:
+    """Produces lines, phrases and fragments in one traversal of the text."""
+
+    def __init__(
+        self,
+        logger: Optional[CustomLogger] = None,
+        batch_size: int = DEFAULT_PIPE_BATCH_SIZE,
+        n_process: int = 1
+    ):
+        self.logger = logger or CustomLogger("UnifiedChunker")
+        self.batch_size = batch_size
+        # Holds one batch of line parses at a time, shared by the phrase and fragment chunkers
+        self.doc_cache = DocCache(logger=self.logger)
+        self.line_chunker = LineChunker(
+            logger=self.logger, batch_size=batch_size, n_process=n_process, doc_cache=self.doc_cache
+        )
+        self.phrase_chunker = PhraseChunker(logger=self.logger, doc_cache=self.doc_cache)
+        self.fragment_chunker = FragmentChunker(logger=self.logger, doc_cache=self.doc_cache)
+
+    def run(self, text: str, writers: Dict[str, ChunkWriter]) -> Dict[str, int]:
+        """
+        Chunk the text at all three levels, streaming each level to its writer.
+
+        Args:
+            text: Cleaned Shakespeare text
+            writers: Writer per chunk type ("line", "phrase", "fragment")
+
+        Returns:
+            Number of chunks written per chunk type
+        """
+        start_time = time.time()
+        located = self.line_chunker.locate_lines(text)
+        self.logger.info(f"Structural pass found {len(located)} spoken lines in {time.time() - start_time:.2f}s")
+
+        analyses = zip(located, self.line_chunker._process_lines_with_spacy([entry[-1] for entry in located]))
+        while True:
+            batch = list(islice(analyses, self.batch_size))
+            if not batch:
+                break
+            line_chunks = []
+            for entry, (words, pos_tags, word_count, doc) in batch:
+                line_chunk = self.line_chunker.build_chunk(entry, words, pos_tags, word_count)
+                if doc is not None:
+                    self.doc_cache.add(line_chunk["chunk_id"], doc)
+                line_chunks.append(line_chunk)
+
+            writers["line"].write(line_chunks)
+            writers["phrase"].write(self.phrase_chunker.chunk_from_line_chunks(line_chunks))
+            writers["fragment"].write(self.fragment_chunker.chunk_from_line_chunks(line_chunks))
+            self.doc_cache.clear()
+            self.logger.info(f"Chunked {writers['line'].count}/{len(located)} lines")
+
+        counts = {chunk_type: writer.count for chunk_type, writer in writers.items()}
+        self.logger.info(
+            f"✅ Single-pass chunking done in {time.time() - start_time:.2f}s: "
+            f"{counts['line']} lines, {counts['phrase']} phrases, {counts['fragment']} fragments"
+        )
+        self.line_chunker._print_detection_summary()
+        return counts
+
+
+def chunk_file(
+    input_path: str = DEFAULT_INPUT_PATH,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    batch_size: int = DEFAULT_PIPE_BATCH_SIZE,
+    n_process: int = 1,
+    logger: Optional[CustomLogger] = None
+) -> Dict[str, int]:
+    """
+    Read the cleaned text once and write lines.jsonl, phrases.jsonl and fragments.jsonl.
+
+    Returns:
+        Number of chunks written per chunk type
+    """
+    logger = logger or CustomLogger("UnifiedChunker")
+    logger.info(f"Reading input file: {input_path}")
+    with open(input_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    chunker = UnifiedChunker(logger=logger, batch_size=batch_size, n_process=n_process)
+    writers = {
+        chunk_type: ChunkWriter(os.path.join(output_dir, filename), chunk_type)
+        for chunk_type, filename in OUTPUT_FILES.items()
+    }
+    try:
+        counts = chunker.run(text, writers)
+    except BaseException:
+        # Keep the previous chunk files rather than replacing them with partial ones
+        for writer in writers.values():
+            writer.abort()
+        raise
+    for writer in writers.values():
+        writer.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk the cleaned text into lines, phrases and fragments in one pass")
+    parser.add_argument("--input", default=DEFAULT_INPUT_PATH, help="Cleaned text file")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory for the three chunk files")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_PIPE_BATCH_SIZE,
+                        help="Lines per nlp.pipe batch and per write")
+    parser.add_argument("--n-process", type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                        help="spaCy worker processes")
+    args = parser.parse_args()
+
+    logger = CustomLogger("UnifiedChunkerMain", log_level="INFO")
+    if not SPACY_AVAILABLE:
+        logger.warning("spaCy model not available - chunks will use fallback tokenization without POS tags")
+    chunk_file(args.input, args.output_dir, args.batch_size, args.n_process, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
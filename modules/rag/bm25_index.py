@@ -0,0 +1,287 @@
+# modules/rag/bm25_index.py
+
+import os
+import re
+import json
+import time
+import math
+import argparse
+from collections import Counter
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from modules.chunking.chunk_io import iter_chunks
+from modules.rag.dedup import dedupe_chunks
+from modules.rag.filters import SearchConstraints, SessionRowExclusions, combine_row_masks, filter_flags
+from modules.rag.vector_store import QueryResult
+from modules.utils.logger import CustomLogger
+
+DEFAULT_BM25_PATH = "embeddings/bm25"
+CHUNK_PATHS = {
+    "lines": "data/processed_chunks/lines.jsonl",
+    "phrases": "data/processed_chunks/phrases.jsonl",
+    "fragments": "data/processed_chunks/fragments.jsonl",
+}
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+OFFSETS_FILE = "offsets.npy"
+DOC_IDS_FILE = "doc_ids.npy"
+TFS_FILE = "tfs.npy"
+DOC_LENGTHS_FILE = "doc_lengths.npy"
+VOCAB_FILE = "vocab.json"
+ROWS_FILE = "rows.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; apostrophes inside words are kept (e'er, o'er, 'tis -> tis)."""
+    return [token.strip("'") for token in re.findall(r"[a-z0-9']+", text.lower()) if token.strip("'")]
+
+
+def _clean_metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Same metadata VectorStore keeps, so lexical hits look like vector hits."""
+    metadata = {
+        k: v for k, v in chunk.items()
+        if k not in ("text", "embedding", "chunk_id") and isinstance(v, (str, int, float, bool))
+    }
+    metadata.update(filter_flags(chunk))
+    return metadata
+
+
+class BM25Index:
+    """
+    Okapi BM25 over one chunk collection.
+
+    Postings are stored in CSR form: for term t, doc_ids[offsets[t]:offsets[t+1]]
+    are the rows containing it and tfs the matching term frequencies. Arrays
+    are memory-mapped on load; rows.jsonl holds ids, documents and metadata
+    keyed by row.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_BM25_PATH,
+        collection_name: str = "lines",
+        logger: Optional[CustomLogger] = None
+    ):
+        self.logger = logger or CustomLogger("BM25Index")
+        self.collection_name = collection_name
+        self.directory = os.path.join(path, collection_name)
+
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No BM25 index for '{collection_name}' at {self.directory}. "
+                f"Build it with: python -m modules.rag.bm25_index --collection {collection_name}"
+            )
+        start = time.time()
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        with open(os.path.join(self.directory, VOCAB_FILE), 'r', encoding='utf-8') as f:
+            self.vocab: Dict[str, int] = json.load(f)
+
+        self.offsets = np.load(os.path.join(self.directory, OFFSETS_FILE))
+        self.doc_ids = np.load(os.path.join(self.directory, DOC_IDS_FILE), mmap_mode="r")
+        self.tfs = np.load(os.path.join(self.directory, TFS_FILE), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(self.directory, DOC_LENGTHS_FILE)).astype(np.float32)
+        self.k1 = float(self.manifest["k1"])
+        self.b = float(self.manifest["b"])
+        self.avgdl = float(self.manifest["avgdl"])
+        # Per-document length normalization, k1 * (1 - b + b * dl / avgdl), computed once
+        self._length_norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths / max(self.avgdl, 1e-9))
+
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(os.path.join(self.directory, ROWS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                self.ids.append(row["id"])
+                self.documents.append(row["document"])
+                self.metadatas.append(row["metadata"])
+
+        self._row_masks: Dict[SearchConstraints, np.ndarray] = {}
+        self._exclusions: Optional[SessionRowExclusions] = None
+
+        self.logger.info(
+            f"Loaded BM25 index '{collection_name}': {self.count()} docs, "
+            f"{len(self.vocab)} terms in {time.time() - start:.2f}s"
+        )
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _idf(self, df: int) -> float:
+        n = self.count()
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def supports_filters(self) -> bool:
+        return bool(self.metadatas) and "has_propn" in self.metadatas[0]
+
+    def _allowed_rows(self, constraints: Optional[SearchConstraints]) -> Optional[np.ndarray]:
+        if constraints is None or constraints.is_empty():
+            return None
+        mask = self._row_masks.get(constraints)
+        if mask is None:
+            mask = np.fromiter((constraints.matches(m) for m in self.metadatas), dtype=bool, count=self.count())
+            self._row_masks[constraints] = mask
+        return mask
+
+    def _excluded_rows(self, exclude_ids: Optional[AbstractSet[str]]) -> Optional[np.ndarray]:
+        if not exclude_ids and self._exclusions is None:
+            return None
+        if self._exclusions is None:
+            self._exclusions = SessionRowExclusions(self.ids)
+        return self._exclusions.update(exclude_ids if exclude_ids is not None else frozenset())
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> QueryResult:
+        """
+        Score every document sharing a term with the query.
+
+        Documents failing the optional constraints or listed in exclude_ids
+        are dropped before ranking.
+
+        Returns:
+            Normalized result (ids, documents, metadatas, distances) plus
+            "scores" with the raw BM25 scores, best first. Distances are
+            1 - score / best_score so lower stays better, as for vector results.
+        """
+        result: QueryResult = {"ids": [], "documents": [], "metadatas": [], "distances": [], "scores": []}
+        term_ids = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not term_ids or top_k <= 0:
+            return result
+
+        doc_parts, score_parts = [], []
+        for term_id in term_ids:
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.doc_ids[start:end], dtype=np.int64)
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            doc_parts.append(docs)
+            score_parts.append(self._idf(end - start) * tf * (self.k1 + 1.0) / (tf + self._length_norm[docs]))
+
+        # Sum per-term contributions for each matching document
+        rows, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        values = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        allowed = combine_row_masks(self._allowed_rows(constraints), self._excluded_rows(exclude_ids))
+        if allowed is not None:
+            keep = allowed[rows]
+            rows, values = rows[keep], values[keep]
+            if not len(rows):
+                return result
+        k = min(top_k, len(rows))
+        best = np.argpartition(-values, k - 1)[:k]
+        best = best[np.argsort(-values[best], kind="stable")]
+        top_score = float(values[best[0]])
+
+        for i in best:
+            row = int(rows[i])
+            result["ids"].append(self.ids[row])
+            result["documents"].append(self.documents[row])
+            result["metadatas"].append(dict(self.metadatas[row]))
+            result["scores"].append(float(values[i]))
+            result["distances"].append(1.0 - float(values[i]) / top_score if top_score > 0 else 1.0)
+        return result
+
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> List[QueryResult]:
+        return [self.search(query, top_k, constraints, exclude_ids) for query in queries]
+
+
+def build_bm25_index(
+    chunks: Iterable[Dict[str, Any]],
+    path: str = DEFAULT_BM25_PATH,
+    collection_name: str = "lines",
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+    logger: Optional[CustomLogger] = None
+) -> str:
+    """
+    Build and persist a BM25 index from chunk dictionaries (chunk_id, text, metadata fields).
+
+    Returns:
+        Directory the index was written to
+    """
+    logger = logger or CustomLogger("BM25Builder")
+    directory = os.path.join(path, collection_name)
+    os.makedirs(directory, exist_ok=True)
+    start = time.time()
+
+    vocab: Dict[str, int] = {}
+    postings: List[List[int]] = []
+    postings_tf: List[List[int]] = []
+    doc_lengths: List[int] = []
+
+    with open(os.path.join(directory, ROWS_FILE), 'w', encoding='utf-8') as f:
+        for row, chunk in enumerate(chunks):
+            tokens = tokenize(chunk.get("text", ""))
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                    postings_tf.append([])
+                postings[term_id].append(row)
+                postings_tf[term_id].append(tf)
+            f.write(json.dumps({
+                "id": chunk["chunk_id"], "document": chunk.get("text", ""), "metadata": _clean_metadata(chunk)
+            }, ensure_ascii=False) + "\n")
+
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    doc_ids = np.fromiter((d for p in postings for d in p), dtype=np.int32, count=int(offsets[-1]))
+    tfs = np.fromiter((min(t, 65535) for p in postings_tf for t in p), dtype=np.uint16, count=int(offsets[-1]))
+    lengths = np.asarray(doc_lengths, dtype=np.int32)
+
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+    np.save(os.path.join(directory, DOC_IDS_FILE), doc_ids)
+    np.save(os.path.join(directory, TFS_FILE), tfs)
+    np.save(os.path.join(directory, DOC_LENGTHS_FILE), lengths)
+    with open(os.path.join(directory, VOCAB_FILE), 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "count": len(lengths),
+            "terms": len(vocab),
+            "postings": int(offsets[-1]),
+            "avgdl": float(lengths.mean()) if len(lengths) else 0.0,
+            "k1": k1,
+            "b": b,
+        }, f, indent=2)
+
+    logger.info(
+        f"Built BM25 index '{collection_name}': {len(lengths)} docs, {len(vocab)} terms, "
+        f"{int(offsets[-1])} postings in {time.time() - start:.2f}s → {directory}"
+    )
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build BM25 lexical indexes from processed chunks")
+    parser.add_argument("--collection", choices=list(CHUNK_PATHS), help="Build only one collection")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="One row per distinct text, matching a vector index built with --dedupe")
+    args = parser.parse_args()
+
+    logger = CustomLogger("BM25Builder")
+    for collection in [args.collection] if args.collection else list(CHUNK_PATHS):
+        chunks = iter_chunks(CHUNK_PATHS[collection])
+        if args.dedupe:
+            chunks = dedupe_chunks(chunks, logger=logger)
+        build_bm25_index(chunks, collection_name=collection, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # clear_chroma_db.py
 
 from chromadb import PersistentClient
+from modules.rag.index_manifest import remove_manifest
 from modules.utils.logger import CustomLogger
 
 # Constants
@@ -16,6 +17,7 @@ def clear_collections(path=CHROMA_PATH, collections=COLLECTIONS):
     for collection_name in collections:
         try:
             client.delete_collection(name=collection_name)
+            remove_manifest(collection_name)
             logger.info(f"🧹 Deleted Chroma collection: '{collection_name}'")
         except Exception as e:
             logger.warning(f"⚠️ Warning: Could not delete collection '{collection_name}': {e}")
@@ -0,0 +1,76 @@
+# modules/rag/dedup.py
+
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from modules.rag.embedding_cache import normalize_text
+from modules.utils.logger import CustomLogger
+
+# Fields that locate one occurrence of a chunk text in the canon
+PROVENANCE_FIELDS = ("title", "act", "scene", "line", "word_index", "source_chunk_id")
+
+
+def dedupe_chunks(chunks: Iterable[Dict[str, Any]], logger: Optional[CustomLogger] = None) -> List[Dict[str, Any]]:
+    """
+    Collapse chunks with the same normalized text into one row each.
+
+    The first occurrence is kept as the row (its chunk_id and metadata are
+    unchanged), so a text that occurs once is indexed exactly as before.
+    Every row gets "provenance_count"; rows standing for several occurrences
+    also carry "provenances", a JSON list of each occurrence's location
+    fields plus its original "occurrence_id", first occurrence first. It is
+    stored as a string because index metadata only holds scalars.
+
+    Returns:
+        One chunk per distinct text, in order of first occurrence
+    """
+    logger = logger or CustomLogger("ChunkDedup")
+    rows: Dict[str, Dict[str, Any]] = {}
+    postings: Dict[str, List[Dict[str, Any]]] = {}
+    total = 0
+    for chunk in chunks:
+        total += 1
+        key = normalize_text(str(chunk.get("text", "")))
+        provenance = {field: chunk[field] for field in PROVENANCE_FIELDS if field in chunk}
+        provenance["occurrence_id"] = chunk.get("chunk_id")
+        if key not in rows:
+            rows[key] = dict(chunk)
+            postings[key] = []
+        postings[key].append(provenance)
+
+    deduped = []
+    for key, row in rows.items():
+        occurrences = postings[key]
+        row["provenance_count"] = len(occurrences)
+        if len(occurrences) > 1:
+            row["provenances"] = json.dumps(occurrences, ensure_ascii=False)
+        deduped.append(row)
+
+    if total:
+        logger.info(
+            f"🧹 Deduplicated {total} chunks to {len(deduped)} distinct texts "
+            f"({1 - len(deduped) / total:.1%} fewer rows to embed and store)"
+        )
+    return deduped
+
+
+def split_provenances(metadata: Mapping[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Separate a retrieved row's metadata into its primary reference and alternates.
+
+    Alternates are full references for the row's other occurrences: the row
+    metadata with that occurrence's location fields, so chunk_id still names
+    the indexed row.
+
+    Returns:
+        (primary reference without the "provenances" string, alternate references)
+    """
+    reference = {k: v for k, v in metadata.items() if k != "provenances"}
+    raw = metadata.get("provenances")
+    if not isinstance(raw, str):
+        return reference, []
+    try:
+        occurrences = json.loads(raw)
+    except ValueError:
+        return reference, []
+    return reference, [dict(reference, **occurrence) for occurrence in occurrences[1:]]
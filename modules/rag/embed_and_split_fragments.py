@@ -1,17 +1,18 @@
 # modules/rag/embed_and_split_fragments.py
 
-import json
 import os
+from modules.chunking.chunk_io import iter_chunks
 from modules.rag.embeddings import EmbeddingGenerator
+from modules.rag.shard_format import write_shard
 from modules.utils.logger import CustomLogger
 
-FRAGMENTS_JSON = "data/processed_chunks/fragments.json"
+FRAGMENTS_JSON = "data/processed_chunks/fragments.jsonl"
 OUTPUT_DIR = "data/embedded_fragments_shards"
 NUM_SHARDS = 10
+SHARD_DTYPE = "float32"  # "float16" halves shard size at a small precision cost
 
 def load_chunks(path: str) -> list:
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)["chunks"]
+    return list(iter_chunks(path))
 
 def split_and_save_chunks(embedded_chunks, num_shards=NUM_SHARDS):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -21,10 +22,9 @@ def split_and_save_chunks(embedded_chunks, num_shards=NUM_SHARDS):
         start = i * shard_size
         end = (i + 1) * shard_size if i < num_shards - 1 else len(embedded_chunks)
         shard = embedded_chunks[start:end]
-        out_path = os.path.join(OUTPUT_DIR, f"fragments_shard_{i+1}.json")
+        out_path = os.path.join(OUTPUT_DIR, f"fragments_shard_{i+1}")
 
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(shard, f, indent=2)
+        write_shard(shard, out_path, dtype=SHARD_DTYPE, collection="fragments")
 
         print(f"✅ Saved shard {i+1} with {len(shard)} chunks → {out_path}")
 
@@ -0,0 +1,136 @@
+# modules/rag/embedding_backends.py
+
+import os
+import re
+import math
+import hashlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import openai
+from dotenv import load_dotenv
+
+# "openai" (remote API) or "local" (deterministic hashed n-grams, no network)
+DEFAULT_EMBEDDING_BACKEND = "openai"
+DEFAULT_LOCAL_DIMENSIONS = 768
+LOCAL_BACKEND_VERSION = "v1"  # bump when the feature scheme changes so cached vectors are not reused
+
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.7
+CHAR_NGRAM_WEIGHT = 0.4
+
+
+class EmbeddingBackend(ABC):
+    """
+    Source of embedding vectors for EmbeddingGenerator.
+
+    `name` identifies the vector space: it namespaces the embedding cache and
+    the index manifest, so vectors from different backends never mix.
+    """
+
+    name = "base"
+    rate_limited = True  # whether requests draw from the tokens-per-minute budget
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Return one vector per text, in order."""
+        pass
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI API."""
+
+    def __init__(self, model_name: str = "text-embedding-3-large", dimensions: Optional[int] = None):
+        self.model_name = model_name
+        # text-embedding-3 models can return shortened (Matryoshka) vectors
+        self.dimensions = dimensions
+        self.name = f"{model_name}@{dimensions}" if dimensions else model_name
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        options = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = openai.embeddings.create(
+            input=texts,
+            model=self.model_name,
+            **options
+        )
+        return [item.embedding for item in response.data]
+
+
+@lru_cache(maxsize=500_000)
+def _hash_feature(feature: str, dimensions: int) -> Tuple[int, float]:
+    """Stable (bucket, sign) for a feature; blake2b so results never depend on PYTHONHASHSEED."""
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % dimensions, 1.0 if value >> 63 else -1.0
+
+
+class HashedNgramBackend(EmbeddingBackend):
+    """
+    Deterministic local embeddings from hashed word and character n-grams.
+
+    Words, word bigrams and padded character 3-5-grams are hashed into a
+    fixed number of signed buckets with sublinear term weights and the
+    result is L2-normalized. Lexically similar lines land close together,
+    which is enough to exercise and benchmark the retrieval stack offline;
+    it is not a substitute for semantic embeddings in production.
+    """
+
+    rate_limited = False
+
+    def __init__(self, dimensions: Optional[int] = None, char_ngrams: Tuple[int, ...] = (3, 4, 5)):
+        self.dimensions = dimensions or DEFAULT_LOCAL_DIMENSIONS
+        self.char_ngrams = char_ngrams
+        self.name = f"local-hashed-ngram-{LOCAL_BACKEND_VERSION}@{self.dimensions}"
+
+    def _features(self, text: str) -> Counter:
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        features: Counter = Counter()
+        for word in words:
+            features[("w", word)] += 1
+            padded = f"<{word}>"
+            for n in self.char_ngrams:
+                for i in range(len(padded) - n + 1):
+                    features[("c", padded[i:i + n])] += 1
+        for first, second in zip(words, words[1:]):
+            features[("b", f"{first} {second}")] += 1
+        return features
+
+    def embed_one(self, text: str) -> List[float]:
+        weights = {"w": WORD_WEIGHT, "b": BIGRAM_WEIGHT, "c": CHAR_NGRAM_WEIGHT}
+        vector = [0.0] * self.dimensions
+        for (kind, feature), count in self._features(text).items():
+            bucket, sign = _hash_feature(f"{kind}:{feature}", self.dimensions)
+            vector[bucket] += sign * weights[kind] * (1.0 + math.log(count))
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm > 0:
+            vector = [v / norm for v in vector]
+        return vector
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+def default_embedding_backend() -> str:
+    """
+    The EMBEDDING_BACKEND setting, falling back to DEFAULT_EMBEDDING_BACKEND.
+
+    Read on each call rather than at import, after loading .env, since this
+    module is usually imported before anything else has loaded it.
+    """
+    load_dotenv()
+    return os.getenv("EMBEDDING_BACKEND") or DEFAULT_EMBEDDING_BACKEND
+
+
+def create_backend(
+    backend_name: Optional[str] = None,
+    model_name: str = "text-embedding-3-large",
+    dimensions: Optional[int] = None
+) -> EmbeddingBackend:
+    """Build the embedding backend selected by name (defaults to the EMBEDDING_BACKEND env var)."""
+    backend_name = backend_name or default_embedding_backend()
+    if backend_name == "openai":
+        return OpenAIEmbeddingBackend(model_name, dimensions)
+    if backend_name == "local":
+        return HashedNgramBackend(dimensions)
+    raise ValueError(f"Unknown embedding backend: {backend_name}")
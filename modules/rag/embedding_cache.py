@@ -0,0 +1,161 @@
+# modules/rag/embedding_cache.py
+
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence
+from modules.utils.logger import CustomLogger
+
+DEFAULT_CACHE_PATH = "embeddings/cache/embedding_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 500_000
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys: NFC unicode, trimmed, single-spaced."""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content-addressed key for a (model, normalized text) pair."""
+    payload = f"{model_name}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed cache of embedding vectors.
+
+    Vectors are stored as float32 blobs in SQLite, keyed by the hash of the
+    model name and normalized text. Each lookup refreshes an access counter so
+    the cache can evict the least recently used rows once it grows beyond
+    max_entries.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        logger: Optional[CustomLogger] = None
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.logger = logger or CustomLogger("EmbeddingCache")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()
+        self._clock = int(row[0])
+        self.logger.info(f"Embedding cache at {path} ({len(self)} entries, max {max_entries})")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> Dict[int, List[float]]:
+        """
+        Look up cached vectors for a batch of texts.
+
+        Returns:
+            Dictionary mapping the position of each cached text in `texts` to its vector.
+        """
+        keys = [cache_key(model_name, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                stamp = self._tick()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(stamp, key) for key in found]
+                )
+                self._conn.commit()
+
+            result = {i: found[key] for i, key in enumerate(keys) if key in found}
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+
+        return result
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store vectors for texts, evicting least recently used rows if over capacity."""
+        with self._lock:
+            stamp = self._tick()
+            rows = [
+                (cache_key(model_name, text), model_name, len(vector), array("f", vector).tobytes(), stamp)
+                for text, vector in zip(texts, vectors)
+            ]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        count = int(self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.logger.debug(f"Evicted {overflow} least recently used embeddings")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+    def clear(self) -> None:
+        """Remove all cached vectors."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
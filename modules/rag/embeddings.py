@@ -1,60 +1,198 @@
 import os
 import json
+import time
+import random
+import threading
 import openai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
+from modules.rag.embedding_backends import EmbeddingBackend, create_backend
+from modules.rag.embedding_cache import EmbeddingCache
 from modules.utils.logger import CustomLogger
 
 load_dotenv()
 
+MAX_BATCH_TOKENS = 600_000
+BATCH_SIZE_LIMIT = 1500  # fallback: max number of items per batch
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+MAX_RATE_LIMIT_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text.split()) * 1.33)
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    return isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+class TokenBudget:
+    """Token bucket that spreads requests across a tokens-per-minute limit."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.available = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        """Block until `tokens` (capped at the bucket size) can be spent."""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) / self.rate
+            time.sleep(wait)
+
 class EmbeddingGenerator:
-    def __init__(self, model_name='text-embedding-3-large', logger=None):
+    def __init__(self, model_name='text-embedding-3-large', logger=None,
+                 cache: Optional[EmbeddingCache] = None, use_cache: bool = True,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+                 dimensions: Optional[int] = None,
+                 backend: Union[EmbeddingBackend, str, None] = None):
         self.model_name = model_name
+        self.dimensions = dimensions
+        self.backend = backend if isinstance(backend, EmbeddingBackend) else create_backend(
+            backend, model_name, dimensions
+        )
+        # Cache and index manifests are keyed by the backend's vector space
+        self.cache_namespace = self.backend.name
         self.logger = logger or CustomLogger("EmbeddingGenerator")
-        self.logger.info(f"Using embedding model: {self.model_name}")
+        self.logger.info(f"Using embedding model: {self.cache_namespace}")
+
+        # Concurrent dispatch settings
+        self.max_in_flight = max_in_flight
+        self.token_budget = TokenBudget(tokens_per_minute)
+        self.last_dispatch_stats: Dict[str, float] = {}
+
+        # On-disk cache shared across scenes, retries and sessions
+        self.cache: Optional[EmbeddingCache] = None
+        if use_cache:
+            try:
+                self.cache = cache if cache is not None else EmbeddingCache(logger=self.logger)
+            except Exception as e:
+                self.logger.warning(f"Embedding cache unavailable, continuing without it: {e}")
 
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         self.logger.debug(f"Embedding {len(texts)} texts")
 
-        MAX_TOKENS = 600_000
-        BATCH_SIZE_LIMIT = 1500  # fallback: max number of items per batch
+        if self.cache is None:
+            return self._request_embeddings(texts)
+
+        cached = self.cache.get_many(self.cache_namespace, texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+        self.logger.debug(f"Embedding cache: {len(cached)} hits, {len(missing)} misses")
+
+        if missing:
+            # Request each distinct missing text only once
+            unique_missing = list(dict.fromkeys(texts[i] for i in missing))
+            fresh = self._request_embeddings(unique_missing)
+            self.cache.put_many(self.cache_namespace, unique_missing, fresh)
+            fresh_by_text = dict(zip(unique_missing, fresh))
+            for i in missing:
+                cached[i] = fresh_by_text[texts[i]]
 
-        def estimate_tokens(text: str) -> int:
-            return int(len(text.split()) * 1.33)
+        return [cached[i] for i in range(len(texts))]
 
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Send texts to the embeddings API in token-bounded batches.
+
+        Batches are dispatched concurrently (up to max_in_flight requests) within
+        the tokens-per-minute budget; rate-limited requests are retried with
+        jittered exponential backoff and results are reassembled in input order.
+        """
         batches = []
         current_batch = []
         current_tokens = 0
 
         for text in texts:
             tokens = estimate_tokens(text)
-            if (current_tokens + tokens > MAX_TOKENS) or (len(current_batch) >= BATCH_SIZE_LIMIT):
-                batches.append(current_batch)
+            if current_batch and ((current_tokens + tokens > MAX_BATCH_TOKENS) or (len(current_batch) >= BATCH_SIZE_LIMIT)):
+                batches.append((current_batch, current_tokens))
                 current_batch = []
                 current_tokens = 0
             current_batch.append(text)
             current_tokens += tokens
 
         if current_batch:
-            batches.append(current_batch)
+            batches.append((current_batch, current_tokens))
+
+        self.logger.info(f"Splitting into {len(batches)} batches for embedding ({self.max_in_flight} in flight)")
+
+        start_time = time.time()
+        # Counted per call, so concurrent callers do not see each other's retries
+        rate_limit_retries = 0
+        results: List[List[List[float]]] = [[] for _ in batches]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_in_flight, len(batches)))) as pool:
+            futures = {
+                pool.submit(self._send_batch, batch, tokens, idx, len(batches)): idx
+                for idx, (batch, tokens) in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    results[idx], retries = future.result()
+                    rate_limit_retries += retries
+                except Exception as e:
+                    self.logger.error(f"Error embedding batch {idx + 1}: {e}")
+                    for pending in futures:
+                        pending.cancel()
+                    raise
 
-        self.logger.info(f"Splitting into {len(batches)} batches for embedding")
+        elapsed = max(time.time() - start_time, 1e-9)
+        total_tokens = sum(tokens for _, tokens in batches)
+        self.last_dispatch_stats = {
+            "chunks": len(texts),
+            "tokens": total_tokens,
+            "seconds": elapsed,
+            "chunks_per_sec": len(texts) / elapsed,
+            "tokens_per_sec": total_tokens / elapsed,
+            "rate_limit_retries": rate_limit_retries,
+        }
+        if batches:
+            self.logger.info(
+                f"Embedded {len(texts)} texts in {elapsed:.2f}s "
+                f"({self.last_dispatch_stats['chunks_per_sec']:.1f} chunks/s, "
+                f"{self.last_dispatch_stats['tokens_per_sec']:.0f} tokens/s)"
+            )
 
-        all_embeddings = []
-        for idx, batch in enumerate(batches):
-            self.logger.debug(f"Sending batch {idx + 1}/{len(batches)} with {len(batch)} texts")
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def _send_batch(self, batch: List[str], tokens: int, idx: int, total: int) -> Tuple[List[List[float]], int]:
+        """
+        Send one batch, waiting for token budget and backing off on 429 responses.
+
+        Returns:
+            (vectors, number of rate-limit retries it took)
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            if self.backend.rate_limited:
+                self.token_budget.acquire(tokens)
+            self.logger.debug(f"Sending batch {idx + 1}/{total} with {len(batch)} texts")
             try:
-                response = openai.embeddings.create(
-                    input=batch,
-                    model=self.model_name
-                )
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
+                return self.backend.embed(batch), attempt
             except Exception as e:
-                self.logger.error(f"Error embedding batch {idx + 1}: {e}")
-                raise
-
-        return all_embeddings
+                if not _is_rate_limit_error(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+                delay = random.uniform(0, delay)  # full jitter
+                self.logger.warning(
+                    f"Rate limited on batch {idx + 1}/{total} (attempt {attempt + 1}), retrying in {delay:.2f}s"
+                )
+                time.sleep(delay)
+        raise RuntimeError("unreachable")
 
     def embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         texts = [chunk['text'] for chunk in chunks]
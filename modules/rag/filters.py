@@ -0,0 +1,250 @@
+# modules/rag/filters.py
+
+import argparse
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import AbstractSet, Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+import numpy as np
+
+from modules.chunking.chunk_io import iter_chunks
+from modules.utils.logger import CustomLogger
+
+# Boolean flags stored with every indexed chunk so Selector's rejections can
+# be pushed into the vector search instead of applied after it.
+FILTER_FLAG_FIELDS = ("starts_with_propn", "has_propn", "has_midline_capital")
+
+# Sessions whose exclusion bitsets an index keeps (one bool per row each)
+MAX_EXCLUSION_SESSIONS = 8
+
+CHUNK_PATHS = {
+    "lines": "data/processed_chunks/lines.jsonl",
+    "phrases": "data/processed_chunks/phrases.jsonl",
+    "fragments": "data/processed_chunks/fragments.jsonl",
+}
+
+
+def has_midline_capital(text: str) -> bool:
+    """True if a word after the first is capitalized (other than "I"), the way Selector reads proper nouns."""
+    for i, word in enumerate(text.split()):
+        if i > 0 and word[0].isupper() and any(c.isalpha() for c in word) and word.lower() != "i":
+            return True
+    return False
+
+
+def filter_flags(chunk: Mapping[str, Any]) -> Dict[str, bool]:
+    """
+    Precompute the filter flags for a chunk from its POS tags and text.
+
+    POS is a list and is not kept in the index metadata, so the flags have
+    to be derived before the chunk is written.
+    """
+    pos_tags = chunk.get("POS") or []
+    if not isinstance(pos_tags, list):
+        pos_tags = []
+    return {
+        "starts_with_propn": bool(pos_tags) and pos_tags[0] == "PROPN",
+        "has_propn": "PROPN" in pos_tags,
+        "has_midline_capital": has_midline_capital(str(chunk.get("text", ""))),
+    }
+
+
+@dataclass(frozen=True)
+class SearchConstraints:
+    """
+    Structured retrieval constraints, evaluated inside the vector search.
+
+    Ranges are inclusive; None leaves that side open. exclude_proper_nouns
+    rejects the same chunks Selector.filter_candidates does: any PROPN tag
+    or a capitalized word after the first.
+    """
+    min_syllables: Optional[int] = None
+    max_syllables: Optional[int] = None
+    min_words: Optional[int] = None
+    max_words: Optional[int] = None
+    exclude_proper_nouns: bool = False
+
+    def _ranges(self):
+        return (
+            ("syllables", self.min_syllables, self.max_syllables),
+            ("word_count", self.min_words, self.max_words),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready fields, for service requests and result cache keys."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Mapping[str, Any]]) -> Optional["SearchConstraints"]:
+        """Inverse of to_dict; None or an empty dict means no constraints."""
+        return cls(**data) if data else None
+
+    def is_empty(self) -> bool:
+        return not self.exclude_proper_nouns and all(
+            low is None and high is None for _, low, high in self._ranges()
+        )
+
+    def to_where(self) -> Optional[Dict[str, Any]]:
+        """Compile to a Chroma `where` filter, or None when unconstrained."""
+        clauses: List[Dict[str, Any]] = []
+        for field, low, high in self._ranges():
+            if low is not None:
+                clauses.append({field: {"$gte": low}})
+            if high is not None:
+                clauses.append({field: {"$lte": high}})
+        if self.exclude_proper_nouns:
+            clauses.append({"has_propn": {"$eq": False}})
+            clauses.append({"has_midline_capital": {"$eq": False}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def matches(self, metadata: Mapping[str, Any]) -> bool:
+        """
+        Evaluate the constraints against one metadata dict.
+
+        A missing field fails its clause, as it does in Chroma.
+        """
+        for field, low, high in self._ranges():
+            if low is None and high is None:
+                continue
+            value = metadata.get(field)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                return False
+            if (low is not None and value < low) or (high is not None and value > high):
+                return False
+        if self.exclude_proper_nouns:
+            if metadata.get("has_propn") is not False or metadata.get("has_midline_capital") is not False:
+                return False
+        return True
+
+
+class SessionExcludedIds(frozenset):
+    """
+    Chunk ids to exclude, tagged with the translation session they belong to.
+
+    A shared retrieval service passes these so indexes keep one RowExclusion
+    per session; plain sets share the untagged (None) session.
+    """
+
+    session_id: Optional[str]
+
+    def __new__(cls, ids: Iterable[str] = (), session_id: Optional[str] = None):
+        excluded = super().__new__(cls, ids)
+        excluded.session_id = session_id
+        return excluded
+
+
+class RowExclusion:
+    """
+    Bitset over an index's rows marking chunk ids to leave out of results.
+
+    Within a translation session the used ids only grow, so each update
+    sets just the bits for ids not seen before; the mask is rebuilt only
+    when an id disappears (new session or reset).
+    """
+
+    def __init__(self, ids: Sequence[str], row_of: Optional[Mapping[str, int]] = None):
+        self._row_of = row_of if row_of is not None else {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self.mask = np.zeros(len(ids), dtype=bool)
+        self._ids: Set[str] = set()
+
+    def update(self, exclude_ids: AbstractSet[str]) -> np.ndarray:
+        """Bring the mask in line with exclude_ids and return it (True = excluded)."""
+        if not self._ids <= exclude_ids:
+            self.mask[:] = False
+            self._ids = set()
+        new_ids = exclude_ids - self._ids
+        for chunk_id in new_ids:
+            row = self._row_of.get(chunk_id)
+            if row is not None:
+                self.mask[row] = True
+        self._ids.update(new_ids)
+        return self.mask
+
+
+class SessionRowExclusions:
+    """
+    One RowExclusion per session, so alternating sessions each update their own mask.
+
+    The least recently used session beyond max_sessions is dropped and
+    rebuilt from its ids if it comes back.
+    """
+
+    def __init__(self, ids: Sequence[str], max_sessions: int = MAX_EXCLUSION_SESSIONS):
+        self._ids = ids
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self.max_sessions = max_sessions
+        self._by_session: "OrderedDict[Optional[str], RowExclusion]" = OrderedDict()
+
+    def update(self, exclude_ids: AbstractSet[str]) -> np.ndarray:
+        """Update the mask of exclude_ids' session and return it (True = excluded)."""
+        session_id = getattr(exclude_ids, "session_id", None)
+        exclusion = self._by_session.get(session_id)
+        if exclusion is None:
+            exclusion = RowExclusion(self._ids, self._row_of)
+            self._by_session[session_id] = exclusion
+            while len(self._by_session) > self.max_sessions:
+                self._by_session.popitem(last=False)
+        else:
+            self._by_session.move_to_end(session_id)
+        return exclusion.update(exclude_ids)
+
+
+def combine_row_masks(allowed: Optional[np.ndarray], excluded: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Merge a constraints mask (True = allowed) with an exclusion bitset (True = excluded)."""
+    if excluded is None or not excluded.any():
+        return allowed
+    return ~excluded if allowed is None else allowed & ~excluded
+
+
+def backfill_filter_flags(
+    collection_name: str,
+    chunks_path: Optional[str] = None,
+    chroma_path: str = "embeddings/chromadb_vectors",
+    batch_size: int = 1000,
+    logger: Optional[CustomLogger] = None
+) -> int:
+    """
+    Add filter flags to a collection indexed before they existed.
+
+    Flags come from the processed chunk file, since POS tags are not stored
+    in Chroma. Embeddings are left untouched.
+
+    Returns:
+        Number of documents updated
+    """
+    from modules.rag.vector_store import VectorStore
+
+    logger = logger or CustomLogger("FilterBackfill")
+    flags_by_id = {c["chunk_id"]: filter_flags(c) for c in iter_chunks(chunks_path or CHUNK_PATHS[collection_name])}
+
+    collection = VectorStore(path=chroma_path, collection_name=collection_name, logger=logger).collection
+    total = collection.count()
+    updated = 0
+    for offset in range(0, total, batch_size):
+        page = collection.get(offset=offset, limit=batch_size, include=["metadatas"])
+        ids, metadatas = [], []
+        for chunk_id, meta in zip(page["ids"], page["metadatas"]):
+            if chunk_id in flags_by_id:
+                ids.append(chunk_id)
+                metadatas.append(dict(meta or {}, **flags_by_id[chunk_id]))
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+    logger.info(f"✅ Added filter flags to {updated}/{total} documents in '{collection_name}'")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add filter flags to existing Chroma collections")
+    parser.add_argument("--collection", choices=list(CHUNK_PATHS), help="Backfill only one collection")
+    args = parser.parse_args()
+
+    logger = CustomLogger("FilterBackfill")
+    for collection in [args.collection] if args.collection else list(CHUNK_PATHS):
+        backfill_filter_flags(collection, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
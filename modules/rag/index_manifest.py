@@ -0,0 +1,176 @@
+# modules/rag/index_manifest.py
+
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+from modules.utils.logger import CustomLogger
+
+DEFAULT_MANIFEST_DIR = "embeddings/chromadb_vectors/manifests"
+# Indexes built next to Chroma; each collection subdirectory has a manifest.json rewritten on rebuild
+DERIVED_INDEX_DIRS = ("embeddings/bm25", "embeddings/numpy_vectors")
+DERIVED_MANIFEST_FILE = "manifest.json"
+
+
+def manifest_dir_for(chroma_path: str) -> str:
+    """Manifest directory of the Chroma database at chroma_path."""
+    return os.path.join(chroma_path, "manifests")
+
+
+def chunk_content_hash(chunk: Dict[str, Any]) -> str:
+    """
+    Hash everything about a chunk that ends up in the index.
+
+    The embedding itself is excluded; the text and metadata determine it.
+    """
+    content = {k: v for k, v in chunk.items() if k != "embedding"}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def index_version(
+    collection_names: Iterable[str] = ("lines", "phrases", "fragments"),
+    manifest_dir: str = DEFAULT_MANIFEST_DIR,
+    derived_index_dirs: Iterable[str] = DERIVED_INDEX_DIRS
+) -> str:
+    """
+    Fingerprint of every index search results depend on, for caches of those results.
+
+    Covers the Chroma collections' manifests and the manifest.json of each
+    index under derived_index_dirs (BM25, NumPy/quantized stores). Built
+    from file size and modification time, so it changes whenever any of
+    them is rewritten without reading the (large) manifests.
+    """
+    digest = hashlib.sha256()
+    paths = [(name, os.path.join(manifest_dir, f"{name}.json")) for name in collection_names]
+    for directory in derived_index_dirs:
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                paths.append((f"{directory}/{name}", os.path.join(directory, name, DERIVED_MANIFEST_FILE)))
+    for label, path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{label}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+        else:
+            digest.update(f"{label}:missing;".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def remove_manifest(collection_name: str, manifest_dir: str = DEFAULT_MANIFEST_DIR) -> None:
+    """Drop a collection's manifest, e.g. after the collection itself was deleted."""
+    path = os.path.join(manifest_dir, f"{collection_name}.json")
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@dataclass
+class ManifestDiff:
+    """Chunk ids grouped by what re-indexing has to do with them."""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def to_embed(self) -> List[str]:
+        return self.added + self.changed
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} new, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {self.unchanged} unchanged")
+
+
+class IndexManifest:
+    """
+    Record of which chunk content is currently embedded in a collection.
+
+    Stored as JSON next to the Chroma collection, mapping chunk_id to the
+    content hash of the chunk that was embedded, plus the embedding model
+    used. A model change invalidates every entry and sets model_changed:
+    the collection holds vectors from another model, possibly of another
+    width, and has to be rebuilt rather than upserted into.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        model_name: str,
+        manifest_dir: str = DEFAULT_MANIFEST_DIR,
+        logger: Optional[CustomLogger] = None
+    ):
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.path = os.path.join(manifest_dir, f"{collection_name}.json")
+        self.logger = logger or CustomLogger("IndexManifest")
+        self.hashes: Dict[str, str] = {}
+        self.exists = False
+        self.model_changed = False
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            self.logger.info(f"No index manifest for '{self.collection_name}' at {self.path}")
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.exists = True
+        if data.get("model") != self.model_name:
+            self.logger.warning(
+                f"⚠️ Manifest for '{self.collection_name}' was built with {data.get('model')}, "
+                f"now using {self.model_name}; the collection will be rebuilt"
+            )
+            self.model_changed = True
+            return
+        self.hashes = data.get("chunks", {})
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "collection": self.collection_name,
+                "model": self.model_name,
+                "chunks": self.hashes,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, chunks: Iterable[Dict[str, Any]], indexed_ids: Optional[Iterable[str]] = None) -> ManifestDiff:
+        """
+        Compare chunks with the manifest.
+
+        Args:
+            chunks: Current chunks (must carry chunk_id)
+            indexed_ids: Ids actually present in the collection. Ids found
+                there but not in the manifest or in chunks are reported as removed.
+
+        Returns:
+            ManifestDiff of chunk ids
+        """
+        result = ManifestDiff()
+        current = set()
+        for chunk in chunks:
+            chunk_id = chunk["chunk_id"]
+            current.add(chunk_id)
+            previous = self.hashes.get(chunk_id)
+            if previous is None:
+                result.added.append(chunk_id)
+            elif previous != chunk_content_hash(chunk):
+                result.changed.append(chunk_id)
+            else:
+                result.unchanged += 1
+
+        known = set(self.hashes)
+        if indexed_ids is not None:
+            known.update(indexed_ids)
+        result.removed = sorted(known - current)
+        return result
+
+    def record(self, chunks: Iterable[Dict[str, Any]]) -> None:
+        """Mark chunks as embedded with their current content."""
+        for chunk in chunks:
+            self.hashes[chunk["chunk_id"]] = chunk_content_hash(chunk)
+
+    def forget(self, chunk_ids: Iterable[str]) -> None:
+        for chunk_id in chunk_ids:
+            self.hashes.pop(chunk_id, None)
@@ -1,25 +1,32 @@
 # modules/rag/insert_shard.py
 
-import json
+import os
 import sys
+from modules.rag.shard_format import is_shard, iter_shard_batches, load_embedded_chunks
 from modules.rag.vector_store import VectorStore
 from modules.utils.logger import CustomLogger
 
+SHARD_DIR = "data/embedded_fragments_shards"
+INSERT_BATCH_SIZE = 1000
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python -m modules.rag.insert_shard <shard_number>")
         return
 
     shard_num = int(sys.argv[1])
-    path = f"data/embedded_fragments_shards/fragments_shard_{shard_num}.json"
+    path = os.path.join(SHARD_DIR, f"fragments_shard_{shard_num}")
     logger = CustomLogger(f"FRAGMENTS_Insert_Shard_{shard_num}")
-
-    logger.info(f"Loading fragment shard {shard_num} from: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        shard = json.load(f)
-
     store = VectorStore(collection_name="fragments", logger=logger)
-    store.add_documents(shard)
+
+    if is_shard(path):
+        logger.info(f"Loading binary fragment shard {shard_num} from: {path}")
+        for batch in iter_shard_batches(path, batch_size=INSERT_BATCH_SIZE):
+            store.add_documents(batch)
+    else:
+        # Shards written before the binary format are single indented JSON files
+        logger.info(f"Loading legacy JSON fragment shard {shard_num} from: {path}.json")
+        store.add_documents(load_embedded_chunks(f"{path}.json"))
 
     logger.info(f"✅ Inserted shard {shard_num} successfully.")
 
@@ -3,23 +3,36 @@
 import json
 import time
 import os
+import queue
 import argparse
 import sys
-from typing import Optional, List, Dict, Any, Union
+import threading
+from itertools import islice
+from typing import Callable, Iterable, Optional, List, Dict, Any, Sequence, Union
 
-from modules.rag.embeddings import EmbeddingGenerator
-from modules.rag.vector_store import VectorStore
+from modules.chunking.chunk_io import open_chunks, resolve_chunk_path
+from modules.rag.embeddings import EmbeddingGenerator, DEFAULT_MAX_IN_FLIGHT, DEFAULT_TOKENS_PER_MINUTE
+from modules.rag.embedding_backends import default_embedding_backend
+from modules.rag.vector_store import VectorStore, default_chroma_path
+from modules.rag.shard_format import write_shard, list_shards, iter_shard_batches
+from modules.rag.index_manifest import IndexManifest, manifest_dir_for
+from modules.rag.dedup import dedupe_chunks
 from modules.utils.logger import CustomLogger
 
 # Configuration
 DEFAULT_BATCH_SIZE = 250
-DEFAULT_SLEEP_TIME = 0.25  # Sleep time between batches for ChromaDB
+DEFAULT_SLEEP_TIME = 0.25  # Maximum backpressure pause after a slow ChromaDB insert
+PIPELINE_DEPTH = 2  # Embedded batches allowed to wait for insertion
+QUEUE_POLL_SECONDS = 1.0  # How often the inserter checks that the embedding thread is still alive
+LATENCY_SPIKE_FACTOR = 2.0  # Insert slower than this multiple of the average triggers a pause
+LATENCY_SMOOTHING = 0.2  # Weight of the newest sample in the insert latency average
 CHECKPOINT_SIZE = 1000  # Save progress checkpoint every N chunks
+DIMENSION_PROBE_TEXT = "To be, or not to be"  # embedded once to compare widths with a collection lacking a manifest
 COLLECTION_TYPES = ["lines", "phrases", "fragments"]
 INPUT_PATHS = {
-    "lines": "data/processed_chunks/lines.json",
-    "phrases": "data/processed_chunks/phrases.json",
-    "fragments": "data/processed_chunks/fragments.json"
+    "lines": "data/processed_chunks/lines.jsonl",
+    "phrases": "data/processed_chunks/phrases.jsonl",
+    "fragments": "data/processed_chunks/fragments.jsonl"
 }
 SAVE_EMBEDDED_JSON = False  # Change to True to save embedded chunks to JSON
 EMBEDDED_OUTPUT_DIR = "embeddings/embedded_json"
@@ -27,6 +40,48 @@ EMBEDDED_OUTPUT_DIR = "embeddings/embedded_json"
 # Define a more flexible StatsDict type that allows float values
 StatsDict = Dict[str, Union[int, float]]
 
+
+class InsertBackpressure:
+    """
+    Pause inserts only when ChromaDB shows signs of falling behind.
+
+    Tracks a moving average of per-chunk insert latency. When an insert takes
+    noticeably longer than that average, the excess time (capped at
+    max_pause) is given back to Chroma before the next insert.
+    """
+
+    def __init__(self, max_pause: float = DEFAULT_SLEEP_TIME):
+        self.max_pause = max_pause
+        self.avg_seconds_per_chunk: Optional[float] = None
+        self.total_pause = 0.0
+
+    def after_insert(self, elapsed: float, num_chunks: int) -> float:
+        """Record an insert and return the pause applied (in seconds)."""
+        if num_chunks <= 0:
+            return 0.0
+        per_chunk = elapsed / num_chunks
+        if self.avg_seconds_per_chunk is None:
+            self.avg_seconds_per_chunk = per_chunk
+            return 0.0
+
+        expected = self.avg_seconds_per_chunk * num_chunks
+        self.avg_seconds_per_chunk += LATENCY_SMOOTHING * (per_chunk - self.avg_seconds_per_chunk)
+
+        pause = 0.0
+        if elapsed > expected * LATENCY_SPIKE_FACTOR:
+            pause = min(self.max_pause, elapsed - expected)
+            time.sleep(pause)
+            self.total_pause += pause
+        return pause
+
+class ProducerFailure:
+    """Queued by the embedding thread when reading or embedding a batch raised."""
+
+    def __init__(self, batch_num: int, error: BaseException):
+        self.batch_num = batch_num
+        self.error = error
+
+
 class RagSetup:
     def __init__(
         self, 
@@ -34,9 +89,19 @@ class RagSetup:
         batch_size: int = DEFAULT_BATCH_SIZE, 
         sleep_time: float = DEFAULT_SLEEP_TIME,
         save_embedded: bool = SAVE_EMBEDDED_JSON,
-        logger: Optional[CustomLogger] = None
+        logger: Optional[CustomLogger] = None,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+        embedding_backend: Optional[str] = None,
+        dedupe: bool = False,
+        chroma_path: Optional[str] = None,
+        rebuild: bool = False
     ):
         self.chunk_type = chunk_type
+        self.dedupe = dedupe
+        # Only then may a collection built by another backend be dropped and rebuilt
+        self.rebuild = rebuild
+        self.collection_rebuilt = False
         self.batch_size = batch_size
         self.sleep_time = sleep_time
         self.save_embedded = save_embedded
@@ -47,6 +112,8 @@ class RagSetup:
         if not input_path:
             self.logger.critical(f"No input path defined for chunk type: {chunk_type}")
             raise ValueError(f"Missing input path configuration for {chunk_type}")
+        # Falls back to a legacy .json chunk document when there is no JSONL file
+        input_path = resolve_chunk_path(input_path)
             
         if not os.path.exists(input_path):
             self.logger.critical(f"Input file not found: {input_path}")
@@ -59,8 +126,17 @@ class RagSetup:
             os.makedirs(self.output_dir, exist_ok=True)
             
         # Initialize components but don't load data yet
-        self.embedder = EmbeddingGenerator(logger=self.logger)
+        self.embedder = EmbeddingGenerator(
+            logger=self.logger,
+            max_in_flight=max_in_flight,
+            tokens_per_minute=tokens_per_minute,
+            backend=embedding_backend
+        )
+        # Each backend gets its own database unless told otherwise, with manifests alongside
+        self.chroma_path = chroma_path or default_chroma_path(embedding_backend)
+        self.manifest_dir = manifest_dir_for(self.chroma_path)
         self.vector_store = VectorStore(
+            path=self.chroma_path,
             collection_name=chunk_type, 
             logger=self.logger
         )
@@ -80,19 +156,29 @@ class RagSetup:
         # Progress tracking
         self.checkpoint_path = f"embeddings/checkpoints/{chunk_type}_progress.json"
         os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+
+        # Latency-driven pauses replace fixed sleeps between inserts
+        self.backpressure = InsertBackpressure(max_pause=sleep_time)
         
-    def load_chunks(self) -> List[Dict[str, Any]]:
-        """Load chunks from JSON file with detailed logging."""
+    def load_chunks(self) -> Sequence[Dict[str, Any]]:
+        """
+        Open the chunk file with detailed logging.
+
+        A JSONL chunk file is returned as a ChunkFile, which streams chunks
+        from disk instead of holding them all; legacy JSON documents and
+        deduplicated chunks are lists.
+        """
         start_time = time.time()
         self.logger.info(f"🔍 STEP 1: Loading chunks from: {self.input_path}")
         
         try:
-            with open(self.input_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                chunks = data.get("chunks", [])
+            chunks = open_chunks(self.input_path, logger=self.logger)
                 
             self.stats["chunks_loaded"] = len(chunks)
             self.logger.info(f"✅ Loaded {len(chunks)} chunks in {time.time() - start_time:.2f}s")
+            if self.dedupe:
+                # One row per distinct text; the other occurrences ride along as provenances
+                chunks = dedupe_chunks(chunks, logger=self.logger)
             
             # Verify chunk structure
             if chunks and isinstance(chunks[0], dict):
@@ -137,95 +223,379 @@ class RagSetup:
             self.logger.error(f"❌ Failed to save checkpoint: {e}")
     
     def save_embedded_chunks(self, embedded_chunks: List[Dict[str, Any]], batch_num: int):
-        """Save embedded chunks to JSON file."""
+        """Save embedded chunks as a binary shard (.npy matrix + JSONL sidecar + manifest)."""
         if not self.save_embedded:
             return
             
         try:
             output_path = os.path.join(
                 self.output_dir, 
-                f"{self.chunk_type}_embedded_batch_{batch_num}.json"
+                f"{self.chunk_type}_embedded_batch_{batch_num}"
             )
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(embedded_chunks, f, ensure_ascii=False, indent=2)
+            write_shard(embedded_chunks, output_path, collection=self.chunk_type)
             self.logger.info(f"💾 Saved embedded batch to: {output_path}")
         except Exception as e:
             self.logger.error(f"❌ Failed to save embedded chunks: {e}")
             
-    def add_to_chroma(self, embedded_batch: List[Dict[str, Any]]) -> bool:
-        """Custom method to add documents to ChromaDB with controlled batch size and sleep time."""
+    def add_to_chroma(self, embedded_batch: List[Dict[str, Any]], upsert: bool = False) -> bool:
+        """Add (or upsert) documents to ChromaDB in controlled sub-batches, pausing only when inserts slow down."""
         try:
             # Process in our chosen batch size, not the VectorStore's internal one
             for i in range(0, len(embedded_batch), self.batch_size):
                 sub_batch = embedded_batch[i:i+self.batch_size]
                 self.logger.debug(f"Adding sub-batch {i//self.batch_size + 1} with {len(sub_batch)} chunks")
                 
-                # Call the original add_documents without custom parameters
-                self.vector_store.add_documents(sub_batch)
-                
-                # Control our own sleep time between batches
-                time.sleep(self.sleep_time)
+                insert_start = time.time()
+                if upsert:
+                    self.vector_store.upsert_documents(sub_batch)
+                else:
+                    self.vector_store.add_documents(sub_batch)
+                pause = self.backpressure.after_insert(time.time() - insert_start, len(sub_batch))
+                if pause:
+                    self.logger.debug(f"Insert latency spike, paused {pause:.2f}s")
             
             return True
         except Exception as e:
             self.logger.error(f"Failed to add documents to ChromaDB: {e}")
             return False
-    
-    def process_batch(
-        self, 
-        batch: List[Dict[str, Any]], 
-        batch_num: int, 
+
+    def embed_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        batch_num: int,
         total_batches: int
-    ) -> bool:
-        """Process a single batch of chunks: embed and store."""
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Embed a batch of chunks. Returns None on failure."""
         try:
             batch_size = len(batch)
-            self.logger.info(f"🔄 Processing batch {batch_num}/{total_batches} ({batch_size} chunks)")
-            
-            # Step 1: Embed the batch
+            self.logger.info(f"🔄 Embedding batch {batch_num}/{total_batches} ({batch_size} chunks)")
+
             embed_start = time.time()
             embedded_batch = self.embedder.embed_chunks(batch)
             embed_time = time.time() - embed_start
             self.stats["embedding_time"] = self.stats["embedding_time"] + embed_time  # Explicit addition
             self.stats["chunks_embedded"] += batch_size
             self.logger.info(f"⏱️ Batch {batch_num} embedding completed in {embed_time:.2f}s")
-            
+            dispatch = self.embedder.last_dispatch_stats
+            if dispatch:
+                self.logger.info(
+                    f"📈 Embedding throughput: {dispatch['chunks_per_sec']:.1f} chunks/s, "
+                    f"{dispatch['tokens_per_sec']:.0f} tokens/s"
+                )
+
             # Verify that embedding worked correctly
             if len(embedded_batch) != batch_size:
                 self.logger.warning(f"⚠️ Embedding size mismatch: {len(embedded_batch)} vs {batch_size}")
-                
-            # Verify chunk_id is preserved 
+
+            # Verify chunk_id is preserved
             for chunk in embedded_batch:
                 if "chunk_id" not in chunk:
                     self.logger.error("❌ chunk_id missing from embedded chunk!")
-                    return False
-                    
-            # Step 2: Store in ChromaDB using our custom method
+                    return None
+
+            return embedded_batch
+
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.logger.error(f"❌ Batch {batch_num} embedding failed: {e}")
+            return None
+
+    def store_batch(
+        self,
+        embedded_batch: List[Dict[str, Any]],
+        batch_num: int,
+        total_batches: int,
+        upsert: bool = False
+    ) -> bool:
+        """Store an embedded batch in ChromaDB."""
+        try:
             store_start = time.time()
-            success = self.add_to_chroma(embedded_batch)
+            success = self.add_to_chroma(embedded_batch, upsert=upsert)
             if not success:
                 self.logger.error(f"❌ Failed to store batch {batch_num} in ChromaDB")
                 return False
-                
+
             store_time = time.time() - store_start
             self.stats["storage_time"] = self.stats["storage_time"] + store_time  # Explicit addition
-            self.stats["chunks_stored"] += batch_size
+            self.stats["chunks_stored"] += len(embedded_batch)
             self.logger.info(f"⏱️ Batch {batch_num} storage completed in {store_time:.2f}s")
-            
+
             # Optional: Save embedded batch to JSON
             self.save_embedded_chunks(embedded_batch, batch_num)
-            
+
             # Update stats
             self.stats["batches_processed"] += 1
-            batch_total_time = embed_time + store_time
-            self.logger.info(f"✅ Batch {batch_num}/{total_batches} completed in {batch_total_time:.2f}s")
+            self.logger.info(f"✅ Batch {batch_num}/{total_batches} stored")
             return True
-            
+
         except Exception as e:
             self.stats["errors"] += 1
-            self.logger.error(f"❌ Batch {batch_num} failed: {e}")
+            self.logger.error(f"❌ Batch {batch_num} storage failed: {e}")
             return False
-    
+
+    def process_batch(
+        self, 
+        batch: List[Dict[str, Any]], 
+        batch_num: int, 
+        total_batches: int
+    ) -> bool:
+        """Process a single batch of chunks: embed and store."""
+        embedded_batch = self.embed_batch(batch, batch_num, total_batches)
+        if embedded_batch is None:
+            return False
+        return self.store_batch(embedded_batch, batch_num, total_batches)
+
+    def _embed_producer(
+        self,
+        remaining_chunks: Iterable[Dict[str, Any]],
+        total_batches: int,
+        embedded_queue: "queue.Queue",
+        stop_event: threading.Event
+    ) -> None:
+        """
+        Embed batches ahead of the inserter; the bounded queue applies backpressure.
+
+        The end-of-stream sentinel is always queued, even when reading the
+        chunk source raises, so the inserter never waits on a dead thread.
+        """
+        chunk_iter = iter(remaining_chunks)
+        end_idx = 0
+        batch_num = 0
+        try:
+            for batch_num in range(1, total_batches + 1):
+                if stop_event.is_set():
+                    break
+                # Only the batch being embedded is read from the chunk source
+                batch = list(islice(chunk_iter, self.batch_size))
+                if not batch:
+                    break
+                end_idx += len(batch)
+                embedded = self.embed_batch(batch, batch_num, total_batches)
+                self._put_until_stopped(embedded_queue, (batch_num, end_idx, embedded), stop_event)
+                if embedded is None:
+                    break
+        except Exception as e:
+            self.stats["errors"] += 1
+            self._put_until_stopped(embedded_queue, ProducerFailure(batch_num, e), stop_event)
+        finally:
+            self._put_until_stopped(embedded_queue, None, stop_event)
+
+    @staticmethod
+    def _put_until_stopped(embedded_queue: "queue.Queue", item: Any, stop_event: threading.Event) -> None:
+        """Block while PIPELINE_DEPTH batches wait for insertion, unless the consumer has stopped."""
+        while not stop_event.is_set():
+            try:
+                embedded_queue.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def _run_pipeline(
+        self,
+        chunks: Iterable[Dict[str, Any]],
+        on_stored: Callable[[int, List[Dict[str, Any]]], None],
+        upsert: bool = False,
+        total_chunks: Optional[int] = None
+    ) -> bool:
+        """
+        Embed batch N+1 on a producer thread while batch N is stored.
+
+        Args:
+            chunks: Chunks to embed and store, in order (a list or a stream)
+            on_stored: Called with (end index, embedded batch) after each batch is stored
+            upsert: Overwrite existing ids instead of adding
+            total_chunks: Number of chunks; required when chunks has no len()
+
+        Returns:
+            True if every batch was embedded and stored
+        """
+        if total_chunks is None:
+            total_chunks = len(chunks)
+        total_batches = (total_chunks + self.batch_size - 1) // self.batch_size
+        embedded_queue: "queue.Queue" = queue.Queue(maxsize=PIPELINE_DEPTH)
+        stop_event = threading.Event()
+        producer = threading.Thread(
+            target=self._embed_producer,
+            args=(chunks, total_batches, embedded_queue, stop_event),
+            name=f"{self.chunk_type}-embedder",
+            daemon=True
+        )
+        producer.start()
+
+        stored = 0
+        try:
+            while True:
+                try:
+                    item = embedded_queue.get(timeout=QUEUE_POLL_SECONDS)
+                except queue.Empty:
+                    if producer.is_alive():
+                        continue
+                    try:
+                        # The thread may have queued its last item just before exiting
+                        item = embedded_queue.get_nowait()
+                    except queue.Empty:
+                        self.logger.error("❌ Embedding thread exited without finishing, stopping process")
+                        return False
+                if item is None:
+                    break
+                if isinstance(item, ProducerFailure):
+                    self.logger.error(f"❌ Reading chunks failed at batch {item.batch_num}: {item.error}")
+                    return False
+                batch_num, end_idx, embedded_batch = item
+
+                if embedded_batch is None:
+                    self.logger.error(f"❌ Failed at batch {batch_num}, stopping process")
+                    return False
+
+                # Store the batch
+                success = self.store_batch(embedded_batch, batch_num, total_batches, upsert=upsert)
+                if not success:
+                    self.logger.error(f"❌ Failed at batch {batch_num}, stopping process")
+                    return False
+                stored += len(embedded_batch)
+                on_stored(end_idx, embedded_batch)
+
+                # Log overall progress
+                progress_pct = min(end_idx / total_chunks * 100, 100)
+                self.logger.info(f"🔄 Progress: {end_idx}/{total_chunks} chunks ({progress_pct:.1f}%)")
+        finally:
+            stop_event.set()
+            producer.join()
+
+        if stored < total_chunks:
+            self.logger.error("❌ Embedding stopped before all chunks were stored")
+            return False
+        return True
+
+    def _open_manifest(self) -> IndexManifest:
+        return IndexManifest(
+            self.chunk_type, self.embedder.cache_namespace, manifest_dir=self.manifest_dir, logger=self.logger
+        )
+
+    def _stored_width_differs(self) -> bool:
+        """Whether the collection already holds vectors of another width than the embedder's."""
+        stored = self.vector_store.embedding_dimension()
+        if stored is None:
+            return False
+        return len(self.embedder.embed_texts([DIMENSION_PROBE_TEXT])[0]) != stored
+
+    def _prepare_collection(self, manifest: IndexManifest) -> bool:
+        """
+        Make sure the collection takes vectors from the configured backend.
+
+        A collection whose manifest records another embedding model, or one
+        without a manifest holding vectors of another width, is recreated
+        only when rebuild was requested. Otherwise it is left untouched and
+        False is returned.
+        """
+        if manifest.model_changed:
+            reason = "it was built with another embedding model"
+        elif not manifest.exists and self._stored_width_differs():
+            reason = "it has no manifest and holds vectors of another width"
+        else:
+            return True
+
+        if not self.rebuild:
+            self.logger.error(
+                f"❌ Refusing to modify '{self.chunk_type}' in {self.chroma_path}: {reason}. "
+                f"Pass --rebuild to recreate it, or --chroma-path to index into another directory"
+            )
+            return False
+        self.logger.warning(
+            f"⚠️ Rebuilding '{self.chunk_type}' in {self.chroma_path}: {reason}; "
+            f"recreating the collection before re-embedding every chunk"
+        )
+        self.vector_store.recreate_collection()
+        self.collection_rebuilt = True
+        return True
+
+    def run_incremental(self) -> bool:
+        """
+        Re-index only what changed since the last run.
+
+        Chunks are compared with the collection's index manifest by content
+        hash: new and changed chunks are embedded and upserted, chunks that no
+        longer exist are deleted, and unchanged chunks are left alone. A
+        collection built with another embedding model is recreated and every
+        chunk embedded again, but only when rebuild was requested.
+        """
+        overall_start = time.time()
+        self.logger.info(f"🚀 Starting incremental {self.chunk_type} re-index")
+
+        try:
+            chunks = self.load_chunks()
+            manifest = self._open_manifest()
+            if not self._prepare_collection(manifest):
+                return False
+            # Without a manifest, anything in the collection that is not in the chunk file is stale
+            indexed_ids = None if manifest.exists else self.vector_store.get_ids()
+            diff = manifest.diff(chunks, indexed_ids=indexed_ids)
+            self.logger.info(f"📊 Index diff: {diff.summary()}")
+
+            if diff.removed:
+                self.vector_store.delete_ids(diff.removed)
+                manifest.forget(diff.removed)
+                manifest.save()
+
+            to_embed = set(diff.to_embed)
+            pending = [chunk for chunk in chunks if chunk["chunk_id"] in to_embed]
+            if pending:
+                def record(end_idx: int, embedded_batch: List[Dict[str, Any]]) -> None:
+                    manifest.record(embedded_batch)
+                    if end_idx % CHECKPOINT_SIZE == 0:
+                        manifest.save()
+
+                if not self._run_pipeline(pending, record, upsert=True):
+                    return False
+
+            manifest.save()
+            self.logger.info(
+                f"🎉 Incremental {self.chunk_type} re-index complete in {time.time() - overall_start:.2f}s "
+                f"({len(pending)} embedded, {len(diff.removed)} deleted)"
+            )
+            return True
+
+        except Exception as e:
+            self.logger.critical(f"❌ Incremental re-index failed: {e}")
+            return False
+
+    def run_from_shards(self, shard_dir: str) -> bool:
+        """
+        Insert pre-embedded binary shards into ChromaDB without calling the embedding API.
+
+        The shards are assumed to come from the configured embedding backend;
+        inserted chunks are recorded in the collection's index manifest, which
+        also invalidates cached search results.
+        """
+        overall_start = time.time()
+        shards = list_shards(shard_dir)
+        if not shards:
+            self.logger.error(f"❌ No binary shards found in {shard_dir}")
+            return False
+
+        manifest = self._open_manifest()
+        if not self._prepare_collection(manifest):
+            return False
+        self.logger.info(f"🚀 Inserting {len(shards)} {self.chunk_type} shards from {shard_dir}")
+        for shard_num, shard_path in enumerate(shards, start=1):
+            try:
+                for batch in iter_shard_batches(shard_path, batch_size=self.batch_size):
+                    if not self.store_batch(batch, shard_num, len(shards)):
+                        self.logger.error(f"❌ Failed at shard {shard_path}, stopping process")
+                        manifest.save()
+                        return False
+                    manifest.record(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.logger.error(f"❌ Could not read shard {shard_path}: {e}")
+                manifest.save()
+                return False
+            manifest.save()
+            self.logger.info(f"✅ Shard {shard_num}/{len(shards)} inserted: {shard_path}")
+
+        self.logger.info(f"🎉 Inserted {self.stats['chunks_stored']} chunks in {time.time() - overall_start:.2f}s")
+        return True
+
     def run(self) -> bool:
         """Run the complete embedding and storage process."""
         overall_start = time.time()
@@ -234,9 +604,15 @@ class RagSetup:
         try:
             # Step 1: Load chunks and checkpoint
             chunks = self.load_chunks()
-            starting_point = self.load_progress()
-            remaining_chunks = chunks[starting_point:]
-            total_chunks = len(remaining_chunks)
+            # The manifest lets later --incremental runs skip unchanged chunks
+            manifest = self._open_manifest()
+            if not self._prepare_collection(manifest):
+                return False
+            # A checkpoint left from before a rebuild points into the dropped collection
+            starting_point = 0 if self.collection_rebuilt else self.load_progress()
+            # Streamed, so only the batches in flight are held in memory
+            remaining_chunks = islice(chunks, starting_point, None)
+            total_chunks = max(0, len(chunks) - starting_point)
             
             if total_chunks == 0:
                 self.logger.info("✅ No chunks to process, already completed")
@@ -245,26 +621,20 @@ class RagSetup:
             total_batches = (total_chunks + self.batch_size - 1) // self.batch_size
             self.logger.info(f"📊 Processing {total_chunks} chunks in {total_batches} batches")
             
-            # Step 2: Process in batches with checkpoints
-            for i in range(0, total_chunks, self.batch_size):
-                batch_num = i // self.batch_size + 1
-                end_idx = min(i + self.batch_size, total_chunks)
-                batch = remaining_chunks[i:end_idx]
-                
-                # Process the batch
-                success = self.process_batch(batch, batch_num, total_batches)
-                if not success:
-                    self.logger.error(f"❌ Failed at batch {batch_num}, stopping process")
-                    return False
-                
-                # Save progress checkpoint periodically
+            # Step 2: Embed batch N+1 while batch N is inserted, with checkpoints
+            def checkpoint(end_idx: int, embedded_batch: List[Dict[str, Any]]) -> None:
+                manifest.record(embedded_batch)
                 chunks_completed = starting_point + end_idx
                 if chunks_completed % CHECKPOINT_SIZE == 0 or end_idx == total_chunks:
+                    manifest.save()
                     self.save_progress(chunks_completed)
-                    
-                # Log overall progress
-                progress_pct = min(end_idx / total_chunks * 100, 100)
-                self.logger.info(f"🔄 Progress: {end_idx}/{total_chunks} chunks ({progress_pct:.1f}%)")
+
+            if not self._run_pipeline(remaining_chunks, checkpoint, total_chunks=total_chunks):
+                return False
+
+            current_ids = {chunk["chunk_id"] for chunk in chunks}
+            manifest.forget([chunk_id for chunk_id in list(manifest.hashes) if chunk_id not in current_ids])
+            manifest.save()
             
             # Final stats
             total_time = time.time() - overall_start
@@ -272,8 +642,15 @@ class RagSetup:
             self.logger.info(f"⏱️ Total time: {total_time:.2f}s")
             self.logger.info(f"📊 Embedding time: {self.stats['embedding_time']:.2f}s")
             self.logger.info(f"📊 Storage time: {self.stats['storage_time']:.2f}s")
+            self.logger.info(f"📊 Backpressure pauses: {self.backpressure.total_pause:.2f}s")
             self.logger.info(f"📊 Chunks processed: {self.stats['chunks_embedded']}")
             self.logger.info(f"📊 Batches processed: {self.stats['batches_processed']}")
+            if self.embedder.cache is not None:
+                cache_stats = self.embedder.cache.stats()
+                self.logger.info(
+                    f"📊 Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['hit_rate']:.1%} hit rate)"
+                )
             
             # Clean up checkpoint file if completed successfully
             if os.path.exists(self.checkpoint_path):
@@ -290,9 +667,17 @@ class RagSetup:
 def process_collection(
     collection_type: str, 
     batch_size: int = DEFAULT_BATCH_SIZE,
-    sleep_time: float = DEFAULT_SLEEP_TIME
+    sleep_time: float = DEFAULT_SLEEP_TIME,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    from_shards: Optional[str] = None,
+    incremental: bool = False,
+    embedding_backend: Optional[str] = None,
+    dedupe: bool = False,
+    chroma_path: Optional[str] = None,
+    rebuild: bool = False
 ) -> bool:
-    """Process a single collection type."""
+    """Process a single collection type, or insert it from pre-embedded shards."""
     logger = CustomLogger("RagSetup")
     logger.info(f"=== Processing {collection_type} collection ===")
     
@@ -301,9 +686,20 @@ def process_collection(
         batch_size=batch_size,
         sleep_time=sleep_time,
         save_embedded=SAVE_EMBEDDED_JSON,
-        logger=logger
+        logger=logger,
+        max_in_flight=max_in_flight,
+        tokens_per_minute=tokens_per_minute,
+        embedding_backend=embedding_backend,
+        dedupe=dedupe,
+        chroma_path=chroma_path,
+        rebuild=rebuild
     )
-    success = setup.run()
+    if from_shards:
+        success = setup.run_from_shards(from_shards)
+    elif incremental:
+        success = setup.run_incremental()
+    else:
+        success = setup.run()
     
     if success:
         logger.info(f"✅ {collection_type} processing completed successfully")
@@ -332,14 +728,64 @@ def main():
         "--sleep-time", 
         type=float, 
         default=DEFAULT_SLEEP_TIME,
-        help=f"Sleep time between ChromaDB insertions (default: {DEFAULT_SLEEP_TIME})"
+        help=f"Maximum pause after a slow ChromaDB insertion (default: {DEFAULT_SLEEP_TIME})"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"Concurrent embedding requests (default: {DEFAULT_MAX_IN_FLIGHT})"
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=int,
+        default=DEFAULT_TOKENS_PER_MINUTE,
+        help=f"Embedding token budget per minute (default: {DEFAULT_TOKENS_PER_MINUTE})"
     )
     parser.add_argument(
         "--save-json", 
         action="store_true",
-        help="Save embedded chunks to JSON files"
+        help=f"Save embedded chunks as binary shards under {EMBEDDED_OUTPUT_DIR}"
+    )
+    parser.add_argument(
+        "--from-shards",
+        help="Insert pre-embedded binary shards from this directory instead of embedding (requires --collection)"
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=["openai", "local"],
+        help="Embedding source: OpenAI API or the offline hashed n-gram model "
+             "(default: EMBEDDING_BACKEND from the environment or .env, else openai); "
+             "the search side must use the same backend"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Embed and upsert only new or changed chunks and delete removed ones"
+    )
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Store one row per distinct chunk text, with every occurrence kept as a provenance "
+             "(build BM25 with --dedupe too so hybrid ids match)"
+    )
+    parser.add_argument(
+        "--chroma-path",
+        help="Chroma database directory (default: CHROMA_PATH from the environment or .env, "
+             "else the production directory for openai and a separate one for local)"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Allow dropping and rebuilding a collection built with another embedding backend or model"
     )
     args = parser.parse_args()
+    if args.from_shards and not args.collection:
+        parser.error("--from-shards requires --collection")
+    if args.from_shards and args.incremental:
+        parser.error("--from-shards and --incremental cannot be combined")
+    args.embedding_backend = args.embedding_backend or default_embedding_backend()
+    args.chroma_path = args.chroma_path or default_chroma_path(args.embedding_backend)
     
     # Determine which collections to process
     collections_to_process = [args.collection] if args.collection else COLLECTION_TYPES
@@ -354,8 +800,12 @@ def main():
     logger.info("=== Starting RAG Setup ===")
     logger.info(f"Processing collections: {collections_to_process}")
     logger.info(f"Batch size: {args.batch_size}")
-    logger.info(f"Sleep time: {args.sleep_time}")
+    logger.info(f"Max backpressure pause: {args.sleep_time}")
     logger.info(f"Save embedded JSON: {SAVE_EMBEDDED_JSON}")
+    logger.info(f"Incremental: {args.incremental}")
+    logger.info(f"Embedding backend: {args.embedding_backend}")
+    logger.info(f"Chroma directory: {args.chroma_path}")
+    logger.info(f"Dedupe: {args.dedupe}")
     
     start_time = time.time()
     results = {}
@@ -366,7 +816,15 @@ def main():
         success = process_collection(
             collection_type=collection,
             batch_size=args.batch_size,
-            sleep_time=args.sleep_time
+            sleep_time=args.sleep_time,
+            max_in_flight=args.max_in_flight,
+            tokens_per_minute=args.tokens_per_minute,
+            from_shards=args.from_shards,
+            incremental=args.incremental,
+            embedding_backend=args.embedding_backend,
+            dedupe=args.dedupe,
+            chroma_path=args.chroma_path,
+            rebuild=args.rebuild
         )
         collection_time = time.time() - collection_start
         results[collection] = {
@@ -0,0 +1,305 @@
+# modules/rag/metadata_store.py
+
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from modules.chunking.chunk_io import iter_chunks, resolve_chunk_path
+from modules.utils.logger import CustomLogger
+
+DEFAULT_METADATA_PATH = "embeddings/metadata"
+CHUNK_PATHS = {
+    "lines": "data/processed_chunks/lines.jsonl",
+    "phrases": "data/processed_chunks/phrases.jsonl",
+    "fragments": "data/processed_chunks/fragments.jsonl",
+}
+
+IDS_FILE = "ids.json"
+DICTIONARIES_FILE = "dictionaries.json"
+COLUMNS_FILE = "columns.npy"
+POS_OFFSETS_FILE = "pos_offsets.npy"
+POS_CODES_FILE = "pos_codes.npy"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+TEXT_FILE = "text.bin"
+MANIFEST_FILE = "manifest.json"
+
+# title/act/scene are codes into their dictionaries; missing line or word_index is -1
+COLUMN_DTYPE = np.dtype([
+    ("title", np.uint16),
+    ("act", np.uint16),
+    ("scene", np.uint16),
+    ("line", np.int32),
+    ("word_start", np.int16),
+    ("word_end", np.int16),
+])
+DICTIONARY_FIELDS = ("title", "act", "scene")
+
+
+def _location_value(value: Any) -> str:
+    """Dictionary entry for an act or scene; None, "" and "null" are the same missing value."""
+    return "" if value is None or value == "" or value == "null" else str(value)
+
+
+def _parse_word_index(value: Any) -> Tuple[int, int]:
+    try:
+        start, end = str(value).split(",")
+        return int(start), int(end)
+    except ValueError:
+        return -1, -1
+
+
+def source_fingerprint(source_path: str) -> Optional[Dict[str, Any]]:
+    """Path, size and mtime of the chunk file a store is built from, or None if it is missing."""
+    path = resolve_chunk_path(source_path)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+class ChunkMetadataStore:
+    """
+    Columnar metadata for one chunk collection, addressed by dense row id.
+
+    Row ids follow the chunk file order. Fixed-width fields live in one
+    structured array; POS tags are uint8 codes and texts a UTF-8 blob, each
+    with CSR offsets. Arrays are memory-mapped, so opening the store costs
+    little besides the id list and the small dictionaries, and lookups
+    decode only the row asked for.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_METADATA_PATH,
+        collection_name: str = "lines",
+        logger: Optional[CustomLogger] = None
+    ):
+        self.logger = logger or CustomLogger("ChunkMetadataStore")
+        self.collection_name = collection_name
+        self.directory = os.path.join(path, collection_name)
+
+        if not os.path.exists(os.path.join(self.directory, MANIFEST_FILE)):
+            raise FileNotFoundError(
+                f"No metadata store for '{collection_name}' at {self.directory}. "
+                f"Build it with: python -m modules.rag.metadata_store --collection {collection_name}"
+            )
+        start = time.time()
+        with open(os.path.join(self.directory, IDS_FILE), 'r', encoding='utf-8') as f:
+            self.ids: List[str] = json.load(f)
+        with open(os.path.join(self.directory, DICTIONARIES_FILE), 'r', encoding='utf-8') as f:
+            self.dictionaries: Dict[str, List[str]] = json.load(f)
+        self.columns = np.load(os.path.join(self.directory, COLUMNS_FILE), mmap_mode="r")
+        self.pos_offsets = np.load(os.path.join(self.directory, POS_OFFSETS_FILE), mmap_mode="r")
+        self.pos_codes = np.load(os.path.join(self.directory, POS_CODES_FILE), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(self.directory, TEXT_OFFSETS_FILE), mmap_mode="r")
+        self.text_blob = np.memmap(os.path.join(self.directory, TEXT_FILE), dtype=np.uint8, mode="r") \
+            if int(self.text_offsets[-1]) else np.zeros(0, dtype=np.uint8)
+
+        self._row_of: Optional[Dict[str, int]] = None
+        self._codes: Dict[str, Dict[str, int]] = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in self.dictionaries.items()
+        }
+        self._line_rows: Optional[Dict[Tuple[int, int, int, int], int]] = None
+
+        self.logger.info(
+            f"Loaded metadata store '{collection_name}': {self.count()} rows in {time.time() - start:.2f}s"
+        )
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        if self._row_of is None:
+            self._row_of = {cid: row for row, cid in enumerate(self.ids)}
+        return self._row_of.get(chunk_id)
+
+    def text(self, row: int) -> str:
+        start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+        return bytes(self.text_blob[start:end]).decode("utf-8")
+
+    def pos_codes_of(self, row: int) -> np.ndarray:
+        """POS codes of a row as a view into the mapped array."""
+        return self.pos_codes[int(self.pos_offsets[row]):int(self.pos_offsets[row + 1])]
+
+    def pos(self, row: int) -> List[str]:
+        tags = self.dictionaries["pos"]
+        return [tags[code] for code in self.pos_codes_of(row)]
+
+    def word_range(self, row: int) -> Optional[Tuple[int, int]]:
+        start, end = int(self.columns["word_start"][row]), int(self.columns["word_end"][row])
+        return (start, end) if start >= 0 else None
+
+    def reference(self, row: int) -> Dict[str, Any]:
+        """Rebuild the location fields of one row as a chunk-style dictionary."""
+        record = self.columns[row]
+        word_range = self.word_range(row)
+        return {
+            "chunk_id": self.ids[row],
+            "title": self.dictionaries["title"][record["title"]],
+            "act": self.dictionaries["act"][record["act"]] or None,
+            "scene": self.dictionaries["scene"][record["scene"]] or None,
+            "line": int(record["line"]),
+            "word_index": f"{word_range[0]},{word_range[1]}" if word_range else "",
+        }
+
+    def find_line(self, title: str, act: Any, scene: Any, line: Any) -> Optional[int]:
+        """
+        Row of the chunk at a title/act/scene/line location, or None.
+
+        Missing act or scene values (None, "", "null") match each other,
+        as in Validator's ground truth lookup. The first row at a location
+        wins.
+        """
+        codes = (
+            self._codes["title"].get(str(title)),
+            self._codes["act"].get(_location_value(act)),
+            self._codes["scene"].get(_location_value(scene)),
+        )
+        line_number = _as_int(line)
+        if None in codes or line_number < 0:
+            return None
+        if self._line_rows is None:
+            c = self.columns
+            keys = zip(c["title"].tolist(), c["act"].tolist(), c["scene"].tolist(), c["line"].tolist())
+            self._line_rows = {}
+            for row, key in enumerate(keys):
+                self._line_rows.setdefault(key, row)
+        return self._line_rows.get(codes + (line_number,))
+
+
+def build_metadata_store(
+    chunks: Iterable[Dict[str, Any]],
+    path: str = DEFAULT_METADATA_PATH,
+    collection_name: str = "lines",
+    logger: Optional[CustomLogger] = None,
+    source_path: Optional[str] = None
+) -> str:
+    """
+    Write the columnar store for a collection from its chunk dictionaries.
+
+    When the chunks come from source_path, its fingerprint is recorded in
+    the manifest so open_metadata_store can tell when the file has changed.
+
+    Returns:
+        Directory the store was written to
+    """
+    logger = logger or CustomLogger("MetadataStoreBuilder")
+    directory = os.path.join(path, collection_name)
+    os.makedirs(directory, exist_ok=True)
+    start = time.time()
+
+    dictionaries: Dict[str, Dict[str, int]] = {field: {} for field in DICTIONARY_FIELDS + ("pos",)}
+    ids: List[str] = []
+    records: List[Tuple[int, ...]] = []
+    pos_lists: List[List[int]] = []
+    text_lengths: List[int] = []
+
+    with open(os.path.join(directory, TEXT_FILE), 'wb') as text_file:
+        for chunk in chunks:
+            ids.append(chunk["chunk_id"])
+            word_start, word_end = _parse_word_index(chunk.get("word_index", ""))
+            records.append((
+                dictionaries["title"].setdefault(str(chunk.get("title", "")), len(dictionaries["title"])),
+                dictionaries["act"].setdefault(_location_value(chunk.get("act")), len(dictionaries["act"])),
+                dictionaries["scene"].setdefault(_location_value(chunk.get("scene")), len(dictionaries["scene"])),
+                _as_int(chunk.get("line")),
+                word_start,
+                word_end,
+            ))
+            pos_tags = chunk.get("POS") if isinstance(chunk.get("POS"), list) else []
+            pos_lists.append([dictionaries["pos"].setdefault(str(t), len(dictionaries["pos"])) for t in pos_tags])
+            encoded = str(chunk.get("text", "")).encode("utf-8")
+            text_file.write(encoded)
+            text_lengths.append(len(encoded))
+
+    if len(dictionaries["pos"]) > 256:
+        raise ValueError(f"{len(dictionaries['pos'])} distinct POS tags do not fit uint8 codes")
+
+    pos_offsets = np.zeros(len(pos_lists) + 1, dtype=np.int64)
+    pos_offsets[1:] = np.cumsum([len(codes) for codes in pos_lists])
+    pos_codes = np.fromiter((c for codes in pos_lists for c in codes), dtype=np.uint8, count=int(pos_offsets[-1]))
+    text_offsets = np.zeros(len(text_lengths) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum(text_lengths)
+
+    np.save(os.path.join(directory, COLUMNS_FILE), np.array(records, dtype=COLUMN_DTYPE))
+    np.save(os.path.join(directory, POS_OFFSETS_FILE), pos_offsets)
+    np.save(os.path.join(directory, POS_CODES_FILE), pos_codes)
+    np.save(os.path.join(directory, TEXT_OFFSETS_FILE), text_offsets)
+    with open(os.path.join(directory, IDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(ids, f, ensure_ascii=False)
+    with open(os.path.join(directory, DICTIONARIES_FILE), 'w', encoding='utf-8') as f:
+        json.dump({field: list(values) for field, values in dictionaries.items()}, f, ensure_ascii=False)
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "count": len(ids),
+            "pos_tags": len(dictionaries["pos"]),
+            "source": source_fingerprint(source_path) if source_path else None,
+        }, f, indent=2)
+
+    logger.info(
+        f"Built metadata store '{collection_name}': {len(ids)} rows, "
+        f"{len(dictionaries['title'])} titles in {time.time() - start:.2f}s → {directory}"
+    )
+    return directory
+
+
+def open_metadata_store(
+    collection_name: str,
+    path: str = DEFAULT_METADATA_PATH,
+    logger: Optional[CustomLogger] = None,
+    source_path: Optional[str] = None
+) -> Optional[ChunkMetadataStore]:
+    """
+    Open a collection's store if it has been built from the current chunk file, else None.
+
+    The store must have been built from source_path (by default the
+    collection's processed chunk file) at its current size and mtime;
+    a store built from another file, or before the file was rewritten,
+    is not used and callers fall back to the chunk file.
+    """
+    manifest_path = os.path.join(path, collection_name, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    source_path = source_path or CHUNK_PATHS.get(collection_name)
+    if source_path:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            built_from = json.load(f).get("source")
+        if built_from != source_fingerprint(source_path):
+            (logger or CustomLogger("ChunkMetadataStore")).warning(
+                f"⚠️ Metadata store '{collection_name}' was not built from the current {source_path} "
+                f"(built from {built_from.get('path') if built_from else 'an unknown file'}); "
+                f"using the chunk file instead. Rebuild with: python -m modules.rag.metadata_store "
+                f"--collection {collection_name}"
+            )
+            return None
+    return ChunkMetadataStore(path, collection_name, logger=logger)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build columnar chunk metadata stores from processed chunks")
+    parser.add_argument("--collection", choices=list(CHUNK_PATHS), help="Build only one collection")
+    parser.add_argument("--chunks-path", help="Read chunks from this file instead (requires --collection)")
+    args = parser.parse_args()
+    if args.chunks_path and not args.collection:
+        parser.error("--chunks-path requires --collection")
+
+    logger = CustomLogger("MetadataStoreBuilder")
+    for collection in [args.collection] if args.collection else list(CHUNK_PATHS):
+        chunks_path = args.chunks_path or CHUNK_PATHS[collection]
+        build_metadata_store(iter_chunks(chunks_path), collection_name=collection, logger=logger, source_path=chunks_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# modules/rag/neighbour_graph.py
+
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from modules.utils.logger import CustomLogger
+
+DEFAULT_GRAPH_PATH = "embeddings/neighbour_graph"
+DEFAULT_SIMILAR_K = 8
+BUILD_BATCH_SIZE = 256  # line vectors per nearest-neighbour query batch
+TARGET_LEVELS = ("phrases", "fragments")
+
+LINE_IDS_FILE = "line_ids.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def _iter_rows(store: Any, page_size: int = 5000, with_vectors: bool = False) -> Iterator[Tuple[str, Dict[str, Any], Any]]:
+    """(chunk_id, metadata, vector or None) for every row of a NumpyVectorStore or Chroma VectorStore."""
+    if hasattr(store, "vectors"):
+        for row, (chunk_id, metadata) in enumerate(zip(store.ids, store.metadatas)):
+            yield chunk_id, metadata, (store.vectors[row] if with_vectors else None)
+        return
+    collection = store.collection
+    include = ["metadatas", "embeddings"] if with_vectors else ["metadatas"]
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(offset=offset, limit=page_size, include=include)
+        vectors = page["embeddings"] if with_vectors else [None] * len(page["ids"])
+        for chunk_id, metadata, vector in zip(page["ids"], page["metadatas"], vectors):
+            yield chunk_id, metadata or {}, vector
+
+
+def _csr(lists: Sequence[Sequence[Any]], dtype) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values in lists])
+    data = np.fromiter((v for values in lists for v in values), dtype=dtype, count=int(offsets[-1]))
+    return offsets, data
+
+
+class NeighbourGraph:
+    """
+    Precomputed phrase and fragment neighbours of every line chunk.
+
+    For each target level there are two CSR adjacency lists over line rows:
+    "source" holds the chunks cut from that line (by source_chunk_id) and
+    "similar" the k nearest chunks by embedding, with their squared L2
+    distances to the line as float16. Neighbours are stored as row numbers
+    into the level's id list, so the arrays stay small integers and are
+    memory-mapped on load.
+    """
+
+    def __init__(self, path: str = DEFAULT_GRAPH_PATH, logger: Optional[CustomLogger] = None):
+        self.logger = logger or CustomLogger("NeighbourGraph")
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No neighbour graph at {path}. Build it with: python -m modules.rag.neighbour_graph"
+            )
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        with open(os.path.join(path, LINE_IDS_FILE), 'r', encoding='utf-8') as f:
+            self.line_row: Dict[str, int] = {chunk_id: row for row, chunk_id in enumerate(json.load(f))}
+
+        self.target_ids: Dict[str, List[str]] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        for level in self.manifest["levels"]:
+            with open(os.path.join(path, f"{level}_ids.json"), 'r', encoding='utf-8') as f:
+                self.target_ids[level] = json.load(f)
+            for name in ("source_offsets", "source_rows", "similar_offsets", "similar_rows", "similar_distances"):
+                self.arrays[f"{level}_{name}"] = np.load(os.path.join(path, f"{level}_{name}.npy"), mmap_mode="r")
+        self.logger.info(
+            f"Loaded neighbour graph: {len(self.line_row)} lines, levels {self.manifest['levels']}, "
+            f"k={self.manifest['similar_k']}"
+        )
+
+    def neighbours(self, line_chunk_id: str, level: str) -> List[Tuple[str, float]]:
+        """
+        Neighbours of one line chunk at a level: its own chunks first (distance 0), then similar ones.
+
+        Returns:
+            (chunk_id, distance to the line) pairs without duplicates
+        """
+        row = self.line_row.get(line_chunk_id)
+        if row is None or level not in self.target_ids:
+            return []
+        ids = self.target_ids[level]
+        a = self.arrays
+        start, end = int(a[f"{level}_source_offsets"][row]), int(a[f"{level}_source_offsets"][row + 1])
+        found = {ids[int(r)]: 0.0 for r in a[f"{level}_source_rows"][start:end]}
+        start, end = int(a[f"{level}_similar_offsets"][row]), int(a[f"{level}_similar_offsets"][row + 1])
+        for r, d in zip(a[f"{level}_similar_rows"][start:end], a[f"{level}_similar_distances"][start:end]):
+            found.setdefault(ids[int(r)], float(d))
+        return list(found.items())
+
+
+def build_neighbour_graph(
+    line_store: Any,
+    target_stores: Dict[str, Any],
+    path: str = DEFAULT_GRAPH_PATH,
+    similar_k: int = DEFAULT_SIMILAR_K,
+    batch_size: int = BUILD_BATCH_SIZE,
+    logger: Optional[CustomLogger] = None
+) -> str:
+    """
+    Build the graph from opened collections (NumPy or Chroma backed).
+
+    Similar neighbours come from each target store's own query_many, so an
+    IVF or quantized NumPy index keeps the build fast.
+
+    Args:
+        line_store: Store holding the line chunks
+        target_stores: Level name ("phrases", "fragments") -> store
+
+    Returns:
+        Directory the graph was written to
+    """
+    logger = logger or CustomLogger("NeighbourGraphBuilder")
+    os.makedirs(path, exist_ok=True)
+    start = time.time()
+
+    line_ids = [chunk_id for chunk_id, _, _ in _iter_rows(line_store)]
+    line_row = {chunk_id: row for row, chunk_id in enumerate(line_ids)}
+    with open(os.path.join(path, LINE_IDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(line_ids, f)
+    logger.info(f"Building neighbour graph for {len(line_ids)} lines")
+
+    # Source edges: chunks cut from each line, from the target metadata
+    target_row: Dict[str, Dict[str, int]] = {}
+    children: Dict[str, List[List[int]]] = {}
+    for level, store in target_stores.items():
+        ids: List[str] = []
+        children[level] = [[] for _ in line_ids]
+        for row, (chunk_id, metadata, _) in enumerate(_iter_rows(store)):
+            ids.append(chunk_id)
+            parent = line_row.get(metadata.get("source_chunk_id"))
+            if parent is not None:
+                children[level][parent].append(row)
+        target_row[level] = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        with open(os.path.join(path, f"{level}_ids.json"), 'w', encoding='utf-8') as f:
+            json.dump(ids, f)
+
+    # Similarity edges: line vectors streamed in batches through each target index
+    similar: Dict[str, List[List[int]]] = {level: [] for level in target_stores}
+    similar_dist: Dict[str, List[List[float]]] = {level: [] for level in target_stores}
+    batch: List[List[float]] = []
+    done = 0
+
+    def flush():
+        for level, store in target_stores.items():
+            for result in store.query_many(batch, n_results=similar_k):
+                similar[level].append([target_row[level][chunk_id] for chunk_id in result["ids"]])
+                similar_dist[level].append(result["distances"])
+        logger.debug(f"Queried neighbours for {done}/{len(line_ids)} lines")
+        batch.clear()
+
+    for row, (chunk_id, _, vector) in enumerate(_iter_rows(line_store, with_vectors=True)):
+        if chunk_id != line_ids[row]:
+            raise ValueError(f"Line collection changed during the build (row {row}); rebuild the graph")
+        batch.append([float(v) for v in vector])
+        done += 1
+        if len(batch) == batch_size:
+            flush()
+    if batch:
+        flush()
+
+    for level in target_stores:
+        source_offsets, source_rows = _csr(children[level], np.int32)
+        similar_offsets, similar_rows = _csr(similar[level], np.int32)
+        _, similar_distances = _csr(similar_dist[level], np.float16)
+        np.save(os.path.join(path, f"{level}_source_offsets.npy"), source_offsets)
+        np.save(os.path.join(path, f"{level}_source_rows.npy"), source_rows)
+        np.save(os.path.join(path, f"{level}_similar_offsets.npy"), similar_offsets)
+        np.save(os.path.join(path, f"{level}_similar_rows.npy"), similar_rows)
+        np.save(os.path.join(path, f"{level}_similar_distances.npy"), similar_distances)
+        logger.info(
+            f"{level}: {len(source_rows)} source edges, {len(similar_rows)} similarity edges "
+            f"over {len(target_row[level])} chunks"
+        )
+
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"lines": len(line_ids), "levels": list(target_stores), "similar_k": similar_k}, f, indent=2)
+    logger.info(f"✅ Neighbour graph written to {path} in {time.time() - start:.1f}s")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute phrase/fragment neighbours of every line chunk")
+    parser.add_argument("--k", type=int, default=DEFAULT_SIMILAR_K, help="Similar neighbours per line and level")
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"], default="chroma",
+                        help="Index to read vectors from and run the neighbour queries against")
+    args = parser.parse_args()
+
+    logger = CustomLogger("NeighbourGraphBuilder")
+    if args.vector_backend == "numpy":
+        from modules.rag.numpy_store import NumpyVectorStore
+
+        def open_store(name):
+            return NumpyVectorStore(collection_name=name, logger=logger)
+    else:
+        from modules.rag.vector_store import VectorStore
+
+        def open_store(name):
+            return VectorStore(collection_name=name, logger=logger)
+
+    build_neighbour_graph(
+        open_store("lines"),
+        {level: open_store(level) for level in TARGET_LEVELS},
+        similar_k=args.k,
+        logger=logger
+    )
+
+
+if __name__ == "__main__":
+    main()
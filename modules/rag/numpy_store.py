@@ -0,0 +1,389 @@
+# modules/rag/numpy_store.py
+
+import os
+import json
+import time
+import argparse
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from modules.rag.filters import SearchConstraints, SessionRowExclusions, combine_row_masks
+from modules.rag.quantization import (
+    DEFAULT_PQ_SUBSPACES, Quantizer, build_matryoshka_index, load_matryoshka_index,
+    load_quantizer, quantize_numpy_store
+)
+from modules.rag.vector_math import kmeans, squared_l2, top_k
+from modules.rag.vector_store import QueryResult
+from modules.utils.logger import CustomLogger
+
+DEFAULT_NUMPY_PATH = "embeddings/numpy_vectors"
+SCAN_BLOCK_ROWS = 65_536  # rows scored per block so float16 matrices are never upcast whole
+DEFAULT_RERANK_FACTOR = 4  # quantized search shortlists n_results * factor rows for exact re-ranking
+
+VECTORS_FILE = "vectors.npy"
+NORMS_FILE = "norms.npy"
+ROWS_FILE = "rows.jsonl"
+MANIFEST_FILE = "manifest.json"
+CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+IVF_ROWS_FILE = "ivf_rows.npy"
+
+
+class NumpyVectorStore:
+    """
+    Read-only vector index held in a memory-mapped NumPy matrix.
+
+    Each collection lives in its own directory with the embedding matrix
+    (float32 or float16), precomputed squared row norms, a side table of
+    ids/documents/metadata keyed by row index and, optionally, an IVF
+    partitioning (k-means centroids plus rows grouped by cluster) for
+    approximate search. Distances are squared L2, matching Chroma's default
+    space, so results are interchangeable with VectorStore.
+
+    If the index has been quantized, or coarse_dims selects one of its
+    Matryoshka (truncated-dimension) copies, searches scan that compact
+    representation instead and re-rank a shortlist of
+    n_results * rerank_factor rows against the full-precision matrix.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_NUMPY_PATH,
+        collection_name: str = "shakespeare_chunks",
+        nprobe: int = 8,
+        rerank_factor: int = DEFAULT_RERANK_FACTOR,
+        use_quantization: bool = True,
+        coarse_dims: Optional[int] = None,
+        logger: Optional[CustomLogger] = None
+    ):
+        self.logger = logger or CustomLogger("NumpyVectorStore")
+        self.collection_name = collection_name
+        self.directory = os.path.join(path, collection_name)
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor
+
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No NumPy index for '{collection_name}' at {self.directory}. "
+                f"Build it with: python -m modules.rag.numpy_store --collection {collection_name}"
+            )
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+
+        start = time.time()
+        self.vectors = np.load(os.path.join(self.directory, VECTORS_FILE), mmap_mode="r")
+        self.norms = np.load(os.path.join(self.directory, NORMS_FILE), mmap_mode="r")
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(os.path.join(self.directory, ROWS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                self.ids.append(row["id"])
+                self.documents.append(row["document"])
+                self.metadatas.append(row["metadata"])
+
+        self.centroids: Optional[np.ndarray] = None
+        if self.manifest.get("nlist"):
+            self.centroids = np.load(os.path.join(self.directory, CENTROIDS_FILE))
+            self.ivf_offsets = np.load(os.path.join(self.directory, IVF_OFFSETS_FILE))
+            self.ivf_rows = np.load(os.path.join(self.directory, IVF_ROWS_FILE), mmap_mode="r")
+
+        # SearchConstraints -> boolean mask of rows that satisfy them
+        self._row_masks: Dict[SearchConstraints, np.ndarray] = {}
+        self._exclusions: Optional[SessionRowExclusions] = None  # built on first use
+        self._row_of: Optional[Dict[str, int]] = None
+
+        self.quantizer: Optional[Quantizer] = None
+        quantization = self.manifest.get("quantization")
+        if coarse_dims and coarse_dims in self.manifest.get("matryoshka_dims", []):
+            self.quantizer = load_matryoshka_index(self.directory, coarse_dims)
+        elif coarse_dims:
+            self.logger.warning(
+                f"No {coarse_dims}-dim Matryoshka index for '{collection_name}'; "
+                f"build it with: python -m modules.rag.numpy_store --collection {collection_name} "
+                f"--matryoshka-dims {coarse_dims}"
+            )
+        if self.quantizer is None and quantization and use_quantization:
+            self.quantizer = load_quantizer(self.directory, quantization)
+
+        self.logger.info(
+            f"Loaded NumPy index '{collection_name}': {self.count()} rows x {self.manifest['dim']} "
+            f"({self.manifest['dtype']}, nlist={self.manifest.get('nlist', 0)}, "
+            f"coarse={self.quantizer.kind if self.quantizer else 'none'}) in {time.time() - start:.2f}s"
+        )
+
+    def count(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def get_by_ids(self, ids: Sequence[str]) -> QueryResult:
+        """Fetch documents and metadata by chunk_id, in the order given; unknown ids are skipped."""
+        if self._row_of is None:
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        rows = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows],
+            "metadatas": [dict(self.metadatas[row]) for row in rows],
+        }
+
+    def supports_filters(self) -> bool:
+        """Whether rows carry the filter flags (the Chroma collection had them when exported)."""
+        return bool(self.metadatas) and "has_propn" in self.metadatas[0]
+
+    def _allowed_rows(self, constraints: Optional[SearchConstraints]) -> Optional[np.ndarray]:
+        """Boolean mask of rows satisfying the constraints, computed once per distinct constraints."""
+        if constraints is None or constraints.is_empty():
+            return None
+        mask = self._row_masks.get(constraints)
+        if mask is None:
+            mask = np.fromiter((constraints.matches(m) for m in self.metadatas), dtype=bool, count=self.count())
+            self._row_masks[constraints] = mask
+        return mask
+
+    def _excluded_rows(self, exclude_ids: Optional[AbstractSet[str]]) -> Optional[np.ndarray]:
+        if not exclude_ids and self._exclusions is None:
+            return None
+        if self._exclusions is None:
+            self._exclusions = SessionRowExclusions(self.ids)
+        return self._exclusions.update(exclude_ids if exclude_ids is not None else frozenset())
+
+    def _shortlist_size(self, n_results: int) -> int:
+        return n_results * self.rerank_factor if self.quantizer is not None else n_results
+
+    def _distances(self, queries: np.ndarray, prepared: Any, rows: Union[slice, np.ndarray]) -> np.ndarray:
+        """Score rows with the quantized codes if present, else with the full vectors."""
+        if self.quantizer is not None:
+            return self.quantizer.distances(prepared, rows)
+        return squared_l2(queries, self.vectors[rows], self.norms[rows])
+
+    def _prepare(self, queries: np.ndarray) -> Any:
+        return self.quantizer.prepare(queries) if self.quantizer is not None else None
+
+    def _search_exact(self, queries: np.ndarray, n_results: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        k = self._shortlist_size(n_results)
+        prepared = self._prepare(queries)
+        best_idx = np.empty((len(queries), 0), dtype=np.int64)
+        best_dist = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, self.count(), SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.count())
+            dist = self._distances(queries, prepared, slice(start, end))
+            if allowed is not None:
+                dist = np.where(allowed[start:end], dist, np.inf)
+            idx, d = top_k(dist, k)
+            # Merge this block's winners with the running top-k
+            merged_idx = np.concatenate([best_idx, idx + start], axis=1)
+            merged_dist = np.concatenate([best_dist, d], axis=1)
+            keep, best_dist = top_k(merged_dist, k)
+            best_idx = np.take_along_axis(merged_idx, keep, axis=1)
+        return best_idx, best_dist
+
+    def _search_ivf(self, queries: np.ndarray, n_results: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        assert self.centroids is not None
+        k = self._shortlist_size(n_results)
+        c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        probe, _ = top_k(squared_l2(queries, self.centroids, c_norms), self.nprobe)
+
+        all_idx, all_dist = [], []
+        for q, clusters in enumerate(probe):
+            rows = np.concatenate([
+                self.ivf_rows[self.ivf_offsets[c]:self.ivf_offsets[c + 1]] for c in clusters
+            ]).astype(np.int64)
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            rows.sort()  # sequential reads from the memmap
+            dist = self._distances(queries[q:q + 1], self._prepare(queries[q:q + 1]), rows)
+            idx, d = top_k(dist, k)
+            all_idx.append(rows[idx[0]])
+            all_dist.append(d[0])
+        return self._pad(all_idx, all_dist, k)
+
+    def _rerank(self, queries: np.ndarray, shortlist: np.ndarray, coarse_dist: np.ndarray, n_results: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact distances for each query's shortlisted rows; only those rows of the full matrix are read."""
+        all_idx, all_dist = [], []
+        for q, (rows, coarse) in enumerate(zip(shortlist, coarse_dist)):
+            # Padding and rows excluded by constraints carry an infinite coarse distance
+            rows = np.sort(rows[(rows >= 0) & np.isfinite(coarse)])
+            dist = squared_l2(queries[q:q + 1], self.vectors[rows], self.norms[rows])
+            idx, d = top_k(dist, n_results)
+            all_idx.append(rows[idx[0]])
+            all_dist.append(d[0])
+        return self._pad(all_idx, all_dist, n_results)
+
+    @staticmethod
+    def _pad(all_idx: List[np.ndarray], all_dist: List[np.ndarray], n_results: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Stack ragged per-query results, padding with -1 / inf."""
+        idx = np.full((len(all_idx), n_results), -1, dtype=np.int64)
+        dist = np.full((len(all_idx), n_results), np.inf, dtype=np.float32)
+        for q, (i, d) in enumerate(zip(all_idx, all_dist)):
+            idx[q, :len(i)] = i
+            dist[q, :len(d)] = d
+        return idx, dist
+
+    def _rows_to_result(self, rows: Iterable[int], distances: Iterable[float]) -> QueryResult:
+        result: QueryResult = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row, dist in zip(rows, distances):
+            if row < 0 or not np.isfinite(dist):
+                continue
+            result["ids"].append(self.ids[row])
+            result["documents"].append(self.documents[row])
+            result["metadatas"].append(dict(self.metadatas[row]))
+            result["distances"].append(float(dist))
+        return result
+
+    def query_many(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 5,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> List[QueryResult]:
+        """
+        Return one normalized result per query vector, in input order (same shape as VectorStore.query_many).
+
+        Rows failing the optional constraints, or whose ids are in exclude_ids,
+        are masked out before the top-k selection.
+        """
+        if not query_embeddings:
+            return []
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        allowed = combine_row_masks(self._allowed_rows(constraints), self._excluded_rows(exclude_ids))
+        if self.centroids is not None:
+            idx, dist = self._search_ivf(queries, n_results, allowed)
+        else:
+            idx, dist = self._search_exact(queries, n_results, allowed)
+        if self.quantizer is not None:
+            idx, dist = self._rerank(queries, idx, dist, n_results)
+        return [self._rows_to_result(i, d) for i, d in zip(idx.tolist(), dist.tolist())]
+
+    def query(self, query_text, embedding_function, n_results=5):
+        self.logger.debug(f"Querying for: {query_text}")
+        result = self.query_many([embedding_function([query_text])[0]], n_results=n_results)[0]
+        return {key: [values] for key, values in result.items()}
+
+
+def build_numpy_store(
+    rows: Iterable[Tuple[str, str, Dict[str, Any], Sequence[float]]],
+    total: int,
+    dim: int,
+    path: str = DEFAULT_NUMPY_PATH,
+    collection_name: str = "shakespeare_chunks",
+    dtype: str = "float32",
+    nlist: int = 0,
+    logger: Optional[CustomLogger] = None
+) -> str:
+    """
+    Write a NumPy index from (id, document, metadata, embedding) rows.
+
+    Args:
+        rows: Iterable of rows in the order they should be stored
+        total: Number of rows the iterable will yield
+        dim: Embedding dimension
+        dtype: "float32" or "float16" storage for the matrix
+        nlist: Number of IVF partitions; 0 builds an exact-search-only index
+
+    Returns:
+        Directory the index was written to
+    """
+    logger = logger or CustomLogger("NumpyStoreBuilder")
+    directory = os.path.join(path, collection_name)
+    os.makedirs(directory, exist_ok=True)
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(directory, VECTORS_FILE), mode="w+", dtype=np.dtype(dtype), shape=(total, dim)
+    )
+    norms = np.empty(total, dtype=np.float32)
+
+    count = 0
+    with open(os.path.join(directory, ROWS_FILE), 'w', encoding='utf-8') as f:
+        for chunk_id, document, metadata, embedding in rows:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vectors[count] = vector
+            stored = vectors[count].astype(np.float32)
+            norms[count] = float(stored @ stored)
+            f.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n")
+            count += 1
+    if count != total:
+        raise ValueError(f"Expected {total} rows for '{collection_name}', got {count}")
+    vectors.flush()
+    np.save(os.path.join(directory, NORMS_FILE), norms)
+
+    nlist = min(nlist, total)
+    if nlist > 0:
+        logger.info(f"Training IVF partitioning with {nlist} lists")
+        centroids = kmeans(vectors, nlist)
+        c_norms = np.einsum("ij,ij->i", centroids, centroids)
+        assign = np.empty(total, dtype=np.int32)
+        for start in range(0, total, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, total)
+            assign[start:end] = np.argmin(squared_l2(centroids, vectors[start:end], norms[start:end]), axis=0)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        np.save(os.path.join(directory, CENTROIDS_FILE), centroids)
+        np.save(os.path.join(directory, IVF_OFFSETS_FILE), offsets)
+        np.save(os.path.join(directory, IVF_ROWS_FILE), order)
+
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"count": total, "dim": dim, "dtype": dtype, "nlist": nlist, "metric": "l2"}, f, indent=2)
+
+    logger.info(f"Wrote NumPy index '{collection_name}' ({total} rows, {dtype}) to {directory}")
+    return directory
+
+
+def export_chroma_collection(
+    collection_name: str,
+    chroma_path: str = "embeddings/chromadb_vectors",
+    path: str = DEFAULT_NUMPY_PATH,
+    dtype: str = "float32",
+    nlist: int = 0,
+    page_size: int = 5000,
+    logger: Optional[CustomLogger] = None
+) -> str:
+    """Copy an existing Chroma collection into a NumPy index."""
+    from modules.rag.vector_store import VectorStore
+
+    logger = logger or CustomLogger("NumpyStoreBuilder")
+    collection = VectorStore(path=chroma_path, collection_name=collection_name, logger=logger).collection
+    total = collection.count()
+    if total == 0:
+        raise ValueError(f"Chroma collection '{collection_name}' is empty")
+    dim = len(collection.get(limit=1, include=["embeddings"])["embeddings"][0])
+
+    def rows():
+        for offset in range(0, total, page_size):
+            page = collection.get(
+                offset=offset, limit=page_size, include=["embeddings", "documents", "metadatas"]
+            )
+            for chunk_id, doc, meta, emb in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"]):
+                yield chunk_id, doc, meta or {}, emb
+            logger.info(f"Exported {min(offset + page_size, total)}/{total} rows from '{collection_name}'")
+
+    return build_numpy_store(rows(), total, dim, path=path, collection_name=collection_name,
+                             dtype=dtype, nlist=nlist, logger=logger)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Chroma collections into memory-mapped NumPy indexes")
+    parser.add_argument("--collection", choices=["lines", "phrases", "fragments"], help="Export only one collection")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="Matrix storage type")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF partitions for approximate search (0 = exact only)")
+    parser.add_argument("--quantize", choices=["int8", "pq"], help="Also build quantized codes for the index")
+    parser.add_argument("--pq-m", type=int, default=DEFAULT_PQ_SUBSPACES, help="PQ subspaces (bytes per vector)")
+    parser.add_argument("--matryoshka-dims", type=int, nargs="*", default=[],
+                        help="Also build truncated coarse indexes with these dimensions (e.g. 256)")
+    args = parser.parse_args()
+
+    logger = CustomLogger("NumpyStoreBuilder")
+    for collection in [args.collection] if args.collection else ["lines", "phrases", "fragments"]:
+        directory = export_chroma_collection(collection, dtype=args.dtype, nlist=args.nlist, logger=logger)
+        if args.quantize:
+            quantize_numpy_store(directory, args.quantize, args.pq_m, logger=logger)
+        for dims in args.matryoshka_dims:
+            build_matryoshka_index(directory, dims, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+# modules/rag/quantization.py
+
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from modules.rag.vector_math import kmeans, squared_l2, top_k
+from modules.utils.logger import CustomLogger
+
+CODES_FILE = "quant_codes.npy"
+CODE_NORMS_FILE = "quant_norms.npy"
+PARAMS_FILE = "quant_params.npz"
+REPORT_FILE = "quantization_report.json"
+MATRYOSHKA_FILE = "matryoshka_{dims}.npy"
+
+DEFAULT_PQ_SUBSPACES = 64
+PQ_CENTROIDS = 256  # one uint8 code per subspace
+ENCODE_BLOCK_ROWS = 65_536
+
+RowSelector = Union[slice, np.ndarray]
+
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantization with a per-dimension offset and scale.
+
+    Each dimension's observed range is mapped onto 256 levels, cutting
+    storage to a quarter of float32. Distances are computed directly from
+    the codes: with d = (c + 128) * scale + offset,
+    q.d = (q * scale).c + 128 * sum(q * scale) + q.offset, so no decoded
+    matrix is ever materialized.
+    """
+
+    kind = "int8"
+
+    def __init__(self, offset: np.ndarray, scale: np.ndarray):
+        self.offset = offset.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+        self.codes: Optional[np.ndarray] = None
+        self.code_norms: Optional[np.ndarray] = None
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, sample_size: int = 100_000, seed: int = 0) -> "ScalarQuantizer":
+        rng = np.random.default_rng(seed)
+        n = vectors.shape[0]
+        sample = np.asarray(vectors[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))],
+                            dtype=np.float32)
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        scale = np.maximum(high - low, 1e-12) / 255.0
+        return cls(low, scale)
+
+    def encode(self, block: np.ndarray) -> np.ndarray:
+        levels = np.rint((np.asarray(block, dtype=np.float32) - self.offset) / self.scale)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) + 128.0) * self.scale + self.offset
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim + 4  # codes + float32 norm
+
+    def attach(self, codes: np.ndarray, code_norms: Optional[np.ndarray]) -> None:
+        self.codes = codes
+        self.code_norms = code_norms
+
+    def prepare(self, queries: np.ndarray) -> Dict[str, np.ndarray]:
+        scaled = queries * self.scale
+        return {
+            "scaled": scaled,
+            "const": 128.0 * scaled.sum(axis=1) + queries @ self.offset,
+            "q_norms": np.einsum("ij,ij->i", queries, queries),
+        }
+
+    def distances(self, prepared: Dict[str, np.ndarray], rows: RowSelector) -> np.ndarray:
+        """Approximate squared L2 distances between prepared queries and the selected code rows."""
+        assert self.codes is not None and self.code_norms is not None
+        codes = self.codes[rows].astype(np.float32)
+        dots = prepared["scaled"] @ codes.T + prepared["const"][:, None]
+        return prepared["q_norms"][:, None] + self.code_norms[rows][None, :] - 2.0 * dots
+
+    def code_norms_for(self, codes: np.ndarray) -> np.ndarray:
+        decoded = self.decode(codes)
+        return np.einsum("ij,ij->i", decoded, decoded).astype(np.float32)
+
+    def save(self, directory: str) -> None:
+        np.savez(os.path.join(directory, PARAMS_FILE), offset=self.offset, scale=self.scale)
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the vector is split into m subspaces and each
+    sub-vector is replaced by the id of its nearest of 256 centroids.
+
+    Queries are scored with asymmetric distance computation: a per-query
+    table of squared distances to every centroid, summed over the codes.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codebooks: np.ndarray):
+        self.codebooks = codebooks.astype(np.float32)  # (m, ksub, dsub)
+        self.m, self.ksub, self.dsub = self.codebooks.shape
+        self.codes: Optional[np.ndarray] = None
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, m: int = DEFAULT_PQ_SUBSPACES, seed: int = 0) -> "ProductQuantizer":
+        dim = vectors.shape[1]
+        if dim % m:
+            raise ValueError(f"Dimension {dim} is not divisible into {m} PQ subspaces")
+        dsub = dim // m
+        ksub = min(PQ_CENTROIDS, vectors.shape[0])
+        codebooks = np.stack([
+            kmeans(_SubspaceView(vectors, j * dsub, (j + 1) * dsub), ksub, seed=seed + j)
+            for j in range(m)
+        ])
+        return cls(codebooks)
+
+    def encode(self, block: np.ndarray) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float32)
+        codes = np.empty((len(block), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = block[:, j * self.dsub:(j + 1) * self.dsub]
+            c_norms = np.einsum("ij,ij->i", self.codebooks[j], self.codebooks[j])
+            codes[:, j] = np.argmin(squared_l2(sub, self.codebooks[j], c_norms), axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.m)], axis=1)
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self.m
+
+    def attach(self, codes: np.ndarray, code_norms: Optional[np.ndarray]) -> None:
+        self.codes = codes
+
+    def prepare(self, queries: np.ndarray) -> np.ndarray:
+        tables = np.empty((len(queries), self.m, self.ksub), dtype=np.float32)
+        for j in range(self.m):
+            sub = queries[:, j * self.dsub:(j + 1) * self.dsub]
+            c_norms = np.einsum("ij,ij->i", self.codebooks[j], self.codebooks[j])
+            tables[:, j, :] = squared_l2(sub, self.codebooks[j], c_norms)
+        return tables
+
+    def distances(self, prepared: np.ndarray, rows: RowSelector) -> np.ndarray:
+        """Approximate squared L2 distances between the queries' lookup tables and the selected code rows."""
+        assert self.codes is not None
+        codes = np.asarray(self.codes[rows])
+        dist = np.zeros((prepared.shape[0], len(codes)), dtype=np.float32)
+        for j in range(self.m):
+            dist += prepared[:, j, codes[:, j]]
+        return dist
+
+    def code_norms_for(self, codes: np.ndarray) -> Optional[np.ndarray]:
+        return None
+
+    def save(self, directory: str) -> None:
+        np.savez(os.path.join(directory, PARAMS_FILE), codebooks=self.codebooks)
+
+
+def truncate_and_normalize(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """Keep the leading dims of each vector and rescale to unit length (Matryoshka shortening)."""
+    head = np.asarray(vectors[:, :dims], dtype=np.float32)
+    norms = np.linalg.norm(head, axis=1, keepdims=True)
+    return head / np.maximum(norms, 1e-12)
+
+
+class MatryoshkaIndex:
+    """
+    Coarse index of truncated, re-normalized embeddings.
+
+    text-embedding-3 vectors are trained so their leading dimensions form a
+    usable lower-resolution embedding. Scanning e.g. 256 of 3072 dimensions
+    cuts per-query compute and resident memory by an order of magnitude; the
+    shortlist is then re-ranked at full width.
+    """
+
+    kind = "matryoshka"
+
+    def __init__(self, dims: int):
+        self.dims = dims
+        self.codes: Optional[np.ndarray] = None
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self.dims * (self.codes.dtype.itemsize if self.codes is not None else 4)
+
+    def attach(self, codes: np.ndarray, code_norms: Optional[np.ndarray]) -> None:
+        self.codes = codes
+
+    def prepare(self, queries: np.ndarray) -> np.ndarray:
+        return truncate_and_normalize(queries, self.dims)
+
+    def distances(self, prepared: np.ndarray, rows: RowSelector) -> np.ndarray:
+        """Squared L2 between unit vectors: 2 - 2 * cosine similarity."""
+        assert self.codes is not None
+        block = np.asarray(self.codes[rows], dtype=np.float32)
+        return 2.0 - 2.0 * (prepared @ block.T)
+
+
+Quantizer = Union[ScalarQuantizer, ProductQuantizer, MatryoshkaIndex]
+
+
+class _SubspaceView:
+    """Column slice of a (possibly memory-mapped) matrix that kmeans can sample rows from."""
+
+    def __init__(self, vectors: np.ndarray, start: int, end: int):
+        self.vectors, self.start, self.end = vectors, start, end
+        self.shape = (vectors.shape[0], end - start)
+
+    def __getitem__(self, rows):
+        return np.asarray(self.vectors[rows], dtype=np.float32)[:, self.start:self.end]
+
+
+def fit_quantizer(vectors: np.ndarray, kind: str, pq_subspaces: int = DEFAULT_PQ_SUBSPACES) -> Quantizer:
+    if kind == "int8":
+        return ScalarQuantizer.fit(vectors)
+    if kind == "pq":
+        return ProductQuantizer.fit(vectors, m=pq_subspaces)
+    raise ValueError(f"Unknown quantization kind: {kind}")
+
+
+def encode_all(quantizer: Quantizer, vectors: np.ndarray, codes_path: Optional[str] = None):
+    """Encode every row block-wise; returns (codes, code norms or None)."""
+    n = vectors.shape[0]
+    width = vectors.shape[1] if quantizer.kind == "int8" else quantizer.m
+    dtype = np.int8 if quantizer.kind == "int8" else np.uint8
+    if codes_path:
+        codes = np.lib.format.open_memmap(codes_path, mode="w+", dtype=dtype, shape=(n, width))
+    else:
+        codes = np.empty((n, width), dtype=dtype)
+    norms = np.empty(n, dtype=np.float32) if quantizer.kind == "int8" else None
+    for start in range(0, n, ENCODE_BLOCK_ROWS):
+        end = min(start + ENCODE_BLOCK_ROWS, n)
+        block_codes = quantizer.encode(vectors[start:end])
+        codes[start:end] = block_codes
+        if norms is not None:
+            norms[start:end] = quantizer.code_norms_for(block_codes)
+    return codes, norms
+
+
+def load_quantizer(directory: str, spec: Dict[str, Any]) -> Quantizer:
+    """Load a quantizer and its memory-mapped codes from a NumPy index directory."""
+    params = np.load(os.path.join(directory, PARAMS_FILE))
+    codes = np.load(os.path.join(directory, CODES_FILE), mmap_mode="r")
+    quantizer: Quantizer
+    if spec["kind"] == "int8":
+        quantizer = ScalarQuantizer(params["offset"], params["scale"])
+        quantizer.attach(codes, np.load(os.path.join(directory, CODE_NORMS_FILE)))
+    elif spec["kind"] == "pq":
+        quantizer = ProductQuantizer(params["codebooks"])
+        quantizer.attach(codes, None)
+    else:
+        raise ValueError(f"Unknown quantization kind: {spec['kind']}")
+    return quantizer
+
+
+def build_matryoshka_index(
+    directory: str,
+    dims: int,
+    dtype: str = "float16",
+    logger: Optional[CustomLogger] = None
+) -> None:
+    """Write a truncated, re-normalized copy of a NumPy index's vectors and register it in the manifest."""
+    from modules.rag.numpy_store import MANIFEST_FILE, VECTORS_FILE
+
+    logger = logger or CustomLogger("Quantizer")
+    vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+    if dims >= vectors.shape[1]:
+        raise ValueError(f"Matryoshka dims {dims} must be smaller than the full dimension {vectors.shape[1]}")
+    coarse = np.lib.format.open_memmap(
+        os.path.join(directory, MATRYOSHKA_FILE.format(dims=dims)), mode="w+",
+        dtype=np.dtype(dtype), shape=(vectors.shape[0], dims)
+    )
+    for start in range(0, vectors.shape[0], ENCODE_BLOCK_ROWS):
+        end = min(start + ENCODE_BLOCK_ROWS, vectors.shape[0])
+        coarse[start:end] = truncate_and_normalize(vectors[start:end], dims)
+    coarse.flush()
+
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest["matryoshka_dims"] = sorted(set(manifest.get("matryoshka_dims", [])) | {dims})
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Built {dims}-dim Matryoshka index for {directory} ({dtype})")
+
+
+def load_matryoshka_index(directory: str, dims: int) -> MatryoshkaIndex:
+    index = MatryoshkaIndex(dims)
+    index.attach(np.load(os.path.join(directory, MATRYOSHKA_FILE.format(dims=dims)), mmap_mode="r"), None)
+    return index
+
+
+def quantize_numpy_store(
+    directory: str,
+    kind: str,
+    pq_subspaces: int = DEFAULT_PQ_SUBSPACES,
+    logger: Optional[CustomLogger] = None
+) -> Dict[str, Any]:
+    """
+    Add a quantized copy of an existing NumPy index's vectors.
+
+    The full-precision matrix stays on disk for re-ranking; searches scan
+    the compact codes and only touch full vectors for the shortlist.
+
+    Returns:
+        The quantization entry written to the index manifest
+    """
+    from modules.rag.numpy_store import MANIFEST_FILE, VECTORS_FILE
+
+    logger = logger or CustomLogger("Quantizer")
+    vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+    start = time.time()
+    quantizer = fit_quantizer(vectors, kind, pq_subspaces)
+    _, norms = encode_all(quantizer, vectors, codes_path=os.path.join(directory, CODES_FILE))
+    quantizer.save(directory)
+    if norms is not None:
+        np.save(os.path.join(directory, CODE_NORMS_FILE), norms)
+
+    spec: Dict[str, Any] = {"kind": kind, "bytes_per_vector": quantizer.bytes_per_vector(vectors.shape[1])}
+    if kind == "pq":
+        spec["m"] = pq_subspaces
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest["quantization"] = spec
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Quantized {vectors.shape[0]} rows in {directory} as {kind} in {time.time() - start:.2f}s")
+    return spec
+
+
+def recall_report(
+    vectors: np.ndarray,
+    configs: List[Dict[str, Any]],
+    num_queries: int = 200,
+    k: int = 10,
+    rerank_factors: tuple = (1, 4, 16),
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Measure recall@k against exact search for each quantization setting.
+
+    Queries are stored rows with small Gaussian noise, so they resemble real
+    lookups without being exact matches.
+
+    Returns:
+        One entry per (config, rerank factor) with recall, bytes per vector
+        and the compression ratio against float32
+    """
+    rng = np.random.default_rng(seed)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    n, dim = matrix.shape
+    picks = rng.choice(n, size=min(num_queries, n), replace=False)
+    queries = matrix[picks] + rng.normal(scale=0.01, size=(len(picks), dim)).astype(np.float32)
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+    truth, _ = top_k(squared_l2(queries, matrix, norms), k)
+    float32_bytes = dim * 4
+
+    report = []
+    for config in configs:
+        quantizer = fit_quantizer(matrix, config["kind"], config.get("m", DEFAULT_PQ_SUBSPACES))
+        codes, code_norms = encode_all(quantizer, matrix)
+        quantizer.attach(codes, code_norms)
+        approx = quantizer.distances(quantizer.prepare(queries), slice(None))
+        for factor in rerank_factors:
+            shortlist, _ = top_k(approx, k * factor)
+            found = []
+            for q in range(len(queries)):
+                rows = shortlist[q]
+                exact = squared_l2(queries[q:q + 1], matrix[rows], norms[rows])
+                best, _ = top_k(exact, k)
+                found.append(rows[best[0]])
+            recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+            bpv = quantizer.bytes_per_vector(dim)
+            report.append({
+                **config,
+                "rerank_factor": factor,
+                f"recall@{k}": round(float(recall), 4),
+                "bytes_per_vector": bpv,
+                "compression": round(float32_bytes / bpv, 1),
+            })
+    return report
+
+
+def main():
+    from modules.rag.numpy_store import DEFAULT_NUMPY_PATH, VECTORS_FILE
+
+    parser = argparse.ArgumentParser(description="Quantize NumPy vector indexes and report recall vs memory")
+    parser.add_argument("--collection", default="fragments", choices=["lines", "phrases", "fragments"])
+    parser.add_argument("--kind", choices=["int8", "pq"], help="Quantize the index with this scheme")
+    parser.add_argument("--pq-m", type=int, default=DEFAULT_PQ_SUBSPACES, help="PQ subspaces (bytes per vector)")
+    parser.add_argument("--report", action="store_true", help="Print a recall-vs-memory report instead")
+    parser.add_argument("--report-rows", type=int, default=50_000, help="Rows sampled for the report")
+    args = parser.parse_args()
+
+    logger = CustomLogger("Quantizer")
+    directory = os.path.join(DEFAULT_NUMPY_PATH, args.collection)
+
+    if args.report:
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(vectors.shape[0], size=min(args.report_rows, vectors.shape[0]), replace=False))
+        configs = [{"kind": "int8"}] + [{"kind": "pq", "m": m} for m in (32, 64, 128) if vectors.shape[1] % m == 0]
+        report = recall_report(vectors[rows], configs)
+        logger.info(f"Recall vs memory for '{args.collection}' ({len(rows)} rows, float32 = {vectors.shape[1] * 4} B/vector)")
+        for entry in report:
+            logger.info(json.dumps(entry))
+        with open(os.path.join(directory, REPORT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return
+
+    if not args.kind:
+        parser.error("--kind is required unless --report is given")
+    quantize_numpy_store(directory, args.kind, args.pq_m, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,25 @@
 # rerun_fragments_only.py
 
-import json
 import time
 from chromadb import PersistentClient
+from modules.chunking.chunk_io import iter_chunks
 from modules.rag.embeddings import EmbeddingGenerator
+from modules.rag.index_manifest import remove_manifest
 from modules.rag.vector_store import VectorStore
 from modules.utils.logger import CustomLogger
 
-FRAGMENTS_JSON = "data/processed_chunks/fragments.json"
+FRAGMENTS_JSON = "data/processed_chunks/fragments.jsonl"
 CHROMA_PATH = "embeddings/chromadb_vectors"
 COLLECTION_NAME = "fragments"
 
 def load_chunks(path: str) -> list:
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)["chunks"]
+    return list(iter_chunks(path))
 
 def delete_fragment_collection(path=CHROMA_PATH, collection_name=COLLECTION_NAME):
     client = PersistentClient(path=path)
     try:
         client.delete_collection(name=collection_name)
+        remove_manifest(collection_name)
         print(f"🧹 Deleted existing Chroma collection: '{collection_name}'")
     except Exception as e:
         print(f"⚠️ Warning: Could not delete collection '{collection_name}': {e}")
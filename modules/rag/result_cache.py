@@ -0,0 +1,98 @@
+# modules/rag/result_cache.py
+
+import os
+import json
+import sqlite3
+import threading
+from typing import Any, AbstractSet, Dict, Optional, Tuple
+
+from modules.rag.filters import SearchConstraints
+from modules.utils.logger import CustomLogger
+
+DEFAULT_RESULT_CACHE_DIR = "data/retrieval_cache"
+
+
+def result_cache_key(line_key: str, mode: str, constraints: Optional[SearchConstraints]) -> str:
+    """Cache key for a normalized line searched in a mode under some constraints."""
+    constraints_dict = constraints.to_dict() if constraints is not None else None
+    return json.dumps([line_key, mode, constraints_dict], sort_keys=True, ensure_ascii=False)
+
+
+class RetrievalResultCache:
+    """
+    Raw search results of one translation session, persisted in SQLite.
+
+    Each row holds the largest top_k fetched for a line, the chunk ids that
+    were excluded when it was fetched, and the search_chunks returned. A
+    row is only served while those ids are still excluded, so results are
+    never missing chunks that became usable again. All rows are dropped
+    when the index version (see index_manifest.index_version) changes.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        index_version: str,
+        cache_dir: str = DEFAULT_RESULT_CACHE_DIR,
+        logger: Optional[CustomLogger] = None
+    ):
+        self.logger = logger or CustomLogger("RetrievalResultCache")
+        self.path = os.path.join(cache_dir, f"{session_id}.sqlite")
+        self.index_version = index_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " fetched_k INTEGER NOT NULL,"
+            " excluded TEXT NOT NULL,"
+            " chunks TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'index_version'").fetchone()
+        if row is not None and row[0] != index_version:
+            cleared = self._conn.execute("DELETE FROM results").rowcount
+            self.logger.info(f"🧹 Index changed since this session's searches; dropped {cleared} cached results")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('index_version', ?)", (index_version,)
+        )
+        self._conn.commit()
+        self.logger.info(f"Retrieval result cache at {self.path} ({len(self)} entries)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0])
+
+    def get(self, key: str, top_k: int, exclude_ids: AbstractSet[str]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Cached (fetched_k, search_chunks) for a key if it covers top_k under the current exclusions.
+
+        Chunks excluded since the fetch are still in the result; the caller
+        drops them as it does for its in-memory memo.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_k, excluded, chunks FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] < top_k or not set(json.loads(row[1])) <= exclude_ids:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return int(row[0]), json.loads(row[2])
+
+    def put(self, key: str, fetched_k: int, exclude_ids: AbstractSet[str], chunks: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, fetched_k, excluded, chunks) VALUES (?, ?, ?, ?)",
+                (key, fetched_k, json.dumps(sorted(exclude_ids)), json.dumps(chunks, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
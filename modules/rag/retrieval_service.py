@@ -0,0 +1,331 @@
+# modules/rag/retrieval_service.py
+
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+import http.client
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AbstractSet, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+from modules.rag.embedding_cache import normalize_text
+from modules.rag.filters import SearchConstraints, SessionExcludedIds
+from modules.utils.logger import CustomLogger
+
+DEFAULT_SERVICE_HOST = "127.0.0.1"
+DEFAULT_SERVICE_PORT = 8765
+PREPARED_CACHE_SIZE = 4096  # lines whose query plan and vectors the service keeps
+MAX_SESSIONS = 64  # client sessions whose used chunk ids the service keeps
+REQUEST_TIMEOUT = 120
+
+
+def retrieval_service_url() -> Optional[str]:
+    """
+    The RETRIEVAL_SERVICE_URL setting (e.g. http://127.0.0.1:8765), or None.
+
+    When set, RagCaller talks to a running service instead of loading its
+    own indexes. Read on each call, after loading .env, rather than at import.
+    """
+    load_dotenv()
+    return os.getenv("RETRIEVAL_SERVICE_URL") or None
+
+
+class SessionOutOfSync(Exception):
+    """The service's copy of a session's used chunk ids differs from the client's."""
+
+
+class RetrievalService:
+    """
+    One warm ShakespeareSearchEngine shared by every client.
+
+    Indexes, chunkers and the embedding cache are loaded once. Query plans
+    and vectors are cached per normalized line, and all uncached lines of a
+    batch are embedded in a single request. Searches run one batch at a time
+    since the engine's chunkers and index bitsets are not thread-safe.
+
+    Each client session's used chunk ids are kept here, so a client sends
+    only the ids added since its previous batch, and the indexes keep one
+    exclusion bitset per session.
+    """
+
+    def __init__(self, engine: Any = None, logger: Optional[CustomLogger] = None):
+        self.logger = logger or CustomLogger("RetrievalService")
+        if engine is None:
+            from modules.rag.search_engine import ShakespeareSearchEngine
+            engine = ShakespeareSearchEngine(logger=self.logger)
+        self.engine = engine
+        self._prepared: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sessions: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "requests": 0, "prepared_hits": 0}
+
+    def _prepare_all(self, lines: List[str]) -> Dict[str, Dict[str, Any]]:
+        keys = [normalize_text(line) for line in lines]
+        missing = {key: line for key, line in zip(keys, lines) if key not in self._prepared}
+        if missing:
+            for key, prepared in zip(missing, self.engine.prepare_queries(list(missing.values()))):
+                self._prepared[key] = prepared
+        self.stats["prepared_hits"] += len(keys) - len(missing)
+
+        found = {}
+        for key in keys:
+            self._prepared.move_to_end(key)
+            found[key] = self._prepared[key]
+        while len(self._prepared) > PREPARED_CACHE_SIZE:
+            self._prepared.popitem(last=False)
+        return found
+
+    def _session_exclusion(self, session: Dict[str, Any]) -> SessionExcludedIds:
+        """Apply a client's used-id update to its session and return the session's ids."""
+        session_id = str(session["id"])
+        used = None if session.get("reset") else self._sessions.get(session_id)
+        if used is None:
+            used = set()
+        used.update(session.get("added") or ())
+        self._sessions[session_id] = used
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > MAX_SESSIONS:
+            self._sessions.popitem(last=False)
+        if len(used) != int(session.get("count", len(used))):
+            # Evicted, or the service restarted: the client resends its full set
+            del self._sessions[session_id]
+            raise SessionOutOfSync(f"Session {session_id} has {len(used)} used ids, client has {session.get('count')}")
+        return SessionExcludedIds(used, session_id)
+
+    def search_batch(
+        self, requests: List[Dict[str, Any]], session: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Run a batch of search requests.
+
+        Args:
+            requests: Dictionaries with "line" and optional "top_k", "mode"
+                ("standard" or "hybrid"), "constraints" and "exclude_ids"
+            session: Optional {"id", "added", "reset", "count"} update of the
+                client session's used chunk ids; when given, those ids are
+                excluded from every request instead of each "exclude_ids"
+
+        Returns:
+            The search_chunks of each request, in order
+
+        Raises:
+            SessionOutOfSync: If the session's ids no longer match "count"
+        """
+        with self._lock:
+            session_ids = self._session_exclusion(session) if session else None
+            prepared = self._prepare_all([request["line"] for request in requests])
+            results = []
+            for request in requests:
+                line = request["line"]
+                search = self.engine.hybrid_search if request.get("mode") == "hybrid" else self.engine.search_line
+                result = search(
+                    line,
+                    int(request.get("top_k", 5)),
+                    prepared=prepared[normalize_text(line)],
+                    constraints=SearchConstraints.from_dict(request.get("constraints")),
+                    exclude_ids=(session_ids if session_ids is not None
+                                 else frozenset(request.get("exclude_ids") or ()))
+                )
+                results.append(result["search_chunks"])
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(requests)
+            return results
+
+
+class _RetrievalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients reuse their connection
+    service: RetrievalService
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.service.stats})
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/search":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            requests = payload["requests"]
+            start = time.time()
+            results = self.service.search_batch(requests, payload.get("session"))
+            self.service.logger.debug(f"Served {len(requests)} searches in {time.time() - start:.3f}s")
+            self._send_json(200, {"results": results})
+        except SessionOutOfSync as e:
+            self._send_json(409, {"error": str(e)})
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {"error": f"Bad request: {e}"})
+        except Exception as e:
+            self.service.logger.error(f"❌ Search failed: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        self.service.logger.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(
+    service: RetrievalService,
+    host: str = DEFAULT_SERVICE_HOST,
+    port: int = DEFAULT_SERVICE_PORT
+) -> ThreadingHTTPServer:
+    """Bind an HTTP server for the service; port 0 picks a free port."""
+    handler = type("RetrievalHandler", (_RetrievalHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class RetrievalClient:
+    """
+    Client for a running retrieval service.
+
+    Each thread keeps one persistent HTTP connection; a connection the
+    server has closed is reopened once per request. The client is one
+    session on the service: after the first batch it sends only the used
+    chunk ids added since, and resends the full set when they shrink or
+    the service has lost them.
+    """
+
+    def __init__(self, url: str, timeout: float = REQUEST_TIMEOUT, logger: Optional[CustomLogger] = None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or DEFAULT_SERVICE_HOST
+        self.port = parsed.port or DEFAULT_SERVICE_PORT
+        self.timeout = timeout
+        self.logger = logger or CustomLogger("RetrievalClient")
+        self._local = threading.local()
+        self.session_id = uuid.uuid4().hex
+        self._synced_ids: Set[str] = set()  # used ids the service holds for this session
+        self._session_lock = threading.Lock()
+
+    def _session_update(self, exclude_ids: AbstractSet[str], resync: bool = False) -> Dict[str, Any]:
+        with self._session_lock:
+            reset = resync or not self._synced_ids <= exclude_ids
+            if reset:
+                added = list(exclude_ids)
+                self._synced_ids = set(exclude_ids)
+            else:
+                added = list(exclude_ids - self._synced_ids)
+                self._synced_ids.update(added)
+        return {"id": self.session_id, "added": sorted(added), "reset": reset, "count": len(exclude_ids)}
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (http.client.HTTPException, ConnectionError, OSError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status == 409:
+            raise SessionOutOfSync(data.get("error"))
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval service error {response.status}: {data.get('error')}")
+        return data
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def search_many(
+        self, requests: List[Dict[str, Any]], exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Send a batch of search requests (see RetrievalService.search_batch) in one round trip.
+
+        exclude_ids, when given, are this session's used chunk ids; only the
+        ones the service has not seen yet are sent.
+        """
+        if not requests:
+            return []
+        payload: Dict[str, Any] = {"requests": requests}
+        for attempt in range(2):
+            if exclude_ids is not None:
+                payload["session"] = self._session_update(exclude_ids, resync=bool(attempt))
+            try:
+                return self._request("POST", "/search", payload)["results"]
+            except SessionOutOfSync:
+                self.logger.info("Retrieval service lost this session's used ids, resending them")
+                if attempt or exclude_ids is None:
+                    raise
+        return []
+
+    def search(
+        self,
+        modern_line: str,
+        top_k: int = 5,
+        mode: str = "standard",
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> Dict[str, Any]:
+        return self.search_many([make_request(modern_line, top_k, mode, constraints)], exclude_ids)[0]
+
+
+def make_request(
+    modern_line: str,
+    top_k: int = 5,
+    mode: str = "standard",
+    constraints: Optional[SearchConstraints] = None
+) -> Dict[str, Any]:
+    """Build one entry of a search batch; used chunk ids travel with the batch's session."""
+    return {
+        "line": modern_line,
+        "top_k": top_k,
+        "mode": mode,
+        "constraints": constraints.to_dict() if constraints is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Shakespeare retrieval over localhost HTTP")
+    parser.add_argument("--host", default=DEFAULT_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVICE_PORT)
+    args = parser.parse_args()
+
+    logger = CustomLogger("RetrievalService")
+    start = time.time()
+    service = RetrievalService(logger=logger)
+    server = create_server(service, args.host, args.port)
+    logger.info(
+        f"✅ Retrieval service ready in {time.time() - start:.1f}s on http://{args.host}:{server.server_port} "
+        f"(set RETRIEVAL_SERVICE_URL to use it)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down retrieval service")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,347 @@
 from modules.rag.embeddings import EmbeddingGenerator
-from modules.rag.vector_store import VectorStore
+from modules.rag.vector_store import VectorStore, default_chroma_path
 from modules.chunking.phrase_chunker import PhraseChunker
 from modules.chunking.fragment_chunker import FragmentChunker
 from modules.utils.logger import CustomLogger
+from modules.rag.vector_store import QueryResult
+from modules.rag.filters import SearchConstraints
+from typing import AbstractSet, Any, Dict, List, Optional, Sequence, Tuple
+import os
 import time
 import json
 
+# Vector index backend: "chroma" (persistent Chroma collections) or
+# "numpy" (memory-mapped matrices exported by modules.rag.numpy_store)
+DEFAULT_VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Two-stage Matryoshka search per collection (numpy backend): candidates come
+# from a truncated-dimension index and are re-ranked at full width. None keeps
+# single-stage full-width search.
+DEFAULT_COARSE_DIMS: Dict[str, Optional[int]] = {"lines": None, "phrases": 256, "fragments": 256}
+COARSE_RERANK_FACTOR = 10  # shortlist n_results * factor candidates for the full-width re-rank
+
+RRF_K = 60  # reciprocal-rank fusion damping constant
+
+
+def reciprocal_rank_fusion(ranked_results: Sequence[QueryResult], limit: Optional[int] = None) -> QueryResult:
+    """
+    Fuse ranked result lists with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (RRF_K + rank)) over the lists it appears in.
+    Fused distances are 1 - score / best_score, so lower stays better, and
+    "best_ranks" records each document's best 0-based rank in any input list.
+
+    Args:
+        ranked_results: Normalized results (ids, documents, metadatas, ...), best first
+        limit: Keep at most this many fused results
+
+    Returns:
+        One normalized result ordered by fused score
+    """
+    scores: Dict[str, float] = {}
+    entries: Dict[str, Any] = {}
+    best_ranks: Dict[str, int] = {}
+    for result in ranked_results:
+        for rank, (chunk_id, doc, meta) in enumerate(zip(
+            result.get("ids", []), result.get("documents", []), result.get("metadatas", [])
+        )):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            entries.setdefault(chunk_id, (doc, meta))
+            best_ranks[chunk_id] = min(rank, best_ranks.get(chunk_id, rank))
+
+    ordered = sorted(scores, key=lambda chunk_id: scores[chunk_id], reverse=True)[:limit]
+    fused: QueryResult = {"ids": [], "documents": [], "metadatas": [], "distances": [], "best_ranks": []}
+    if not ordered:
+        return fused
+    best = scores[ordered[0]]
+    for chunk_id in ordered:
+        doc, meta = entries[chunk_id]
+        fused["ids"].append(chunk_id)
+        fused["documents"].append(doc)
+        fused["metadatas"].append(meta)
+        fused["distances"].append(1.0 - scores[chunk_id] / best)
+        fused["best_ranks"].append(best_ranks[chunk_id])
+    return fused
+
 class ShakespeareSearchEngine:
-    def __init__(self, logger=None):
+    def __init__(
+        self,
+        logger=None,
+        vector_backend: Optional[str] = None,
+        coarse_dims: Optional[Dict[str, Optional[int]]] = None,
+        embedding_backend: Optional[str] = None,
+        chroma_path: Optional[str] = None
+    ):
         self.logger = logger or CustomLogger("SearchEngine")
-        self.embedder = EmbeddingGenerator(logger=self.logger)
+        # Queries must be embedded by the same backend that built the index
+        self.embedder = EmbeddingGenerator(logger=self.logger, backend=embedding_backend)
+        self.chroma_path = chroma_path or default_chroma_path(embedding_backend)
+        self.vector_backend = vector_backend or DEFAULT_VECTOR_BACKEND
+        self.coarse_dims = dict(DEFAULT_COARSE_DIMS, **(coarse_dims or {}))
+        self.logger.info(f"Using '{self.vector_backend}' vector backend")
         self.vector_stores = {
-            "lines": VectorStore(collection_name="lines", logger=self.logger),
-            "phrases": VectorStore(collection_name="phrases", logger=self.logger),
-            "fragments": VectorStore(collection_name="fragments", logger=self.logger),
+            name: self._create_vector_store(name) for name in ["lines", "phrases", "fragments"]
         }
         self.phrase_chunker = PhraseChunker(logger=self.logger)
         self.fragment_chunker = FragmentChunker(logger=self.logger)
+        # Lexical indexes for hybrid search, opened on first use
+        self._bm25_indexes: Optional[Dict[str, Any]] = None
+        # id(index) -> whether it stores the flags constraints are evaluated on
+        self._filter_support: Dict[int, bool] = {}
+        # Precomputed line -> phrase/fragment neighbours, opened on first use (False if missing)
+        self._neighbour_graph: Any = None
+
+    def _create_vector_store(self, collection_name: str):
+        """Open one collection with the configured backend."""
+        if self.vector_backend == "numpy":
+            from modules.rag.numpy_store import NumpyVectorStore
+            return NumpyVectorStore(
+                collection_name=collection_name,
+                coarse_dims=self.coarse_dims.get(collection_name),
+                rerank_factor=COARSE_RERANK_FACTOR,
+                logger=self.logger
+            )
+        if self.vector_backend != "chroma":
+            raise ValueError(f"Unknown vector backend: {self.vector_backend}")
+        return VectorStore(path=self.chroma_path, collection_name=collection_name, logger=self.logger)
+
+    def _get_bm25_indexes(self) -> Dict[str, Any]:
+        """Open the persisted BM25 indexes once; collections without one are skipped."""
+        if self._bm25_indexes is None:
+            from modules.rag.bm25_index import BM25Index
+            self._bm25_indexes = {}
+            for name in ["lines", "phrases", "fragments"]:
+                try:
+                    self._bm25_indexes[name] = BM25Index(collection_name=name, logger=self.logger)
+                except FileNotFoundError as e:
+                    self.logger.warning(f"⚠️ {e} Hybrid search will use vector results only for '{name}'.")
+        return self._bm25_indexes
+
+    def _get_neighbour_graph(self) -> Any:
+        if self._neighbour_graph is None:
+            from modules.rag.neighbour_graph import NeighbourGraph
+            try:
+                self._neighbour_graph = NeighbourGraph(logger=self.logger)
+            except FileNotFoundError as e:
+                self.logger.warning(f"⚠️ {e} Candidate expansion will re-query instead.")
+                self._neighbour_graph = False
+        return self._neighbour_graph or None
+
+    def expand_from_lines(
+        self,
+        line_hits: Sequence[Tuple[str, float]],
+        limit: int = 10,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> Optional[Dict[str, QueryResult]]:
+        """
+        Phrase and fragment candidates reached from line-level hits through the neighbour graph.
+
+        No embedding or nearest-neighbour query is made: neighbours are read
+        from the graph and their documents fetched by id. A candidate's
+        distance is its line hit's distance plus its stored distance to that
+        line (0 for chunks cut from the line itself).
+
+        Args:
+            line_hits: (line chunk_id, distance) pairs, best first
+            limit: Maximum candidates per level
+            constraints: Optional metadata constraints the candidates must satisfy
+            exclude_ids: Optional chunk ids to leave out
+
+        Returns:
+            Normalized results for "phrases" and "fragments", or None without a graph
+        """
+        graph = self._get_neighbour_graph()
+        if graph is None:
+            return None
+        exclude_ids = exclude_ids or frozenset()
+        expanded: Dict[str, QueryResult] = {}
+        for level in ["phrases", "fragments"]:
+            best: Dict[str, float] = {}
+            for line_id, line_distance in line_hits:
+                for chunk_id, distance in graph.neighbours(line_id, level):
+                    if chunk_id not in exclude_ids:
+                        best[chunk_id] = min(best.get(chunk_id, float("inf")), line_distance + distance)
+            # Fetch a margin beyond the limit since constraints may reject some
+            ordered = sorted(best, key=best.get)[:limit * 3]
+            store = self.vector_stores[level]
+            fetched = store.get_by_ids(ordered)
+            level_constraints = self._pushdown(store, level, constraints)
+            result: QueryResult = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for chunk_id, doc, meta in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                if level_constraints is not None and not level_constraints.matches(meta):
+                    continue
+                result["ids"].append(chunk_id)
+                result["documents"].append(doc)
+                result["metadatas"].append(meta)
+                result["distances"].append(best[chunk_id])
+                if len(result["ids"]) == limit:
+                    break
+            expanded[level] = result
+        return expanded
+
+    def _pushdown(self, index: Any, name: str, constraints: Optional[SearchConstraints]) -> Optional[SearchConstraints]:
+        """
+        Constraints to hand to an index, or None if it cannot evaluate them.
+
+        Indexes built before filter flags existed would reject every document,
+        so they are searched unconstrained and Selector filters afterwards.
+        """
+        if constraints is None or constraints.is_empty():
+            return None
+        key = id(index)
+        if key not in self._filter_support:
+            supported = getattr(index, "supports_filters", lambda: False)()
+            if not supported:
+                self.logger.warning(
+                    f"⚠️ '{name}' index has no filter flags; constraints are applied after retrieval. "
+                    f"Run: python -m modules.rag.filters --collection {name}"
+                )
+            self._filter_support[key] = supported
+        return constraints if self._filter_support[key] else None
+
+    def _build_query_plan(self, modern_line: str) -> Dict[str, List[str]]:
+        """
+        Chunk the modern line up front so every text that needs a vector is known
+        before any embedding request is made.
+
+        Returns:
+            Dictionary mapping each query group ("line", "phrases", "fragments")
+            to the texts to embed for it, in query order.
+        """
+        line_dict = {"text": modern_line, "chunk_id": "input_line"}
+        phrase_chunks = self.phrase_chunker.chunk_from_line_chunks([line_dict])
+        fragment_chunks = self.fragment_chunker.chunk_from_line_chunks([line_dict])
+
+        return {
+            "line": [modern_line],
+            "phrases": [chunk["text"] for chunk in phrase_chunks],
+            "fragments": [chunk["text"] for chunk in fragment_chunks],
+        }
+
+    def _embed_query_plan(self, plan: Dict[str, List[str]]) -> Dict[str, List[List[float]]]:
+        """Embed every text in the query plan with a single batched request."""
+        groups = ["line", "phrases", "fragments"]
+        texts = [text for group in groups for text in plan.get(group, [])]
+        self.logger.debug(f"Embedding query plan of {len(texts)} texts in one request")
+        vectors = self.embedder.embed_texts(texts) if texts else []
+
+        if len(vectors) != len(texts):
+            raise ValueError(f"Expected {len(texts)} query embeddings, got {len(vectors)}")
+
+        plan_vectors: Dict[str, List[List[float]]] = {}
+        offset = 0
+        for group in groups:
+            count = len(plan.get(group, []))
+            plan_vectors[group] = vectors[offset:offset + count]
+            offset += count
+        return plan_vectors
 
-    def search_line(self, modern_line: str, top_k=3):
+    def _search_with_plan(
+        self,
+        modern_line: str,
+        top_k: int,
+        plan: Dict[str, List[str]],
+        plan_vectors: Dict[str, List[List[float]]],
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> Dict[str, Any]:
+        """Fan the embedded query plan out to the per-level collections."""
         result = {
             "original_line": modern_line,
             "search_chunks": {
-                "line": [],
+                "line": {},
                 "phrases": [],
                 "fragments": []
             }
         }
 
-        # 1. Line-level embedding
-        line_embedding = self.embedder.embed_texts([modern_line])[0]
-        result["search_chunks"]["line"] = self.vector_stores["lines"].collection.query(
-            query_embeddings=[line_embedding], n_results=top_k, include=["documents", "metadatas", "distances"]
-        )
+        # 1. Line-level search
+        result["search_chunks"]["line"] = self.vector_stores["lines"].query_many(
+            plan_vectors["line"], n_results=top_k,
+            constraints=self._pushdown(self.vector_stores["lines"], "lines", constraints),
+            exclude_ids=exclude_ids
+        )[0]
 
-        # 2. Phrase-level chunking & search
-        line_dict = {"text": modern_line, "chunk_id": "input_line"}
-        phrase_chunks = self.phrase_chunker.chunk_from_line_chunks([line_dict])
-        for chunk in phrase_chunks:
-            emb = self.embedder.embed_texts([chunk["text"]])[0]
-            search_result = self.vector_stores["phrases"].collection.query(
-                query_embeddings=[emb], n_results=top_k, include=["documents", "metadatas", "distances"]
-            )
-            result["search_chunks"]["phrases"].append(search_result)
+        # 2. Phrase-level search: one collection call for all phrases
+        result["search_chunks"]["phrases"] = self.vector_stores["phrases"].query_many(
+            plan_vectors["phrases"], n_results=top_k,
+            constraints=self._pushdown(self.vector_stores["phrases"], "phrases", constraints),
+            exclude_ids=exclude_ids
+        )
 
-        # 3. Fragment-level chunking & search
-        fragment_chunks = self.fragment_chunker.chunk_from_line_chunks([line_dict])
-        for chunk in fragment_chunks:
-            emb = self.embedder.embed_texts([chunk["text"]])[0]
-            search_result = self.vector_stores["fragments"].collection.query(
-                query_embeddings=[emb], n_results=top_k, include=["documents", "metadatas", "distances"]
-            )
-            result["search_chunks"]["fragments"].append(search_result)
+        # 3. Fragment-level search: one collection call for all fragments
+        result["search_chunks"]["fragments"] = self.vector_stores["fragments"].query_many(
+            plan_vectors["fragments"], n_results=top_k,
+            constraints=self._pushdown(self.vector_stores["fragments"], "fragments", constraints),
+            exclude_ids=exclude_ids
+        )
 
         return result
+
+    def prepare_query(self, modern_line: str) -> Dict[str, Any]:
+        """
+        Chunk and embed a line once so several searches can reuse the vectors.
+
+        Returns:
+            Dictionary with the query "plan" and its "vectors"
+        """
+        plan = self._build_query_plan(modern_line)
+        return {"plan": plan, "vectors": self._embed_query_plan(plan)}
+
+    def prepare_queries(self, modern_lines: Sequence[str]) -> List[Dict[str, Any]]:
+        """Like prepare_query for several lines, embedding all their plans in one request."""
+        plans = [self._build_query_plan(line) for line in modern_lines]
+        merged = {group: [text for plan in plans for text in plan[group]] for group in ["line", "phrases", "fragments"]}
+        merged_vectors = self._embed_query_plan(merged)
+
+        prepared = []
+        offsets = {group: 0 for group in merged}
+        for plan in plans:
+            vectors = {}
+            for group, start in offsets.items():
+                vectors[group] = merged_vectors[group][start:start + len(plan[group])]
+                offsets[group] = start + len(plan[group])
+            prepared.append({"plan": plan, "vectors": vectors})
+        return prepared
+
+    def search_line(
+        self,
+        modern_line: str,
+        top_k=3,
+        prepared: Optional[Dict[str, Any]] = None,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ):
+        prepared = prepared or self.prepare_query(modern_line)
+        return self._search_with_plan(
+            modern_line, top_k, prepared["plan"], prepared["vectors"], constraints, exclude_ids
+        )
     
-    def hybrid_search(self, modern_line: str, top_k=5):
+    def hybrid_search(
+        self,
+        modern_line: str,
+        top_k=5,
+        prepared: Optional[Dict[str, Any]] = None,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ):
         """
-        Perform a hybrid search combining vector similarity with keyword matching.
+        Perform a hybrid search combining vector similarity with BM25 lexical matching.
         This provides more diverse results when standard vector search yields insufficient options.
         
         Args:
             modern_line: The modern text line to find Shakespeare quotes for
             top_k: Number of results to return per search method
+            prepared: Optional output of prepare_query for this line
+            constraints: Optional metadata constraints applied inside each search
+            exclude_ids: Optional chunk ids (e.g. already used) left out of every search
             
         Returns:
-            Dictionary with search results from different approaches
+            Dictionary with search results from different approaches. The line
+            result and each phrase/fragment result fuse that query's vector and
+            BM25 rankings with reciprocal-rank fusion; each level also gets the
+            whole line's BM25 matches as one extra result
         """
         self.logger.info(f"Performing hybrid search for: '{modern_line}'")
 
@@ -79,7 +355,7 @@ class ShakespeareSearchEngine:
             "original_line": modern_line,
             "search_method": "hybrid",
             "search_chunks": {
-                "line": [],
+                "line": {},
                 "phrases": [],
                 "fragments": []
             }
@@ -87,90 +363,48 @@ class ShakespeareSearchEngine:
         
         try:
             # First get regular vector search results
-            vector_results = self.search_line(modern_line, top_k)
-            
-            # Extract the vector search results for each level - with error handling
-            if "search_chunks" in vector_results:
-                search_chunks = vector_results["search_chunks"]
-                
-                # Handle line results (single result object)
-                if "line" in search_chunks:
-                    result["search_chunks"]["line"] = search_chunks["line"]
-                
-                # Handle phrases results (list of result objects)
-                if "phrases" in search_chunks and isinstance(search_chunks["phrases"], list):
-                    result["search_chunks"]["phrases"] = search_chunks["phrases"].copy()
-                
-                # Handle fragments results (list of result objects)
-                if "fragments" in search_chunks and isinstance(search_chunks["fragments"], list):
-                    result["search_chunks"]["fragments"] = search_chunks["fragments"].copy()
-                detailed_logger.debug(f"Vector search returned: {list(search_chunks.keys())}")
-
-            # Now add keyword-based search results
-            try:
-                import re
-                from collections import Counter
-                
-                # Extract significant words from the modern line
-                words = re.findall(r'\b\w{3,}\b', modern_line.lower())
-                
-                # Define stopwords to filter out common words
-                stopwords = {
-                    'the', 'and', 'that', 'have', 'for', 'not', 'with', 'you', 'this', 'but',
-                    'his', 'from', 'they', 'will', 'would', 'what', 'all', 'were', 'when',
-                    'there', 'their', 'your', 'been', 'one', 'who', 'very', 'had', 'was', 'are',
-                    'she', 'her', 'him', 'has', 'our', 'them', 'its', 'about', 'can', 'out'
-                }
-                
-                # Filter out stopwords and get the most relevant keywords
-                keywords = [w for w in words if w not in stopwords]
-                
-                # Take the 2 most common keywords (if available)
-                if keywords:
-                    keyword_freq = Counter(keywords)
-                    top_keywords = [kw for kw, _ in keyword_freq.most_common(2)]
-                    
-                    self.logger.info(f"Extracted keywords for hybrid search: {top_keywords}")
-                    detailed_logger.debug(f"Extracted keywords: {top_keywords}")
-
-                    # For each keyword, search each collection and APPEND to existing results
-                    for keyword in top_keywords:
-                        try:
-                            keyword_embedding = self.embedder.embed_texts([keyword])[0]
-                            
-                            # Search phrases and fragments collections
-                            for level in ["phrases", "fragments"]:
-                                try:
-                                    collection = self.vector_stores[level].collection
-                                    
-                                    # Search using the keyword embedding
-                                    keyword_results = collection.query(
-                                        query_embeddings=[keyword_embedding],
-                                        n_results=2,  # Fewer per keyword to avoid overwhelming
-                                        include=["documents", "metadatas", "distances"]
-                                    )
-                                    
-                                    # CORRECTLY append these results to the existing list
-                                    if keyword_results and "documents" in keyword_results:
-                                        result["search_chunks"][level].append(keyword_results)
-                                        
-                                except Exception as e:
-                                    self.logger.warning(f"Error searching {level} for keyword '{keyword}': {e}")
-                        except Exception as e:
-                            self.logger.warning(f"Error processing keyword '{keyword}': {e}")
-                
-            except Exception as e:
-                self.logger.warning(f"Error in keyword-based search: {e}")
+            prepared = prepared or self.prepare_query(modern_line)
+            plan = prepared["plan"]
+            vector_results = self._search_with_plan(
+                modern_line, top_k, plan, prepared["vectors"], constraints, exclude_ids
+            )
+            search_chunks = vector_results["search_chunks"]
+            detailed_logger.debug(f"Vector search returned: {list(search_chunks.keys())}")
+
+            # Lexical rankings for the whole line and for each of its phrases/fragments
+            bm25 = self._get_bm25_indexes()
+            line_rankings = [search_chunks["line"]]
+            if "lines" in bm25:
+                line_rankings.append(bm25["lines"].search(
+                    modern_line, top_k, self._pushdown(bm25["lines"], "lines", constraints), exclude_ids
+                ))
+            result["search_chunks"]["line"] = reciprocal_rank_fusion(line_rankings, limit=top_k)
+
+            for level in ["phrases", "fragments"]:
+                lexical: List[QueryResult] = []
+                if level in bm25:
+                    try:
+                        lexical = bm25[level].search_many(
+                            [modern_line] + plan[level], top_k,
+                            self._pushdown(bm25[level], level, constraints), exclude_ids
+                        )
+                    except Exception as e:
+                        self.logger.warning(f"Error in BM25 search of {level}: {e}")
+                # One fused result per phrase/fragment, as the vector search returns them
+                fused_results = []
+                for i, vector_ranking in enumerate(search_chunks[level]):
+                    rankings = [vector_ranking] + lexical[i + 1:i + 2]
+                    fused_results.append(reciprocal_rank_fusion(rankings, limit=top_k))
+                # The whole line's lexical matches at this level follow as one extra result
+                if lexical and lexical[0]["ids"]:
+                    fused_results.append(reciprocal_rank_fusion(lexical[:1], limit=top_k))
+                result["search_chunks"][level] = [fused for fused in fused_results if fused["ids"]]
+                detailed_logger.debug(f"{level}: {len(result['search_chunks'][level])} fused results")
             
             # Log final results
-            total_line_results = len(result["search_chunks"]["line"].get("documents", []) 
-                                if isinstance(result["search_chunks"]["line"], dict) else [])
-            total_phrase_results = sum(len(r.get("documents", [])) 
-                                    for r in result["search_chunks"]["phrases"] 
-                                    if isinstance(r, dict))
-            total_fragment_results = sum(len(r.get("documents", [])) 
-                                    for r in result["search_chunks"]["fragments"] 
-                                    if isinstance(r, dict))
+            total_line_results = len(result["search_chunks"]["line"].get("documents", []))
+            total_phrase_results = sum(len(r["documents"]) for r in result["search_chunks"]["phrases"])
+            total_fragment_results = sum(len(r["documents"]) for r in result["search_chunks"]["fragments"])
             
             self.logger.info(f"Hybrid search results: {total_line_results} lines, "
                             f"{total_phrase_results} phrases, "
@@ -180,4 +414,4 @@ class ShakespeareSearchEngine:
             
         except Exception as e:
             self.logger.error(f"Error in hybrid search: {e}")
-            return result
\ No newline at end of file
+            return result
@@ -0,0 +1,153 @@
+# modules/rag/shard_format.py
+
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SHARD_FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+MANIFEST_FILE = "manifest.json"
+CHECKSUM_BLOCK_BYTES = 1 << 20
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _natural_key(name: str) -> List[Any]:
+    """Sort key so shard_2 comes before shard_10."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def is_shard(path: str) -> bool:
+    """True if path is a directory written by write_shard."""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def write_shard(
+    chunks: Sequence[Dict[str, Any]],
+    directory: str,
+    dtype: str = "float32",
+    collection: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Write embedded chunks as a binary shard.
+
+    The shard is a directory holding the embeddings as one .npy matrix, the
+    remaining chunk fields as a JSONL sidecar (one line per matrix row) and a
+    manifest with row count, dimension, dtype and SHA-256 checksums.
+
+    Args:
+        chunks: Chunk dictionaries, each with an "embedding" list
+        directory: Shard directory to create
+        dtype: "float32" or "float16" storage for the matrix
+        collection: Optional collection name recorded in the manifest
+
+    Returns:
+        The manifest that was written
+    """
+    if not chunks:
+        raise ValueError("Cannot write an empty shard")
+    os.makedirs(directory, exist_ok=True)
+
+    dim = len(chunks[0]["embedding"])
+    matrix = np.lib.format.open_memmap(
+        os.path.join(directory, EMBEDDINGS_FILE), mode="w+", dtype=np.dtype(dtype), shape=(len(chunks), dim)
+    )
+    with open(os.path.join(directory, CHUNKS_FILE), 'w', encoding='utf-8') as f:
+        for row, chunk in enumerate(chunks):
+            embedding = chunk["embedding"]
+            if len(embedding) != dim:
+                raise ValueError(f"Chunk {chunk.get('chunk_id')} has dimension {len(embedding)}, expected {dim}")
+            matrix[row] = embedding
+            record = {k: v for k, v in chunk.items() if k != "embedding"}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    matrix.flush()
+    del matrix
+
+    manifest = {
+        "format_version": SHARD_FORMAT_VERSION,
+        "collection": collection,
+        "count": len(chunks),
+        "dim": dim,
+        "dtype": dtype,
+        "checksums": {
+            name: _sha256(os.path.join(directory, name)) for name in (EMBEDDINGS_FILE, CHUNKS_FILE)
+        },
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verify_shard(directory: str) -> Dict[str, Any]:
+    """Check a shard's files against its manifest checksums; raises ValueError on mismatch."""
+    manifest = read_manifest(directory)
+    for name, expected in manifest["checksums"].items():
+        actual = _sha256(os.path.join(directory, name))
+        if actual != expected:
+            raise ValueError(f"Checksum mismatch for {os.path.join(directory, name)}")
+    return manifest
+
+
+def read_shard(directory: str, verify: bool = True) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Load a shard's chunk records and its memory-mapped embedding matrix.
+
+    Returns:
+        (records without embeddings, matrix with one row per record)
+    """
+    manifest = verify_shard(directory) if verify else read_manifest(directory)
+    matrix = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+    with open(os.path.join(directory, CHUNKS_FILE), 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    if len(records) != manifest["count"] or matrix.shape != (manifest["count"], manifest["dim"]):
+        raise ValueError(f"Shard {directory} does not match its manifest")
+    return records, matrix
+
+
+def iter_shard_batches(
+    directory: str,
+    batch_size: int,
+    verify: bool = True
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield batches of chunk dictionaries (with "embedding" lists) ready for VectorStore.add_documents."""
+    records, matrix = read_shard(directory, verify=verify)
+    for start in range(0, len(records), batch_size):
+        end = min(start + batch_size, len(records))
+        vectors = np.asarray(matrix[start:end], dtype=np.float32).tolist()
+        yield [dict(record, embedding=vector) for record, vector in zip(records[start:end], vectors)]
+
+
+def list_shards(directory: str) -> List[str]:
+    """Shard directories directly under directory, in natural order."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(os.listdir(directory), key=_natural_key)
+    return [os.path.join(directory, name) for name in names if is_shard(os.path.join(directory, name))]
+
+
+def load_embedded_chunks(path: str, verify: bool = True) -> List[Dict[str, Any]]:
+    """
+    Load embedded chunks from either a binary shard or a legacy JSON shard file.
+    """
+    if is_shard(path):
+        return [chunk for batch in iter_shard_batches(path, batch_size=10_000, verify=verify) for chunk in batch]
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get("chunks", []) if isinstance(data, dict) else data
+
@@ -2,7 +2,7 @@
 
 import os
 import json
-from typing import Optional, Dict, Set, List, Union
+from typing import AbstractSet, Optional, Dict, Set, List, Union
 from modules.utils.logger import CustomLogger
 
 class UsedMap:
@@ -12,10 +12,31 @@ class UsedMap:
         self.logger = logger or CustomLogger("UsedMap")
         self.active_translation_id: Optional[str] = None
         self.used_maps: Dict[str, Dict[str, Set[str]]] = {}  # translationID -> {reference_key -> set(context_ranges)}
+        self.used_chunks: Dict[str, Set[str]] = {}  # translationID -> chunk_ids, excluded at retrieval time
+        # translationID -> {chunk_id -> uses} for deduplicated rows with occurrences left
+        self.partial_chunks: Dict[str, Dict[str, int]] = {}
 
     def _get_filepath(self, translation_id: str) -> str:
         return os.path.join(self.storage_dir, f"{translation_id}_used_map.json")
 
+    def _get_chunks_filepath(self, translation_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{translation_id}_used_chunks.json")
+
+    def _load_chunks(self, translation_id: str) -> None:
+        path = self._get_chunks_filepath(translation_id)
+        self.used_chunks[translation_id] = set()
+        self.partial_chunks[translation_id] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, list):  # written before partial uses were tracked
+                    data = {"used": data}
+                self.used_chunks[translation_id] = set(data.get("used", []))
+                self.partial_chunks[translation_id] = dict(data.get("partial", {}))
+            except Exception as e:
+                self.logger.warning(f"Failed to load used chunk ids for '{translation_id}': {e}")
+
     def load(self, translation_id: str) -> None:
         """Load the used map for a given translation ID."""
         self.active_translation_id = translation_id
@@ -34,6 +55,7 @@ class UsedMap:
         else:
             self.logger.info(f"No existing used map for '{translation_id}' found. Starting new map.")
             self.used_maps[translation_id] = {}
+        self._load_chunks(translation_id)
 
     def save(self, translation_id: Optional[str] = None) -> None:
         """Save the used map for the current or specified translation ID."""
@@ -49,12 +71,30 @@ class UsedMap:
             }
             with open(path, 'w', encoding='utf-8') as f:
                 json.dump(serializable_map, f, indent=2)
+            with open(self._get_chunks_filepath(tid), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "used": sorted(self.used_chunks.get(tid, set())),
+                    "partial": self.partial_chunks.get(tid, {}),
+                }, f)
             self.logger.info(f"Used map for translationID '{tid}' saved to {path}")
         except Exception as e:
             self.logger.error(f"Failed to save used map for '{tid}': {e}")
 
-    def mark_used(self, reference_key: str, context_range: Union[str, List[int]]) -> None:
-        """Mark a chunk reference+range as used for the current translation."""
+    def mark_used(
+        self,
+        reference_key: str,
+        context_range: Union[str, List[int]],
+        chunk_id: Optional[str] = None,
+        provenance_count: int = 1
+    ) -> None:
+        """
+        Mark a chunk reference+range as used for the current translation.
+
+        When the chunk_id is known it is also recorded, so later searches can
+        exclude the chunk instead of returning it and filtering it out. A
+        deduplicated row stands for provenance_count occurrences and is only
+        excluded once that many of them have been used.
+        """
         tid = self.active_translation_id
         if not tid:
             self.logger.error("Cannot mark used: No translation ID set.")
@@ -68,9 +108,18 @@ class UsedMap:
         
         map_for_tid = self.used_maps.setdefault(tid, {})
         contexts = map_for_tid.setdefault(reference_key, set())
-        if context_str not in contexts:
+        is_new = context_str not in contexts
+        if is_new:
             contexts.add(context_str)
             self.logger.debug(f"Marked used: [{reference_key}] -> {context_str}")
+        if chunk_id:
+            partial = self.partial_chunks.setdefault(tid, {})
+            # Marking the same occurrence twice does not use up another one
+            uses = partial.pop(chunk_id, 0) + (1 if is_new or provenance_count <= 1 else 0)
+            if uses >= provenance_count:
+                self.used_chunks.setdefault(tid, set()).add(chunk_id)
+            else:
+                partial[chunk_id] = uses
 
     def was_used(self, reference_key: str, context_range: Union[str, List[int]]) -> bool:
         """Check if a reference+range is already used in the current translation."""
@@ -92,6 +141,8 @@ class UsedMap:
         tid = translation_id or self.active_translation_id
         if tid:
             self.used_maps[tid] = {}
+            self.used_chunks[tid] = set()
+            self.partial_chunks[tid] = {}
             self.logger.info(f"Reset used map for translationID '{tid}'")
         else:
             self.logger.warning("No translation ID provided for reset.")
@@ -105,3 +156,9 @@ class UsedMap:
 
         return self.used_maps.setdefault(tid, {})
 
+    def used_chunk_ids(self, translation_id: Optional[str] = None) -> AbstractSet[str]:
+        """Chunk ids used so far in the given (or current) translation; the live set, do not modify."""
+        tid = translation_id or self.active_translation_id
+        if not tid:
+            return frozenset()
+        return self.used_chunks.setdefault(tid, set())
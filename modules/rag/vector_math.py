@@ -0,0 +1,44 @@
+# modules/rag/vector_math.py
+
+from typing import Tuple
+
+import numpy as np
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 50_000
+
+
+def squared_l2(queries: np.ndarray, block: np.ndarray, block_norms: np.ndarray) -> np.ndarray:
+    """Squared L2 distances between queries (M x D) and a block of rows (N x D)."""
+    q_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+    return q_norms + block_norms[None, :] - 2.0 * (queries @ block.astype(np.float32, copy=False).T)
+
+
+def top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (indices, distances) of the k smallest values per row, sorted ascending."""
+    k = min(k, distances.shape[1])
+    if k <= 0:
+        empty = np.empty((distances.shape[0], 0))
+        return empty.astype(np.int64), empty
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    part_d = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_d, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_d, order, axis=1)
+
+
+def kmeans(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means on a sample of rows; returns float32 centroids."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample_idx = np.sort(rng.choice(n, size=min(n, KMEANS_SAMPLE_SIZE), replace=False))
+    sample = np.asarray(vectors[sample_idx], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        c_norms = np.einsum("ij,ij->i", centroids, centroids)
+        assign = np.argmin(squared_l2(sample, centroids, c_norms), axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
@@ -1,52 +1,218 @@
+import os
 import chromadb
 from chromadb.config import Settings
-import time
-from typing import cast, Mapping, Union
+from dotenv import load_dotenv
+from typing import AbstractSet, Mapping, Union, Any, Dict, List, Optional, Sequence
+from modules.rag.embedding_backends import default_embedding_backend
+from modules.rag.filters import SearchConstraints, filter_flags
 from modules.utils.logger import CustomLogger
 
+QueryResult = Dict[str, List[Any]]
+
+DEFAULT_CHROMA_PATH = "embeddings/chromadb_vectors"
+# Indexes from any backend other than OpenAI, kept apart from the production database
+LOCAL_CHROMA_PATH = "embeddings/chromadb_vectors_local"
+
+
+def default_chroma_path(embedding_backend: Optional[str] = None) -> str:
+    """
+    Chroma directory for an embedding backend.
+
+    CHROMA_PATH (environment or .env) wins; otherwise OpenAI indexes live in
+    the production directory and every other backend in LOCAL_CHROMA_PATH.
+    """
+    load_dotenv()
+    configured = os.getenv("CHROMA_PATH")
+    if configured:
+        return configured
+    backend = embedding_backend or default_embedding_backend()
+    return DEFAULT_CHROMA_PATH if backend == "openai" else LOCAL_CHROMA_PATH
+
+
+def normalize_query_results(raw: Mapping[str, Any], num_queries: int) -> List[QueryResult]:
+    """
+    Split a Chroma query response into one flat result per query vector.
+
+    Chroma returns each field as a list with one inner list per query. The
+    normalized form is a list of dictionaries with parallel flat lists of
+    "ids", "documents", "metadatas" and "distances".
+    """
+    results: List[QueryResult] = []
+    for q in range(num_queries):
+        entry: QueryResult = {}
+        for field in ("ids", "documents", "metadatas", "distances"):
+            per_query = raw.get(field) or []
+            values = per_query[q] if q < len(per_query) and per_query[q] is not None else []
+            entry[field] = list(values)
+        results.append(entry)
+    return results
+
+def exclude_from_result(result: QueryResult, exclude_ids: AbstractSet[str], limit: Optional[int] = None) -> QueryResult:
+    """Drop entries whose id is in exclude_ids, keeping at most limit of the rest."""
+    keep = [i for i, chunk_id in enumerate(result.get("ids", [])) if chunk_id not in exclude_ids][:limit]
+    return {key: [values[i] for i in keep] for key, values in result.items() if isinstance(values, list)}
+
+
 class VectorStore:
-    def __init__(self, path="embeddings/chromadb_vectors", collection_name="shakespeare_chunks", logger=None):
+    def __init__(self, path=DEFAULT_CHROMA_PATH, collection_name="shakespeare_chunks", logger=None):
         self.logger = logger or CustomLogger("VectorStore")
         self.logger.info(f"Initializing ChromaDB at {path}")
         self.client = chromadb.PersistentClient(path=path, settings=Settings(allow_reset=True))
+        self.collection_name = collection_name
         self.collection = self.client.get_or_create_collection(name=collection_name)
         self.logger.info(f"Using collection: {collection_name}")
 
-    def add_documents(self, chunks):
+    def recreate_collection(self) -> None:
+        """Delete the collection and start an empty one under the same name."""
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self.client.get_or_create_collection(name=self.collection_name)
+        self.logger.info(f"🧹 Recreated empty collection: {self.collection_name}")
+
+    def embedding_dimension(self) -> Optional[int]:
+        """Width of the stored vectors, or None while the collection is empty."""
+        sample = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return None
+        return len(embeddings[0])
+
+    @staticmethod
+    def _prepare_batch(batch):
+        documents = [c["text"] for c in batch]
+        ids = [c["chunk_id"] for c in batch]
+        embeddings = [c["embedding"] for c in batch]
+
+        metadatas = []
+        for chunk in batch:
+            clean_meta = {
+                k: v for k, v in chunk.items()
+                if k not in ("text", "embedding", "chunk_id")
+                and isinstance(v, (str, int, float, bool))
+            }
+            clean_meta.update(filter_flags(chunk))
+            metadatas.append(clean_meta)
+        return documents, embeddings, ids, metadatas
+
+    def _write_documents(self, chunks, upsert=False):
         BATCH_LIMIT = 1000
         total = len(chunks)
-        self.logger.info(f"Preparing to insert {total} chunks in batches of {BATCH_LIMIT}")
+        verb = "upsert" if upsert else "insert"
+        self.logger.info(f"Preparing to {verb} {total} chunks in batches of {BATCH_LIMIT}")
+        write = self.collection.upsert if upsert else self.collection.add
 
         for i in range(0, total, BATCH_LIMIT):
             batch = chunks[i:i+BATCH_LIMIT]
-            documents = [c["text"] for c in batch]
-            ids = [c["chunk_id"] for c in batch]
-            embeddings = [c["embedding"] for c in batch]
-
-            metadatas = []
-            for chunk in batch:
-                clean_meta = {
-                    k: v for k, v in chunk.items()
-                    if k not in ("text", "embedding", "chunk_id")
-                    and isinstance(v, (str, int, float, bool))
-                }
-                metadatas.append(clean_meta)
+            documents, embeddings, ids, metadatas = self._prepare_batch(batch)
 
             self.logger.debug(f"Adding batch {i // BATCH_LIMIT + 1}: {len(batch)} documents")
             try:
-                self.collection.add(
+                write(
                     documents=documents,
                     embeddings=embeddings,
                     ids=ids,
                     metadatas=metadatas,
                 )
-                time.sleep(0.25)  # 🔧 Key: Let Chroma's segment manager breathe
             except Exception as e:
-                self.logger.error(f"❌ Failed to insert batch {i // BATCH_LIMIT + 1}: {e}")
+                self.logger.error(f"❌ Failed to {verb} batch {i // BATCH_LIMIT + 1}: {e}")
                 raise
 
+    def add_documents(self, chunks):
+        self._write_documents(chunks)
         self.logger.info("✅ All documents successfully added to Chroma")
 
+    def upsert_documents(self, chunks):
+        """Insert new chunks and overwrite existing ones with the same chunk_id."""
+        self._write_documents(chunks, upsert=True)
+        self.logger.info("✅ All documents successfully upserted to Chroma")
+
+    def delete_ids(self, ids: Sequence[str], batch_size: int = 1000) -> None:
+        """Remove documents by chunk_id."""
+        ids = list(ids)
+        for i in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[i:i + batch_size])
+        if ids:
+            self.logger.info(f"🧹 Deleted {len(ids)} documents from Chroma")
+
+    def get_ids(self, page_size: int = 10000) -> List[str]:
+        """Return every chunk_id stored in the collection."""
+        ids: List[str] = []
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(offset=offset, limit=page_size, include=[])
+            ids.extend(page["ids"])
+        return ids
+
+    def get_by_ids(self, ids: Sequence[str]) -> QueryResult:
+        """Fetch documents and metadata by chunk_id, in the order given; unknown ids are skipped."""
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        raw = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        found = {
+            chunk_id: (doc, meta or {})
+            for chunk_id, doc, meta in zip(raw["ids"], raw["documents"], raw["metadatas"])
+        }
+        ordered = [chunk_id for chunk_id in ids if chunk_id in found]
+        return {
+            "ids": ordered,
+            "documents": [found[chunk_id][0] for chunk_id in ordered],
+            "metadatas": [found[chunk_id][1] for chunk_id in ordered],
+        }
+
+    def supports_filters(self) -> bool:
+        """Whether stored documents carry the filter flags (see filters.backfill_filter_flags)."""
+        sample = self.collection.get(limit=1, include=["metadatas"])
+        metadatas = sample.get("metadatas") or []
+        return bool(metadatas) and "has_propn" in (metadatas[0] or {})
+
+    def query_many(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 5,
+        constraints: Optional[SearchConstraints] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None
+    ) -> List[QueryResult]:
+        """
+        Run several query vectors against the collection in a single call.
+
+        Chroma cannot filter on ids inside a query, so excluded ids are handled
+        by over-fetching: up to n_results extra rows first, doubling while a
+        query comes back short, never more than n_results + len(exclude_ids).
+
+        Args:
+            query_embeddings: Query vectors
+            n_results: Results per query
+            constraints: Optional metadata constraints, applied by Chroma during the search
+            exclude_ids: Optional chunk ids to leave out (e.g. already used ones)
+
+        Returns:
+            One normalized result per query vector, in input order.
+        """
+        if not query_embeddings:
+            return []
+        self.logger.debug(f"Querying {len(query_embeddings)} vectors (n_results={n_results})")
+        where = constraints.to_where() if constraints is not None else None
+        options = {"where": where} if where else {}
+        exclude_ids = exclude_ids or frozenset()
+        max_fetch = n_results + len(exclude_ids)
+        fetch = min(n_results * 2, max_fetch) if exclude_ids else n_results
+
+        while True:
+            raw = self.collection.query(
+                query_embeddings=[list(e) for e in query_embeddings],
+                n_results=fetch,
+                include=["documents", "metadatas", "distances"],
+                **options
+            )
+            results = normalize_query_results(raw, len(query_embeddings))
+            if not exclude_ids:
+                return results
+            trimmed = [exclude_from_result(r, exclude_ids, n_results) for r in results]
+            # A query is short only if Chroma had more rows to give
+            short = any(len(t["ids"]) < n_results and len(r["ids"]) == fetch for r, t in zip(results, trimmed))
+            if not short or fetch >= max_fetch:
+                return trimmed
+            fetch = min(fetch * 2, max_fetch)
+
     def query(self, query_text, embedding_function, n_results=5):
         self.logger.debug(f"Querying for: {query_text}")
         query_embedding = embedding_function([query_text])[0]
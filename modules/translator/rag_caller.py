@@ -1,127 +1,340 @@
 # modules/translator/rag_caller.py
 
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import AbstractSet, List, Dict, Any, Optional, Tuple
+from modules.rag.dedup import split_provenances
+from modules.rag.embedding_cache import normalize_text
+from modules.rag.filters import SearchConstraints
+from modules.rag.index_manifest import index_version, manifest_dir_for
+from modules.rag.result_cache import RetrievalResultCache, result_cache_key
+from modules.rag.retrieval_service import RetrievalClient, make_request, retrieval_service_url
 from modules.rag.search_engine import ShakespeareSearchEngine
+from modules.rag.used_map import UsedMap
+from modules.rag.vector_store import default_chroma_path, exclude_from_result
 from modules.translator.types import CandidateQuote
 from modules.utils.logger import CustomLogger
 
+# Larger-than-memoized requests are fetched in whole pages, so a line that
+# escalates 15 -> 20 -> 25 costs one extra search instead of two.
+RETRIEVAL_PAGE_SIZE = 10
+MEMO_MAX_LINES = 1024
+
+# Selector rejects proper nouns anyway; excluding them in the search keeps every top-k slot usable
+DEFAULT_CONSTRAINTS = SearchConstraints(exclude_proper_nouns=True)
+
+
+def _slice_result(result: Dict[str, Any], top_k: int) -> Dict[str, Any]:
+    """
+    Cut a normalized query result down to its first top_k entries.
+
+    Fused (hybrid) results carry "best_ranks"; an entry belongs in the top_k
+    view if it ranked within top_k in any of the fused lists, which is what
+    fusing top_k-sized lists directly would have kept.
+    """
+    if "best_ranks" in result:
+        keep = [i for i, rank in enumerate(result["best_ranks"]) if rank < top_k]
+    else:
+        keep = range(min(top_k, len(result.get("ids", []))))
+    return {key: [values[i] for i in keep] for key, values in result.items() if isinstance(values, list)}
+
+
 class RagCaller:
-    def __init__(self, logger: Optional[CustomLogger] = None):
+    def __init__(
+        self,
+        logger: Optional[CustomLogger] = None,
+        constraints: Optional[SearchConstraints] = DEFAULT_CONSTRAINTS,
+        used_map: Optional[UsedMap] = None,
+        service_url: Optional[str] = None
+    ):
         self.logger = logger or CustomLogger("RagCaller")
-        self.search_engine = ShakespeareSearchEngine(logger=self.logger)
+        # Thin mode: a running retrieval service holds the indexes and models
+        service_url = service_url or retrieval_service_url()
+        self.client: Optional[RetrievalClient] = None
+        self.search_engine: Optional[ShakespeareSearchEngine] = None
+        if service_url:
+            self.logger.info(f"Using retrieval service at {service_url}")
+            self.client = RetrievalClient(service_url, logger=self.logger)
+        else:
+            self.search_engine = ShakespeareSearchEngine(logger=self.logger)
+        self.constraints = constraints
+        # Chunks already used in the session are excluded inside the search
+        self.used_map = used_map
+        # (normalized line, mode, constraints) -> (largest top_k fetched, raw search_chunks)
+        self._memo: "OrderedDict[Tuple[str, str, Optional[SearchConstraints]], Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        # normalized line -> query plan and vectors from search_engine.prepare_query
+        self._prepared: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memo_stats = {"hits": 0, "misses": 0}
+        # Session results on disk, so a retried or resumed session skips retrieval
+        self.result_cache: Optional[RetrievalResultCache] = None
+
+    def reset_memo(self) -> None:
+        """Forget memoized retrievals, e.g. when a new translation session starts."""
+        self._memo.clear()
+        self._prepared.clear()
+        self.memo_stats = {"hits": 0, "misses": 0}
+
+    def start_session(self, session_id: str, cache_dir: Optional[str] = None) -> None:
+        """
+        Reset the memo and open the session's persistent result cache.
+
+        Results cached by an earlier run of the same session are reused
+        unless a collection manifest changed since.
+        """
+        self.reset_memo()
+        if self.result_cache is not None:
+            self.result_cache.close()
+        kwargs = {"cache_dir": cache_dir} if cache_dir else {}
+        chroma_path = self.search_engine.chroma_path if self.search_engine is not None else default_chroma_path()
+        version = index_version(manifest_dir=manifest_dir_for(chroma_path))
+        self.result_cache = RetrievalResultCache(session_id, version, logger=self.logger, **kwargs)
+
+    def _get_prepared(self, key: str, modern_line: str) -> Dict[str, Any]:
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            assert self.search_engine is not None
+            prepared = self.search_engine.prepare_query(modern_line)
+            self._prepared[key] = prepared
+            if len(self._prepared) > MEMO_MAX_LINES:
+                self._prepared.popitem(last=False)
+        return prepared
+
+    def _excluded_ids(self) -> AbstractSet[str]:
+        return self.used_map.used_chunk_ids() if self.used_map is not None else frozenset()
 
-    def retrieve_by_line(self, modern_line: str, top_k: int = 5) -> List[CandidateQuote]:
-        results = self.search_engine.search_line(modern_line, top_k)
-        return self._extract_candidates(results["search_chunks"]["line"], level="line")
+    @staticmethod
+    def _is_short(chunks: Dict[str, Any], exclude_ids: AbstractSet[str], top_k: int, fetched_k: int) -> bool:
+        """Whether ids used since a memoized fetch leave a full result with fewer than top_k entries."""
+        results = [chunks.get("line", {})] + chunks.get("phrases", []) + chunks.get("fragments", [])
+        for result in results:
+            ids = result.get("ids", [])
+            if len(ids) >= fetched_k and len(ids) - len(exclude_ids.intersection(ids)) < top_k:
+                return True
+        return False
+
+    def _memo_lookup(
+        self, memo_key: Tuple[str, str, Optional[SearchConstraints]], top_k: int, exclude_ids: AbstractSet[str]
+    ) -> Optional[Tuple[int, Dict[str, Any]]]:
+        cached = self._memo.get(memo_key)
+        if cached is None and self.result_cache is not None:
+            cached = self.result_cache.get(result_cache_key(*memo_key), top_k, exclude_ids)
+            if cached is not None:
+                self._memo_store(memo_key, cached[0], cached[1], persist=False)
+        if cached is None or cached[0] < top_k or self._is_short(cached[1], exclude_ids, top_k, cached[0]):
+            return None
+        self._memo.move_to_end(memo_key)
+        return cached
+
+    def _memo_store(
+        self,
+        memo_key: Tuple[str, str, Optional[SearchConstraints]],
+        fetched_k: int,
+        chunks: Dict[str, Any],
+        persist: bool = True
+    ) -> None:
+        self._memo[memo_key] = (fetched_k, chunks)
+        if len(self._memo) > MEMO_MAX_LINES:
+            self._memo.popitem(last=False)
+        if persist and self.result_cache is not None:
+            self.result_cache.put(result_cache_key(*memo_key), fetched_k, self._excluded_ids(), chunks)
+
+    def _fetch(
+        self,
+        modern_line: str,
+        key: str,
+        fetched_k: int,
+        mode: str,
+        constraints: Optional[SearchConstraints],
+        exclude_ids: AbstractSet[str]
+    ) -> Dict[str, Any]:
+        """Run one search locally or through the retrieval service; returns its search_chunks."""
+        if self.client is not None:
+            return self.client.search(modern_line, fetched_k, mode, constraints, exclude_ids)
+        assert self.search_engine is not None
+        prepared = self._get_prepared(key, modern_line)
+        search = self.search_engine.hybrid_search if mode == "hybrid" else self.search_engine.search_line
+        results = search(modern_line, fetched_k, prepared=prepared, constraints=constraints, exclude_ids=exclude_ids)
+        return results.get("search_chunks", {}) if results else {}
+
+    def _search_chunks(
+        self,
+        modern_line: str,
+        top_k: int,
+        mode: str = "standard",
+        constraints: Optional[SearchConstraints] = None
+    ) -> Dict[str, Any]:
+        """
+        Return search_chunks for a line, served from the session memo when possible.
+
+        The memo keeps the largest top_k fetched per line and mode; smaller or
+        equal requests are sliced from it. Larger requests re-query at the next
+        multiple of RETRIEVAL_PAGE_SIZE, reusing the line's query vectors.
+        Chunks used in the session are excluded by the search, and dropped
+        from memoized results used after them.
+
+        Args:
+            modern_line: Line to search for
+            top_k: Results wanted per query
+            mode: "standard" (search_line) or "hybrid" (hybrid_search)
+            constraints: Metadata constraints; defaults to the caller's constraints
+
+        Returns:
+            search_chunks dictionary with "line", "phrases" and "fragments"
+        """
+        constraints = constraints or self.constraints
+        key = normalize_text(modern_line)
+        memo_key = (key, mode, constraints)
+        exclude_ids = self._excluded_ids()
+        cached = self._memo_lookup(memo_key, top_k, exclude_ids)
+        if cached is not None:
+            self.memo_stats["hits"] += 1
+            fetched_k, chunks = cached
+        else:
+            self.memo_stats["misses"] += 1
+            fetched_k = -(-top_k // RETRIEVAL_PAGE_SIZE) * RETRIEVAL_PAGE_SIZE
+            chunks = self._fetch(modern_line, key, fetched_k, mode, constraints, exclude_ids)
+            if not chunks:
+                return {}
+            self._memo_store(memo_key, fetched_k, chunks)
+
+        def view(result: Dict[str, Any]) -> Dict[str, Any]:
+            if exclude_ids and "ids" in result:
+                result = exclude_from_result(result, exclude_ids)
+            return _slice_result(result, top_k)
+
+        return {
+            "line": view(chunks.get("line", {})),
+            "phrases": [view(r) for r in chunks.get("phrases", [])],
+            "fragments": [view(r) for r in chunks.get("fragments", [])],
+        }
 
-    def retrieve_by_phrase(self, modern_line: str, top_k: int = 5) -> List[CandidateQuote]:
-        results = self.search_engine.search_line(modern_line, top_k)
-        flat_phrase_hits = results["search_chunks"]["phrases"]
+    def prefetch(self, modern_lines: List[str], top_k: int = RETRIEVAL_PAGE_SIZE, mode: str = "standard") -> None:
+        """
+        Fill the memo for several lines ahead of translating them.
+
+        Through the retrieval service this is one batched round trip; locally
+        the lines' query plans are embedded in one request.
+        """
+        constraints = self.constraints
+        exclude_ids = self._excluded_ids()
+        fetched_k = -(-top_k // RETRIEVAL_PAGE_SIZE) * RETRIEVAL_PAGE_SIZE
+        pending: Dict[str, str] = {}
+        for line in modern_lines:
+            key = normalize_text(line)
+            if key not in pending and self._memo_lookup((key, mode, constraints), top_k, exclude_ids) is None:
+                pending[key] = line
+        if not pending:
+            return
+
+        self.logger.info(f"Prefetching retrieval for {len(pending)} lines")
+        if self.client is not None:
+            requests = [make_request(line, fetched_k, mode, constraints) for line in pending.values()]
+            for key, chunks in zip(pending, self.client.search_many(requests, exclude_ids)):
+                self._memo_store((key, mode, constraints), fetched_k, chunks)
+            return
+
+        assert self.search_engine is not None
+        unprepared = [key for key in pending if key not in self._prepared]
+        for key, prepared in zip(unprepared, self.search_engine.prepare_queries([pending[k] for k in unprepared])):
+            self._prepared[key] = prepared
+        for key, line in pending.items():
+            chunks = self._fetch(line, key, fetched_k, mode, constraints, exclude_ids)
+            if chunks:
+                self._memo_store((key, mode, constraints), fetched_k, chunks)
+
+    def retrieve_by_line(
+        self, modern_line: str, top_k: int = 5, constraints: Optional[SearchConstraints] = None
+    ) -> List[CandidateQuote]:
+        search_chunks = self._search_chunks(modern_line, top_k, constraints=constraints)
+        return self._extract_candidates([search_chunks["line"]], level="line")
+
+    def retrieve_by_phrase(
+        self, modern_line: str, top_k: int = 5, constraints: Optional[SearchConstraints] = None
+    ) -> List[CandidateQuote]:
+        flat_phrase_hits = self._search_chunks(modern_line, top_k, constraints=constraints)["phrases"]
         return self._extract_candidates(flat_phrase_hits, level="phrases")
 
-    def retrieve_by_fragment(self, modern_line: str, top_k: int = 5) -> List[CandidateQuote]:
-        results = self.search_engine.search_line(modern_line, top_k)
-        flat_fragment_hits = results["search_chunks"]["fragments"]
+    def retrieve_by_fragment(
+        self, modern_line: str, top_k: int = 5, constraints: Optional[SearchConstraints] = None
+    ) -> List[CandidateQuote]:
+        flat_fragment_hits = self._search_chunks(modern_line, top_k, constraints=constraints)["fragments"]
         return self._extract_candidates(flat_fragment_hits, level="fragments")
 
-    def retrieve_all(self, modern_line: str, top_k: int = 5) -> Dict[str, List[CandidateQuote]]:
-        results = self.search_engine.search_line(modern_line, top_k)
+    def retrieve_all(
+        self, modern_line: str, top_k: int = 5, constraints: Optional[SearchConstraints] = None
+    ) -> Dict[str, List[CandidateQuote]]:
+        results = {"search_chunks": self._search_chunks(modern_line, top_k, constraints=constraints)}
 
         return {
             "line": self._extract_candidates([results["search_chunks"]["line"]], "line"),
-            "phrases": [
-                candidate
-                for group in results["search_chunks"]["phrases"]
-                for candidate in self._extract_candidates([group], "phrases")
-            ],
-            "fragments": [
-                candidate
-                for group in results["search_chunks"]["fragments"]
-                for candidate in self._extract_candidates([group], "fragments")
-            ],
+            "phrases": self._extract_candidates(results["search_chunks"]["phrases"], "phrases"),
+            "fragments": self._extract_candidates(results["search_chunks"]["fragments"], "fragments"),
         }
 
+    def expand_from_graph(
+        self, modern_line: str, selector_results: Dict[str, List[CandidateQuote]], limit: int = 10
+    ) -> Dict[str, List[CandidateQuote]]:
+        """
+        Add phrase and fragment candidates reached from the line-level hits via the neighbour graph.
+
+        Costs no embedding or index query. Returns selector_results unchanged
+        when there is no graph, no line hit, or retrieval runs through the service.
+        """
+        if self.search_engine is None:
+            self.logger.debug("Graph expansion is not available through the retrieval service")
+            return selector_results
+        line_hits = [
+            (c.reference["chunk_id"], c.score) for c in selector_results.get("line", [])
+            if isinstance(c.reference, dict) and c.reference.get("chunk_id")
+        ]
+        if not line_hits:
+            return selector_results
+        expanded = self.search_engine.expand_from_lines(line_hits, limit, self.constraints, self._excluded_ids())
+        if not expanded:
+            return selector_results
+
+        merged = dict(selector_results)
+        for level in ["phrases", "fragments"]:
+            current = list(merged.get(level, []))
+            known = {c.reference.get("chunk_id") for c in current if isinstance(c.reference, dict)}
+            extra = [c for c in self._extract_candidates([expanded[level]], level) if c.reference.get("chunk_id") not in known]
+            merged[level] = current + extra
+            self.logger.info(f"Graph expansion for '{modern_line}' added {len(extra)} {level}")
+        return merged
+
     def _extract_candidates(self, raw_results: List[Dict[str, Any]], level: str) -> List[CandidateQuote]:
-        candidates = []
+        """
+        Convert normalized query results (see VectorStore.query_many) into candidates.
 
-        # Log the structure of raw_results
-        self.logger.debug(f"_extract_candidates for {level} - Input structure type: {type(raw_results)}")
-        self.logger.debug(f"_extract_candidates for {level} - Input length: {len(raw_results)}")
-        if raw_results:
-            first_item = raw_results[0]
-            self.logger.debug(f"_extract_candidates for {level} - First item type: {type(first_item)}")
-            if isinstance(first_item, dict):
-                self.logger.debug(f"_extract_candidates for {level} - First item keys: {list(first_item.keys())}")
+        Each result holds parallel flat lists of documents, metadatas and distances.
+        """
+        candidates = []
 
         for result in raw_results:
             docs = result.get("documents", [])
             metas = result.get("metadatas", [])
             scores = result.get("distances", [])
-            
+            chunk_ids = result.get("ids") or [None] * len(docs)
+
             # Guard against empty results
-            if not docs or not metas or not scores:
+            if not docs:
                 self.logger.warning(f"Empty data in result for {level} level")
                 continue
-            
-            # Handle the case where docs is a list of strings and metas is a list of lists
-            if isinstance(docs, list) and len(docs) > 0:
-                # In your case, it appears the first level is also a list
-                if isinstance(docs[0], list) and isinstance(metas[0], list):
-                    self.logger.debug(f"Processing nested list structure in {level} level")
-                    
-                    # For each document in the list
-                    for i, (doc_list, meta_list, score_list) in enumerate(zip(docs, metas, scores)):
-                        # For each potential document text option
-                        for j, doc_text in enumerate(doc_list):
-                            # Get corresponding metadata if available
-                            if j < len(meta_list) and isinstance(meta_list[j], dict):
-                                meta_dict = meta_list[j]
-                                # Get corresponding score if available
-                                if j < len(score_list):
-                                    # Handle different score types
-                                    if isinstance(score_list[j], (int, float)):
-                                        score_val = float(score_list[j])
-                                    else:
-                                        # Default score if not a number
-                                        score_val = 1.0
-                                else:
-                                    score_val = 1.0
-                                
-                                candidates.append(CandidateQuote(
-                                    text=str(doc_text),
-                                    reference=meta_dict,
-                                    score=score_val
-                                ))
-                                self.logger.debug(f"Added candidate from nested structure: level={level}, item={i}-{j}, score={score_val}")
-                
-                # Handle the case where each doc is a string but metas is a list of dictionaries
-                elif all(isinstance(d, str) for d in docs) and all(isinstance(m, list) for m in metas):
-                    self.logger.debug(f"Processing flat document list with metadata lists in {level} level")
-                    
-                    for i, (doc_text, meta_list, score_entry) in enumerate(zip(docs, metas, scores)):
-                        # For each metadata dictionary in the list
-                        for j, meta_dict in enumerate(meta_list):
-                            if isinstance(meta_dict, dict):
-                                # Process score value safely
-                                if isinstance(score_entry, list) and j < len(score_entry):
-                                    # Handle different score types
-                                    if isinstance(score_entry[j], (int, float)):
-                                        score_val = float(score_entry[j])
-                                    else:
-                                        # Default score if not a number
-                                        score_val = 1.0
-                                elif isinstance(score_entry, (int, float)):
-                                    score_val = float(score_entry)
-                                else:
-                                    score_val = 1.0
-                                
-                                candidates.append(CandidateQuote(
-                                    text=str(doc_text),
-                                    reference=meta_dict,
-                                    score=score_val
-                                ))
-                                self.logger.debug(f"Added candidate from flat document with metadata list: level={level}, doc={i}, meta={j}")
-        
+
+            for doc_text, meta_dict, score, chunk_id in zip(docs, metas, scores, chunk_ids):
+                if not isinstance(meta_dict, dict):
+                    self.logger.warning(f"Skipping {level} result with non-dict metadata: {type(meta_dict)}")
+                    continue
+                if chunk_id is not None:
+                    # Lets the used map record the chunk for retrieval-time exclusion
+                    meta_dict = dict(meta_dict, chunk_id=chunk_id)
+                reference, alternates = split_provenances(meta_dict)
+                candidates.append(CandidateQuote(
+                    text=str(doc_text),
+                    reference=reference,
+                    score=float(score) if isinstance(score, (int, float)) else 1.0,
+                    alternates=alternates
+                ))
+
         self.logger.info(f"Extracted {len(candidates)} candidates from {level} level")
         
         # ADD THIS: Detailed validation of the created CandidateQuote objects
@@ -150,15 +363,17 @@ class RagCaller:
 
         return candidates
 
-    def hybrid_search(self, modern_line: str, top_k: int = 10) -> Dict[str, List[CandidateQuote]]:
+    def hybrid_search(
+        self, modern_line: str, top_k: int = 10, constraints: Optional[SearchConstraints] = None
+    ) -> Dict[str, List[CandidateQuote]]:
         """
         Perform a hybrid search combining vector embeddings with keyword matching.
         """
         self.logger.info(f"Performing hybrid search for: '{modern_line}'")
         
         try:
-            # Call the search engine's hybrid search method
-            results = self.search_engine.hybrid_search(modern_line, top_k)
+            # Hybrid results are memoized per line like standard ones
+            results = {"search_chunks": self._search_chunks(modern_line, top_k, mode="hybrid", constraints=constraints)}
             
             # Log the structure of results for debugging
             self.logger.debug(f"Raw hybrid search results keys: {list(results.keys())}")
@@ -178,7 +393,7 @@ class RagCaller:
                             self.logger.debug(f"{chunk_type} is type: {type(chunk_data)}")
             
             # Ensure we have a valid results structure before proceeding
-            if not results or "search_chunks" not in results:
+            if not results["search_chunks"]:
                 self.logger.error("Invalid results structure from hybrid search")
                 return {"line": [], "phrases": [], "fragments": []}
             
@@ -191,29 +406,8 @@ class RagCaller:
                 "fragments": []
             }
             
-            # Process phrases - handle both list and non-list formats
-            phrases_chunks = search_chunks.get("phrases", [])
-            if phrases_chunks:
-                if isinstance(phrases_chunks, list):
-                    for group in phrases_chunks:
-                        candidates = self._extract_candidates([group], "phrases")
-                        processed_results["phrases"].extend(candidates)
-                else:
-                    # If it's not a list, try processing it directly
-                    candidates = self._extract_candidates([phrases_chunks], "phrases")
-                    processed_results["phrases"].extend(candidates)
-            
-            # Process fragments - handle both list and non-list formats
-            fragments_chunks = search_chunks.get("fragments", [])
-            if fragments_chunks:
-                if isinstance(fragments_chunks, list):
-                    for group in fragments_chunks:
-                        candidates = self._extract_candidates([group], "fragments")
-                        processed_results["fragments"].extend(candidates)
-                else:
-                    # If it's not a list, try processing it directly
-                    candidates = self._extract_candidates([fragments_chunks], "fragments")
-                    processed_results["fragments"].extend(candidates)
+            processed_results["phrases"] = self._extract_candidates(search_chunks.get("phrases", []), "phrases")
+            processed_results["fragments"] = self._extract_candidates(search_chunks.get("fragments", []), "fragments")
             
             # Log the processed results for debugging
             total_candidates = (
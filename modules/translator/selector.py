@@ -1,9 +1,12 @@
 # modules/translator/selector.py
 
+from dataclasses import replace
 from typing import List, Dict, Optional, Union, Tuple, Any, cast
 from modules.translator.types import CandidateQuote, ReferenceDict
 from modules.validation.validator import Validator
 from modules.rag.used_map import UsedMap
+from modules.rag.filters import has_midline_capital
+from modules.rag.metadata_store import ChunkMetadataStore, open_metadata_store
 from modules.utils.logger import CustomLogger
 
 
@@ -13,12 +16,20 @@ class Selector:
         used_map: UsedMap,
         validator: Optional[Validator] = None,
         mmr_lambda: float = 0.6,  # Add mmr_lambda parameter with default value
-        logger: Optional[CustomLogger] = None
+        logger: Optional[CustomLogger] = None,
+        metadata_stores: Optional[List[ChunkMetadataStore]] = None
     ):
         self.logger = logger or CustomLogger("Selector")
         self.used_map = used_map
         self.validator = validator or Validator()
         self.mmr_lambda = mmr_lambda  # Store mmr_lambda as instance variable
+        # Vector store metadata has no POS lists; the columnar stores supply them by chunk_id
+        if metadata_stores is None:
+            opened = [self.validator.line_store] + [
+                open_metadata_store(name, logger=self.logger) for name in ("phrases", "fragments")
+            ]
+            metadata_stores = [store for store in opened if store is not None]
+        self.metadata_stores = metadata_stores
 
     def filter_candidates(self, candidates: List[CandidateQuote]) -> List[CandidateQuote]:
         """
@@ -41,9 +52,9 @@ class Selector:
                 # Check for proper nouns - more rigorous check
                 has_proper_noun = False
                 
-                # Check "POS" field if it exists
-                if "POS" in reference:
-                    pos_tags = reference.get("POS", [])
+                # Check "POS" field if it exists, else the stored tags for the chunk
+                pos_tags = reference.get("POS", []) if "POS" in reference else self._stored_pos(reference)
+                if pos_tags:
                     if isinstance(pos_tags, list) and "PROPN" in pos_tags:
                         # Only check if the first word is a proper noun by its POS tag
                         if len(pos_tags) > 0 and pos_tags[0] == "PROPN":
@@ -59,51 +70,24 @@ class Selector:
 
                 # Also check the text itself for capitalized words mid-sentence
                 # but EXEMPT the first word unless it's tagged as PROPN
-                if not has_proper_noun:
-                    text = candidate.text
-                    words = text.split()
-                    for i, word in enumerate(words):
-                        # Skip first word (naturally capitalized) and the word "I"
-                        if i > 0 and word[0].isupper() and any(c.isalpha() for c in word) and word.lower() != "i":
-                            self.logger.info(f"Skipping candidate due to capitalized word mid-sentence: '{word}'")
-                            has_proper_noun = True
-                            break
+                # (same rule as the has_midline_capital flag stored at indexing time)
+                if not has_proper_noun and has_midline_capital(candidate.text):
+                    self.logger.info(f"Skipping candidate due to capitalized word mid-sentence: '{candidate.text}'")
+                    has_proper_noun = True
 
                 if has_proper_noun:
                     continue
 
-                # Get a unique reference key for the UsedMap
-                title = reference.get("title", "Unknown")
-                act = str(reference.get("act", ""))
-                scene = str(reference.get("scene", ""))
-                line = str(reference.get("line", ""))
-                reference_key = f"{title}|{act}|{scene}|{line}"
-                
-                # Check if this reference was already used
-                word_index_str = reference.get("word_index", "")
-                if isinstance(word_index_str, str) and word_index_str:
-                    if "," in word_index_str:
-                        parts = word_index_str.split(",")
-                        if len(parts) == 2:
-                            try:
-                                start, end = int(parts[0]), int(parts[1])
-                                word_indices = list(range(start, end + 1))
-                            except ValueError:
-                                self.logger.warning(f"Invalid word_index format: {word_index_str}")
-                                continue
-                        else:
-                            self.logger.warning(f"Invalid word_index format: {word_index_str}")
-                            continue
-                    else:
-                        try:
-                            word_indices = [int(word_index_str)]
-                        except ValueError:
-                            self.logger.warning(f"Invalid word_index format: {word_index_str}")
-                            continue
-                    
-                    if self.used_map.was_used(reference_key, word_indices):
-                        self.logger.info(f"Skipping candidate: already used {reference_key}:{word_indices}")
-                        continue
+                # Fall back to another occurrence of the same text when this one was used
+                usable = self._first_unused_reference(candidate)
+                if usable is None:
+                    continue
+                if usable is not reference:
+                    candidate = replace(
+                        candidate,
+                        reference=usable,
+                        alternates=[alt for alt in candidate.alternates if alt is not usable]
+                    )
 
                 filtered.append(candidate)
 
@@ -113,6 +97,60 @@ class Selector:
 
         return filtered
 
+    def _stored_pos(self, reference: ReferenceDict) -> List[str]:
+        """POS tags of the referenced chunk from the metadata stores, or [] if it is not in any."""
+        chunk_id = reference.get("chunk_id")
+        if not isinstance(chunk_id, str):
+            return []
+        for store in self.metadata_stores:
+            row = store.row_of(chunk_id)
+            if row is not None:
+                return store.pos(row)
+        return []
+
+    def _reference_usage(self, reference: ReferenceDict) -> Optional[bool]:
+        """True if the reference's words were already used, False if free, None if its word_index is invalid."""
+        # Get a unique reference key for the UsedMap
+        title = reference.get("title", "Unknown")
+        act = str(reference.get("act", ""))
+        scene = str(reference.get("scene", ""))
+        line = str(reference.get("line", ""))
+        reference_key = f"{title}|{act}|{scene}|{line}"
+        
+        # Check if this reference was already used
+        word_index_str = reference.get("word_index", "")
+        if not (isinstance(word_index_str, str) and word_index_str):
+            return False
+        if "," in word_index_str:
+            parts = word_index_str.split(",")
+            if len(parts) != 2:
+                self.logger.warning(f"Invalid word_index format: {word_index_str}")
+                return None
+            try:
+                start, end = int(parts[0]), int(parts[1])
+                word_indices = list(range(start, end + 1))
+            except ValueError:
+                self.logger.warning(f"Invalid word_index format: {word_index_str}")
+                return None
+        else:
+            try:
+                word_indices = [int(word_index_str)]
+            except ValueError:
+                self.logger.warning(f"Invalid word_index format: {word_index_str}")
+                return None
+
+        if self.used_map.was_used(reference_key, word_indices):
+            self.logger.info(f"Skipping candidate: already used {reference_key}:{word_indices}")
+            return True
+        return False
+
+    def _first_unused_reference(self, candidate: CandidateQuote) -> Optional[ReferenceDict]:
+        """The candidate's reference if still usable, else its first usable alternate occurrence."""
+        for reference in [candidate.reference] + list(candidate.alternates):
+            if isinstance(reference, dict) and self._reference_usage(reference) is False:
+                return reference
+        return None
+
     def rank_candidates(self, candidates: List[CandidateQuote], lambda_param: Optional[float] = None) -> List[CandidateQuote]:
         """
         Rank candidates using Maximal Marginal Relevance (MMR) to balance
@@ -27,7 +27,7 @@ class TranslationManager:
         
         self.used_map: UsedMap = UsedMap(logger=self.logger)
         self.validator: Validator = Validator()
-        self.rag: RagCaller = RagCaller(logger=self.logger)
+        self.rag: RagCaller = RagCaller(logger=self.logger, used_map=self.used_map)
         self.selector: Selector = Selector(
             used_map=self.used_map, 
             validator=self.validator, 
@@ -66,6 +66,7 @@ class TranslationManager:
         self.assembler.logger = CustomLogger("Assembler", log_level="DEBUG", log_file=session_log_file)
 
         self.used_map.load(self.translation_id)
+        self.rag.start_session(self.translation_id)
 
     def _count_syllables(self, text: str) -> int:
         """Count syllables in text using the same method as in the chunking scripts."""
@@ -184,19 +185,25 @@ class TranslationManager:
                 if total_options < 3:
                     self.logger.warning(f"[{search_type}] STEP 1 INITIAL: Only {total_options} valid candidates total. Attempting to retrieve more...")
                     
-                    # Attempt to get more candidates with extended search - double the top_k
+                    # Attempt to get more candidates, first from the precomputed neighbour
+                    # graph (no new query), then with extended search - double the top_k
                     try:
-                        if use_hybrid_search:
-                            extended_results = self.rag.hybrid_search(modern_line, top_k=25)
-                            self.logger.info(f"[HYBRID] Extended hybrid search complete")
-                        else:
-                            extended_results = self.rag.retrieve_all(modern_line, top_k=20)
-                        
-                        # Try again with the extended results
+                        extended_results = self.rag.expand_from_graph(modern_line, selector_results)
                         prompt_structure, temp_map = self.selector.prepare_prompt_structure(extended_results, min_options=min_options_per_level)
-                        
-                        # Count options again
                         total_options = sum(len(options) for options in prompt_structure.values())
+
+                        if total_options < 3:
+                            if use_hybrid_search:
+                                extended_results = self.rag.hybrid_search(modern_line, top_k=25)
+                                self.logger.info(f"[HYBRID] Extended hybrid search complete")
+                            else:
+                                extended_results = self.rag.retrieve_all(modern_line, top_k=20)
+                            
+                            # Try again with the extended results
+                            prompt_structure, temp_map = self.selector.prepare_prompt_structure(extended_results, min_options=min_options_per_level)
+                            
+                            # Count options again
+                            total_options = sum(len(options) for options in prompt_structure.values())
                     except Exception as e:
                         self.logger.error(f"[{search_type}] Error in extended search: {e}")
                         total_options = 0  # Force failsafe path
@@ -310,7 +317,11 @@ class TranslationManager:
                             self.logger.debug(f"Marking used: [{ref_key}] -> {word_indices}")
                             
                             # Mark as used
-                            self.used_map.mark_used(ref_key, word_indices)
+                            self.used_map.mark_used(
+                                ref_key, word_indices,
+                                chunk_id=ref.get("chunk_id"),
+                                provenance_count=int(ref.get("provenance_count", 1))
+                            )
                             
                         except (ValueError, IndexError) as e:
                             self.logger.warning(f"Invalid word_index format: {word_index_str} - {e}")
@@ -413,7 +424,11 @@ class TranslationManager:
                 else:
                     word_indices = [int(word_index_str.strip())]
                 
-                self.used_map.mark_used(ref_key, word_indices)
+                self.used_map.mark_used(
+                    ref_key, word_indices,
+                    chunk_id=quote.reference.get("chunk_id"),
+                    provenance_count=int(quote.reference.get("provenance_count", 1))
+                )
                 self.used_map.save()
             except (ValueError, IndexError) as e:
                 self.logger.warning(f"Invalid word_index format in failsafe: {word_index_str} - {e}")
@@ -440,6 +455,8 @@ class TranslationManager:
         """Translate a group of modern lines."""
         self.logger.info(f"Translating group of {len(modern_lines)} lines with hybrid_search={use_hybrid_search}")
         results = []
+        # One batched retrieval for the whole group; translate_line is then served from the memo
+        self.rag.prefetch(modern_lines, mode="hybrid" if use_hybrid_search else "standard")
         
         for line in modern_lines:
             if use_hybrid_search:
@@ -457,6 +474,7 @@ class TranslationManager:
     def translate_scene(self, scene_lines: List[str]) -> List[Dict[str, Any]]:
         self.logger.info(f"Starting scene translation: {len(scene_lines)} lines")
         translated_scene: List[Dict[str, Any]] = []
+        self.rag.prefetch(scene_lines)
 
         for i, line in enumerate(scene_lines):
             self.logger.info(f"Translating line {i + 1}/{len(scene_lines)}")
@@ -1,5 +1,5 @@
 # In types.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List, Union
 
 ReferenceDict = Dict[str, Union[str, int, List[str], List[int]]]
@@ -9,3 +9,5 @@ class CandidateQuote:
     text: str
     reference: ReferenceDict
     score: float
+    # Other places the same text occurs (deduplicated indexes); Selector falls back to these
+    alternates: List[ReferenceDict] = field(default_factory=list)
@@ -1,10 +1,12 @@
 # modules/validation/validator.py
 
 import os
-import json
 import re
 import unicodedata
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from modules.chunking.chunk_io import ChunkFile, open_chunks, resolve_chunk_path
+from modules.chunking.text_utils import normalize_quotes
+from modules.rag.metadata_store import DEFAULT_METADATA_PATH, open_metadata_store
 from modules.utils.logger import CustomLogger
 
 try:
@@ -18,21 +20,29 @@ except ImportError:
     SPACY_AVAILABLE = False
 
 class Validator:
-    def __init__(self, ground_truth_path: str = "data/line_corpus/lines.json"):
+    def __init__(
+        self,
+        ground_truth_path: str = "data/line_corpus/lines.jsonl",
+        metadata_path: str = DEFAULT_METADATA_PATH
+    ):
         self.logger = CustomLogger("Validator")
         self.logger.info("Initializing Validator")
         self.ground_truth_path = ground_truth_path
-        self.ground_truth = self._load_ground_truth()
+        # The columnar lines store answers lookups by location without loading every line as a dict,
+        # if it was built from this ground truth file as it is now
+        self.line_store = open_metadata_store("lines", metadata_path, logger=self.logger, source_path=ground_truth_path)
+        self.ground_truth = [] if self.line_store is not None else self._load_ground_truth()
 
-    def _load_ground_truth(self) -> List[Dict[str, Any]]:
-        if not os.path.exists(self.ground_truth_path):
+    def _load_ground_truth(self) -> Sequence[Dict[str, Any]]:
+        """Ground truth lines; a JSONL corpus is opened through its offset index rather than loaded."""
+        path = resolve_chunk_path(self.ground_truth_path)
+        if not os.path.exists(path):
             self.logger.error(f"Ground truth file not found: {self.ground_truth_path}")
             raise FileNotFoundError(f"Missing ground truth file at {self.ground_truth_path}")
         try:
-            with open(self.ground_truth_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            self.logger.info(f"Loaded {len(data['chunks'])} ground truth lines")
-            return data["chunks"]
+            ground_truth = open_chunks(path, logger=self.logger)
+            self.logger.info(f"Loaded {len(ground_truth)} ground truth lines from {path}")
+            return ground_truth
         except Exception as e:
             self.logger.critical(f"Error loading ground truth: {e}")
             return []
@@ -72,16 +82,8 @@ class Validator:
             return [(word, i) for i, word in enumerate(words)]
 
     def _normalize_quotes(self, line: str) -> str:
-        """Replace curly quotes/apostrophes with plain ASCII, exactly like in line_chunker.py."""
-        replacements = {
-            "\u2018": "'",
-            "\u2019": "'",
-            "\u201C": '"',
-            "\u201D": '"',
-        }
-        for old, new in replacements.items():
-            line = line.replace(old, new)
-        return line
+        """Replace curly quotes/apostrophes with plain ASCII, exactly like the chunkers."""
+        return normalize_quotes(line)
 
     def _normalize_and_clean(self, text: str) -> str:
         """Normalize text for comparison by standardizing whitespace and lowercasing."""
@@ -90,6 +92,42 @@ class Validator:
         # Then clean whitespace and lowercase
         return re.sub(r'\s+', ' ', text.lower()).strip()
 
+    def _find_ground_truth_text(self, title: str, act: Any, scene: Any, line_num: Any) -> Optional[str]:
+        """Text of the ground truth line at a location, or None if there is none."""
+        if self.line_store is not None:
+            row = self.line_store.find_line(title, act, scene, line_num)
+            return self.line_store.text(row) if row is not None else None
+        if isinstance(self.ground_truth, ChunkFile):
+            entry = self.ground_truth.find_line(title, act, scene, line_num)
+            return entry.get("text", "") if entry else None
+
+        # Find the ground truth entry - modified to handle null/None act/scene
+        gt_entry = None
+        for entry in self.ground_truth:
+            # Handle null act/scene more explicitly
+            act_match = False
+            scene_match = False
+            
+            # Check for null/None values or matching values
+            if (act is None or act == "" or act == "null") and (entry.get("act") is None or entry.get("act") == "" or entry.get("act") == "null"):
+                act_match = True
+            elif str(entry.get("act")) == str(act):  # Convert both to string for comparison
+                act_match = True
+                
+            if (scene is None or scene == "" or scene == "null") and (entry.get("scene") is None or entry.get("scene") == "" or entry.get("scene") == "null"):
+                scene_match = True
+            elif str(entry.get("scene")) == str(scene):  # Convert both to string for comparison
+                scene_match = True
+            
+            if (entry.get("title") == title and 
+                act_match and 
+                scene_match and 
+                str(entry.get("line")) == str(line_num)):
+                gt_entry = entry
+                break
+        
+        return gt_entry.get("text", "") if gt_entry else None
+
     def validate_line(self, assembled_text: str, references: List[Dict[str, Any]]) -> bool:
         """
         Validates if assembled text exactly matches the fragments from ground truth references
@@ -117,36 +155,11 @@ class Validator:
                 self.logger.warning(f"Incomplete essential reference metadata (title or line): {ref}")
                 continue
             
-            # Find the ground truth entry - modified to handle null/None act/scene
-            gt_entry = None
-            for entry in self.ground_truth:
-                # Handle null act/scene more explicitly
-                act_match = False
-                scene_match = False
-                
-                # Check for null/None values or matching values
-                if (act is None or act == "" or act == "null") and (entry.get("act") is None or entry.get("act") == "" or entry.get("act") == "null"):
-                    act_match = True
-                elif str(entry.get("act")) == str(act):  # Convert both to string for comparison
-                    act_match = True
-                    
-                if (scene is None or scene == "" or scene == "null") and (entry.get("scene") is None or entry.get("scene") == "" or entry.get("scene") == "null"):
-                    scene_match = True
-                elif str(entry.get("scene")) == str(scene):  # Convert both to string for comparison
-                    scene_match = True
-                
-                if (entry.get("title") == title and 
-                    act_match and 
-                    scene_match and 
-                    str(entry.get("line")) == str(line_num)):
-                    gt_entry = entry
-                    break
-            
-            if not gt_entry:
+            gt_text = self._find_ground_truth_text(title, act, scene, line_num)
+            if gt_text is None:
                 self.logger.warning(f"No ground truth entry found for {title}, Act {act}, Scene {scene}, Line {line_num}")
                 continue
             
-            gt_text = gt_entry.get("text", "")
             self.logger.debug(f"Found reference in ground truth: '{gt_text}'")
             
             # Use word_index to extract the fragment
@@ -1,45 +1,60 @@
-import json
 import argparse
+from itertools import islice
+import modules.chunking.phrase_chunker as phrase_chunker_module
 from modules.chunking.phrase_chunker import PhraseChunker
 from modules.chunking.fragment_chunker import FragmentChunker
+from modules.chunking.doc_cache import DEFAULT_DOC_CACHE_PATH, load_doc_cache
+from modules.chunking.chunk_io import ChunkWriter, iter_chunks, resolve_chunk_path
 from modules.utils.logger import CustomLogger
 
 # Paths
-LINE_CHUNKS_PATH = "data/processed_chunks/lines.json"
-PHRASE_OUTPUT_PATH = "data/processed_chunks/phrases.json"
-FRAGMENT_OUTPUT_PATH = "data/processed_chunks/fragments.json"
+LINE_CHUNKS_PATH = "data/processed_chunks/lines.jsonl"
+PHRASE_OUTPUT_PATH = "data/processed_chunks/phrases.jsonl"
+FRAGMENT_OUTPUT_PATH = "data/processed_chunks/fragments.jsonl"
+LINE_BATCH_SIZE = 1000  # line chunks held in memory at a time
 
 def load_line_chunks(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        return data["chunks"]
-
-def save_chunks(chunks, output_path, chunk_type):
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump({
-            "chunk_type": chunk_type,
-            "chunks": chunks,
-            "total_chunks": len(chunks)
-        }, f, indent=2)
+    """Stream line chunks (JSONL, or a legacy lines.json document)."""
+    return iter_chunks(filepath)
 
 def main(run_phrases: bool, run_fragments: bool):
     logger = CustomLogger("ChunkingRunner", log_level="INFO")
-    logger.info("Loading line chunks from lines.json...")
+    logger.info(f"Streaming line chunks from {resolve_chunk_path(LINE_CHUNKS_PATH)}...")
     line_chunks = load_line_chunks(LINE_CHUNKS_PATH)
 
+    # Parses saved by the line chunker; without them each chunker parses the lines itself
+    doc_cache = None
+    if phrase_chunker_module.SPACY_AVAILABLE:
+        doc_cache = load_doc_cache(phrase_chunker_module.nlp.vocab, DEFAULT_DOC_CACHE_PATH, logger=logger)
+        if doc_cache is None:
+            logger.info(f"No line parses at {DEFAULT_DOC_CACHE_PATH}; lines will be parsed again")
+
+    # Both chunkers consume each batch of lines, so lines are read once either way
+    runs = []
     if run_phrases:
         logger.info("Running PhraseChunker...")
-        phrase_chunker = PhraseChunker(logger=logger)
-        phrase_chunks = phrase_chunker.chunk_from_line_chunks(line_chunks)
-        logger.info(f"Saving {len(phrase_chunks)} phrase chunks to {PHRASE_OUTPUT_PATH}")
-        save_chunks(phrase_chunks, PHRASE_OUTPUT_PATH, "phrase")
-
+        runs.append((PhraseChunker(logger=logger, doc_cache=doc_cache), ChunkWriter(PHRASE_OUTPUT_PATH, "phrase")))
     if run_fragments:
         logger.info("Running FragmentChunker...")
-        fragment_chunker = FragmentChunker(logger=logger)
-        fragment_chunks = fragment_chunker.chunk_from_line_chunks(line_chunks)
-        logger.info(f"Saving {len(fragment_chunks)} fragment chunks to {FRAGMENT_OUTPUT_PATH}")
-        save_chunks(fragment_chunks, FRAGMENT_OUTPUT_PATH, "fragment")
+        runs.append((FragmentChunker(logger=logger, doc_cache=doc_cache), ChunkWriter(FRAGMENT_OUTPUT_PATH, "fragment")))
+
+    try:
+        while True:
+            batch = list(islice(line_chunks, LINE_BATCH_SIZE))
+            if not batch:
+                break
+            for chunker, writer in runs:
+                writer.write(chunker.chunk_from_line_chunks(batch))
+    except BaseException:
+        # Keep the previous chunk files rather than replacing them with partial ones
+        for _, writer in runs:
+            writer.abort()
+        raise
+    for _, writer in runs:
+        writer.close()
+
+    for _, writer in runs:
+        logger.info(f"Saved {writer.count} {writer.chunk_type} chunks to {writer.path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Chunk phrases and/or fragments from line chunks.")
@@ -0,0 +1,44 @@
+import tempfile
+import unittest
+from modules.rag.bm25_index import BM25Index, build_bm25_index, tokenize
+from modules.rag.filters import SearchConstraints
+
+class TestBM25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        chunks = [
+            {"chunk_id": "l1", "text": "Fair is foul, and foul is fair", "title": "Macbeth", "line": 1},
+            {"chunk_id": "l2", "text": "Out, damned spot! out, I say!", "title": "Macbeth", "line": 2},
+            {"chunk_id": "l3", "text": "O Romeo, Romeo! wherefore art thou Romeo?", "title": "Romeo and Juliet", "line": 3},
+            {"chunk_id": "l4", "text": "The lady doth protest too much, methinks", "title": "Hamlet", "line": 4},
+        ]
+        build_bm25_index(chunks, path=self.tmp.name, collection_name="lines")
+        self.index = BM25Index(path=self.tmp.name, collection_name="lines")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_tokenize_keeps_inner_apostrophes(self):
+        self.assertEqual(tokenize("'Tis e'er so, Romeo!"), ["tis", "e'er", "so", "romeo"])
+
+    def test_search_ranks_term_frequency_and_returns_metadata(self):
+        result = self.index.search("romeo spot", top_k=2)
+
+        self.assertEqual(result["ids"], ["l3", "l2"])
+        self.assertEqual(result["metadatas"][0]["title"], "Romeo and Juliet")
+        self.assertEqual(result["metadatas"][0]["line"], 3)
+        self.assertTrue(result["metadatas"][0]["has_midline_capital"])
+        self.assertEqual(result["distances"][0], 0.0)
+        self.assertGreater(result["scores"][0], result["scores"][1])
+
+    def test_constraints_drop_documents_before_ranking(self):
+        result = self.index.search("romeo spot", top_k=2, constraints=SearchConstraints(exclude_proper_nouns=True))
+        self.assertEqual(result["ids"], ["l2"])
+
+    def test_unknown_terms_return_empty_result(self):
+        result = self.index.search("zounds", top_k=3)
+        self.assertEqual(result["ids"], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import json
+import tempfile
+import unittest
+
+from modules.chunking.chunk_io import (
+    ChunkFile, ChunkWriter, index_path, iter_chunks, open_chunks, resolve_chunk_path, write_chunks
+)
+
+CHUNKS = [
+    {"chunk_id": "chunk_1", "title": "MACBETH", "act": "I", "scene": "I", "line": 1, "text": "When shall we three meet again"},
+    {"chunk_id": "chunk_2", "title": "MACBETH", "act": "I", "scene": "I", "line": 2, "text": "In thunder, lightning, or in rain?"},
+    {"chunk_id": "chunk_3", "title": "THE SONNETS", "act": "18", "scene": None, "line": 1,
+     "text": "Shall I compare thee to a summer’s day?"},
+]
+
+
+class TestChunkIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "lines.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_then_stream_and_seek(self):
+        self.assertEqual(write_chunks(CHUNKS, self.path, "line"), 3)
+        self.assertTrue(os.path.exists(index_path(self.path)))
+
+        chunks = ChunkFile(self.path)
+        self.assertEqual(list(chunks), CHUNKS)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[2], CHUNKS[2])
+        self.assertEqual(chunks[-1], CHUNKS[2])
+        self.assertEqual(chunks[1:], CHUNKS[1:])
+        self.assertEqual(chunks.get("chunk_2"), CHUNKS[1])
+        self.assertIsNone(chunks.get("chunk_9"))
+        # Missing act/scene values match each other, as in the validator
+        self.assertEqual(chunks.find_line("THE SONNETS", "18", "null", "1"), CHUNKS[2])
+        self.assertEqual(chunks.find_line("MACBETH", "I", "I", 2)["text"], CHUNKS[1]["text"])
+        self.assertIsNone(chunks.find_line("MACBETH", "II", "I", 2))
+        chunks.close()
+
+    def test_missing_index_is_rebuilt_by_scanning(self):
+        write_chunks(CHUNKS, self.path, "line")
+        os.remove(index_path(self.path))
+        chunks = ChunkFile(self.path)
+        self.assertEqual(chunks.get("chunk_3"), CHUNKS[2])
+        self.assertEqual(chunks.find_line("MACBETH", "I", "I", 1), CHUNKS[0])
+        chunks.close()
+
+    def test_index_of_another_data_file_is_rebuilt(self):
+        write_chunks(CHUNKS, self.path, "line")
+        with open(index_path(self.path), 'r', encoding='utf-8') as f:
+            old_index = f.read()
+        write_chunks(CHUNKS[1:], self.path, "line")
+        # e.g. a run killed after the data file was replaced but before the index
+        with open(index_path(self.path), 'w', encoding='utf-8') as f:
+            f.write(old_index)
+
+        chunks = ChunkFile(self.path)
+        self.assertEqual(chunks[0], CHUNKS[1])
+        self.assertIsNone(chunks.get("chunk_1"))
+        chunks.close()
+
+    def test_rewrite_is_invisible_until_closed(self):
+        write_chunks(CHUNKS, self.path, "line")
+        reader = ChunkFile(self.path)
+        self.assertEqual(reader.get("chunk_2"), CHUNKS[1])
+
+        writer = ChunkWriter(self.path, "line")
+        writer.write(CHUNKS[2:])
+        self.assertEqual(list(ChunkFile(self.path)), CHUNKS)
+        writer.close()
+        # An open reader keeps reading the version its index describes
+        self.assertEqual(reader.get("chunk_2"), CHUNKS[1])
+        reader.close()
+        self.assertEqual(list(ChunkFile(self.path)), CHUNKS[2:])
+
+        with self.assertRaises(RuntimeError):
+            with ChunkWriter(self.path, "line") as failed:
+                failed.write(CHUNKS[:1])
+                raise RuntimeError("chunking failed")
+        self.assertEqual(ChunkFile(self.path).get("chunk_3"), CHUNKS[2])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["lines.index.json", "lines.jsonl"])
+
+    def test_legacy_json_documents_still_load(self):
+        legacy = os.path.join(self.tmp.name, "phrases.json")
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump({"chunk_type": "phrase", "chunks": CHUNKS, "total_chunks": 3}, f, indent=2)
+
+        self.assertEqual(resolve_chunk_path(os.path.join(self.tmp.name, "phrases.jsonl")), legacy)
+        self.assertEqual(list(iter_chunks(legacy)), CHUNKS)
+        self.assertEqual(open_chunks(legacy), CHUNKS)
+
+        # A JSONL file of the same name takes precedence
+        write_chunks(CHUNKS[:1], os.path.join(self.tmp.name, "phrases.jsonl"), "phrase")
+        self.assertEqual(list(iter_chunks(legacy)), CHUNKS[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
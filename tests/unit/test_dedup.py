@@ -0,0 +1,54 @@
+import json
+import unittest
+
+from modules.rag.dedup import dedupe_chunks, split_provenances
+
+
+def _chunk(chunk_id, text, title, line, word_index):
+    return {"chunk_id": chunk_id, "text": text, "title": title, "act": "1", "scene": "2",
+            "line": line, "word_index": word_index, "syllables": 3}
+
+
+class TestDedupeChunks(unittest.TestCase):
+
+    def test_identical_texts_collapse_into_first_occurrence(self):
+        chunks = [
+            _chunk("f1", "my good lord", "Hamlet", 10, "0,2"),
+            _chunk("f2", "I know not what", "Hamlet", 11, "0,3"),
+            _chunk("f3", "my  good lord ", "Lear", 40, "4,6"),
+        ]
+        deduped = dedupe_chunks(chunks)
+
+        self.assertEqual([c["chunk_id"] for c in deduped], ["f1", "f2"])
+        self.assertEqual(deduped[0]["provenance_count"], 2)
+        self.assertEqual(deduped[1]["provenance_count"], 1)
+        self.assertNotIn("provenances", deduped[1])
+        occurrences = json.loads(deduped[0]["provenances"])
+        self.assertEqual([o["occurrence_id"] for o in occurrences], ["f1", "f3"])
+        self.assertEqual(occurrences[1]["title"], "Lear")
+        self.assertNotIn("provenance_count", chunks[0])
+
+    def test_split_provenances_builds_alternate_references(self):
+        row = dedupe_chunks([
+            _chunk("f1", "my good lord", "Hamlet", 10, "0,2"),
+            _chunk("f3", "my good lord", "Lear", 40, "4,6"),
+        ])[0]
+        metadata = {k: v for k, v in row.items() if k not in ("text", "chunk_id")}
+        reference, alternates = split_provenances(dict(metadata, chunk_id="f1"))
+
+        self.assertNotIn("provenances", reference)
+        self.assertEqual(reference["title"], "Hamlet")
+        self.assertEqual(len(alternates), 1)
+        self.assertEqual(alternates[0]["title"], "Lear")
+        self.assertEqual(alternates[0]["word_index"], "4,6")
+        self.assertEqual(alternates[0]["chunk_id"], "f1")
+        self.assertEqual(alternates[0]["syllables"], 3)
+
+    def test_plain_metadata_has_no_alternates(self):
+        reference, alternates = split_provenances({"title": "Hamlet", "line": 1})
+        self.assertEqual(reference, {"title": "Hamlet", "line": 1})
+        self.assertEqual(alternates, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+try:
+    import spacy
+    SPACY_INSTALLED = True
+except ImportError:
+    SPACY_INSTALLED = False
+
+import modules.chunking.phrase_chunker as phrase_chunker
+from modules.chunking.doc_cache import DocCache, load_doc_cache
+from modules.chunking.phrase_chunker import PhraseChunker
+
+LINES = [
+    {"chunk_id": "chunk_1", "title": "Test Play", "act": "I", "scene": "I", "line": 1,
+     "text": "Hark! Who goes there, friend or foe, by night?"},
+    {"chunk_id": "chunk_2", "title": "Test Play", "act": "I", "scene": "I", "line": 2,
+     "text": "It is the east, and Juliet is the sun."},
+]
+
+
+@unittest.skipUnless(SPACY_INSTALLED, "spaCy not installed")
+class TestDocCache(unittest.TestCase):
+
+    def setUp(self):
+        self.nlp = spacy.blank("en")
+        self.cache = DocCache()
+        for line in LINES:
+            self.cache.add(line["chunk_id"], self.nlp(line["text"]))
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.cache.save(tmp)
+            loaded = load_doc_cache(self.nlp.vocab, tmp)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.get("chunk_2").text, LINES[1]["text"])
+        self.assertIsNone(loaded.get("chunk_2", text="Different text"))
+        self.assertIsNone(loaded.get("chunk_1", needs_parse=True))
+        self.assertIsNone(load_doc_cache(self.nlp.vocab, tmp + "_missing"))
+
+    def test_phrase_chunker_slices_cached_docs(self):
+        counting_nlp = Mock(side_effect=self.nlp)
+        with patch.object(phrase_chunker, "nlp", counting_nlp, create=True), \
+                patch.object(phrase_chunker, "SPACY_AVAILABLE", True):
+            chunks = PhraseChunker(doc_cache=self.cache).chunk_from_line_chunks(LINES)
+            uncached = PhraseChunker().chunk_from_line_chunks(LINES)
+
+        self.assertEqual(counting_nlp.call_count, 2)  # only the uncached run parsed, once per line
+        self.assertEqual(chunks, uncached)
+        self.assertEqual(
+            [(c["text"], c["word_index"]) for c in chunks],
+            [("Who goes there", "1,3"), ("friend or foe", "4,6"),
+             ("It is the east", "0,3"), ("and Juliet is the sun", "4,8")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
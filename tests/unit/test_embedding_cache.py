@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from modules.rag.embedding_cache import EmbeddingCache, cache_key
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_normalizes_whitespace_and_includes_model(self):
+        self.assertEqual(cache_key("m", " love  and\ndeath "), cache_key("m", "love and death"))
+        self.assertNotEqual(cache_key("m1", "love"), cache_key("m2", "love"))
+
+    def test_round_trip_counts_hits_and_misses(self):
+        cache = EmbeddingCache(path=self.path)
+        cache.put_many("m", ["love", "death"], [[0.5, 1.0], [0.25, -2.0]])
+
+        found = cache.get_many("m", ["death", "honour", "love"])
+
+        self.assertEqual(found, {0: [0.25, -2.0], 2: [0.5, 1.0]})
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+        cache.close()
+
+    def test_persists_across_instances(self):
+        cache = EmbeddingCache(path=self.path)
+        cache.put_many("m", ["love"], [[0.5]])
+        cache.close()
+
+        reopened = EmbeddingCache(path=self.path)
+        self.assertEqual(reopened.get_many("m", ["love"]), {0: [0.5]})
+        reopened.close()
+
+    def test_evicts_least_recently_used(self):
+        cache = EmbeddingCache(path=self.path, max_entries=2)
+        cache.put_many("m", ["a"], [[1.0]])
+        cache.put_many("m", ["b"], [[2.0]])
+        cache.get_many("m", ["a"])  # refresh "a" so "b" is the oldest
+        cache.put_many("m", ["c"], [[3.0]])
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(sorted(cache.get_many("m", ["a", "b", "c"]).keys()), [0, 2])
+        cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,18 @@
 import unittest
 from unittest.mock import patch, MagicMock
+from modules.rag.embedding_backends import EmbeddingBackend, HashedNgramBackend
 from modules.rag.embeddings import EmbeddingGenerator
+from modules.rag.embedding_cache import EmbeddingCache
 import os
 import json
+import tempfile
+import threading
+import time
 
 class TestEmbeddingGenerator(unittest.TestCase):
 
     def setUp(self):
-        self.embedder = EmbeddingGenerator(model_name='test-model')
+        self.embedder = EmbeddingGenerator(model_name='test-model', use_cache=False)
 
     @patch("openai.embeddings.create")
     def test_embed_texts_returns_vectors(self, mock_create):
@@ -33,6 +38,146 @@ class TestEmbeddingGenerator(unittest.TestCase):
         self.assertIn("embedding", result[0])
         self.assertEqual(len(result[0]["embedding"]), 2)
 
+    @patch("openai.embeddings.create")
+    def test_cached_texts_skip_api_call(self, mock_create):
+        mock_create.side_effect = lambda input, model: MagicMock(
+            data=[MagicMock(embedding=[0.5, 0.25]) for _ in input]
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(path=os.path.join(tmp, "cache.sqlite"))
+            embedder = EmbeddingGenerator(model_name='test-model', cache=cache)
+
+            embedder.embed_texts(["my good lord", "I know not what"])
+            vectors = embedder.embed_texts(["my  good lord", "I know not what", "my good lord"])
+
+            self.assertEqual(mock_create.call_count, 1)
+            self.assertEqual(vectors, [[0.5, 0.25]] * 3)
+            self.assertEqual(cache.stats()["hits"], 3)
+            cache.close()
+
+    @patch("modules.rag.embeddings.BATCH_SIZE_LIMIT", 2)
+    @patch("openai.embeddings.create")
+    def test_concurrent_batches_are_reassembled_in_order(self, mock_create):
+        def fake_create(input, model):
+            time.sleep(0.01 * (5 - len(input[0])))  # finish out of order
+            return MagicMock(data=[MagicMock(embedding=[float(len(t))]) for t in input])
+        mock_create.side_effect = fake_create
+        texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+        vectors = self.embedder.embed_texts(texts)
+
+        self.assertEqual(mock_create.call_count, 3)
+        self.assertEqual(vectors, [[1.0], [2.0], [3.0], [4.0], [5.0]])
+        self.assertEqual(self.embedder.last_dispatch_stats["chunks"], 5)
+        self.assertGreater(self.embedder.last_dispatch_stats["chunks_per_sec"], 0)
+
+    @patch("modules.rag.embeddings.BACKOFF_BASE_SECONDS", 0.0)
+    @patch("openai.embeddings.create")
+    def test_rate_limited_batch_is_retried(self, mock_create):
+        class TooManyRequests(Exception):
+            status_code = 429
+        mock_create.side_effect = [
+            TooManyRequests("slow down"),
+            MagicMock(data=[MagicMock(embedding=[0.1, 0.2])]),
+        ]
+
+        vectors = self.embedder.embed_texts(["To be or not to be"])
+
+        self.assertEqual(vectors, [[0.1, 0.2]])
+        self.assertEqual(mock_create.call_count, 2)
+        self.assertEqual(self.embedder.last_dispatch_stats["rate_limit_retries"], 1)
+
+    @patch("modules.rag.embeddings.BACKOFF_BASE_SECONDS", 0.0)
+    @patch("openai.embeddings.create")
+    def test_concurrent_calls_count_only_their_own_retries(self, mock_create):
+        class TooManyRequests(Exception):
+            status_code = 429
+        fast_started, slow_backing_off, fast_done = threading.Event(), threading.Event(), threading.Event()
+        limited = []
+
+        def fake_create(input, model):
+            if input == ["fast"]:
+                fast_started.set()
+                slow_backing_off.wait(5)
+            elif not limited:
+                limited.append(input)
+                fast_started.wait(5)
+                raise TooManyRequests("slow down")
+            return MagicMock(data=[MagicMock(embedding=[0.1])])
+        mock_create.side_effect = fake_create
+
+        def back_off(seconds):
+            # The other call finishes while this one waits to retry
+            slow_backing_off.set()
+            fast_done.wait(5)
+
+        embedder = EmbeddingGenerator(model_name='test-model', use_cache=False)
+        fast_stats = {}
+
+        def embed_fast():
+            embedder.embed_texts(["fast"])
+            fast_stats.update(embedder.last_dispatch_stats)
+            fast_done.set()
+
+        with patch("modules.rag.embeddings.time.sleep", side_effect=back_off):
+            fast = threading.Thread(target=embed_fast)
+            fast.start()
+            embedder.embed_texts(["slow"])
+            fast.join(5)
+
+        self.assertEqual(fast_stats["rate_limit_retries"], 0)
+        self.assertEqual(embedder.last_dispatch_stats["rate_limit_retries"], 1)
+
+    @patch("openai.embeddings.create")
+    def test_shortened_dimensions_are_requested_and_cached_separately(self, mock_create):
+        mock_create.side_effect = lambda input, model, **options: MagicMock(
+            data=[MagicMock(embedding=[0.1] * options.get("dimensions", 4)) for _ in input]
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(path=os.path.join(tmp, "cache.sqlite"))
+            full = EmbeddingGenerator(model_name='test-model', cache=cache)
+            short = EmbeddingGenerator(model_name='test-model', cache=cache, dimensions=2)
+
+            self.assertEqual(len(full.embed_texts(["Once more unto the breach"])[0]), 4)
+            self.assertEqual(len(short.embed_texts(["Once more unto the breach"])[0]), 2)
+            cache.close()
+
+        self.assertEqual(mock_create.call_count, 2)
+        self.assertEqual(mock_create.call_args.kwargs["dimensions"], 2)
+
+    @patch("openai.embeddings.create")
+    def test_local_backend_is_deterministic_and_offline(self, mock_create):
+        embedder = EmbeddingGenerator(use_cache=False, backend="local", dimensions=256)
+        texts = ["Now is the winter of our discontent",
+                 "Now is the winter of discontent",
+                 "Exit, pursued by a bear"]
+
+        first = embedder.embed_texts(texts)
+        second = EmbeddingGenerator(use_cache=False, backend=HashedNgramBackend(256)).embed_texts(texts)
+
+        mock_create.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(embedder.cache_namespace, "local-hashed-ngram-v1@256")
+        self.assertAlmostEqual(sum(v * v for v in first[0]), 1.0, places=6)
+        similar = sum(a * b for a, b in zip(first[0], first[1]))
+        unrelated = sum(a * b for a, b in zip(first[0], first[2]))
+        self.assertGreater(similar, unrelated)
+
+    def test_backend_without_embed_cannot_be_constructed(self):
+        class IncompleteBackend(EmbeddingBackend):
+            name = "incomplete"
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+    @patch("modules.rag.embedding_backends.load_dotenv")
+    def test_backend_setting_is_read_after_import(self, mock_load_dotenv):
+        with patch.dict(os.environ, {"EMBEDDING_BACKEND": "local"}):
+            embedder = EmbeddingGenerator(use_cache=False, dimensions=64)
+
+        mock_load_dotenv.assert_called()
+        self.assertIsInstance(embedder.backend, HashedNgramBackend)
+
     def test_save_embedded_chunks_creates_file(self):
         chunks = [{"text": "Sample", "embedding": [0.1, 0.2]}]
         output_path = "temp/test_embedded.json"
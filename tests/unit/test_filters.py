@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+from modules.rag.filters import (
+    RowExclusion, SearchConstraints, SessionExcludedIds, SessionRowExclusions, combine_row_masks, filter_flags
+)
+
+
+class TestFilters(unittest.TestCase):
+
+    def test_filter_flags_from_pos_and_text(self):
+        flags = filter_flags({"text": "Hamlet, thou hast thy father much offended", "POS": ["PROPN", "PRON", "AUX"]})
+        self.assertEqual(flags, {"starts_with_propn": True, "has_propn": True, "has_midline_capital": False})
+
+        flags = filter_flags({"text": "Good night, sweet Prince", "POS": ["ADJ", "NOUN", "ADJ", "NOUN"]})
+        self.assertTrue(flags["has_midline_capital"])
+        self.assertFalse(flags["has_propn"])
+
+        # "I" is never read as a proper noun
+        self.assertFalse(filter_flags({"text": "Thus I die"})["has_midline_capital"])
+
+    def test_to_where_compiles_ranges_and_flags(self):
+        self.assertIsNone(SearchConstraints().to_where())
+        self.assertEqual(SearchConstraints(max_words=4).to_where(), {"word_count": {"$lte": 4}})
+        self.assertEqual(
+            SearchConstraints(min_syllables=8, max_syllables=12, exclude_proper_nouns=True).to_where(),
+            {"$and": [
+                {"syllables": {"$gte": 8}},
+                {"syllables": {"$lte": 12}},
+                {"has_propn": {"$eq": False}},
+                {"has_midline_capital": {"$eq": False}},
+            ]}
+        )
+
+    def test_matches_agrees_with_where_semantics(self):
+        constraints = SearchConstraints(min_syllables=8, exclude_proper_nouns=True)
+        clean = {"syllables": 10, "has_propn": False, "has_midline_capital": False}
+        self.assertTrue(constraints.matches(clean))
+        self.assertFalse(constraints.matches(dict(clean, syllables=6)))
+        self.assertFalse(constraints.matches(dict(clean, has_propn=True)))
+        # Missing fields fail, as in Chroma
+        self.assertFalse(constraints.matches({"syllables": 10}))
+
+    def test_row_exclusion_updates_incrementally(self):
+        exclusion = RowExclusion(["a", "b", "c", "d"])
+        used = {"b"}
+        self.assertEqual(exclusion.update(used).tolist(), [False, True, False, False])
+        used.update({"d", "unknown"})
+        self.assertEqual(exclusion.update(used).tolist(), [False, True, False, True])
+        self.assertEqual(exclusion.update({"a"}).tolist(), [True, False, False, False])
+
+        allowed = combine_row_masks(None, exclusion.mask)
+        self.assertEqual(allowed.tolist(), [False, True, True, True])
+
+    def test_alternating_sessions_keep_their_own_exclusion(self):
+        exclusions = SessionRowExclusions(["a", "b", "c", "d"], max_sessions=2)
+        first = exclusions.update(SessionExcludedIds({"a"}, "s1"))
+        second = exclusions.update(SessionExcludedIds({"c"}, "s2"))
+        self.assertEqual(first.tolist(), [True, False, False, False])
+        self.assertEqual(second.tolist(), [False, False, True, False])
+
+        with patch.object(RowExclusion, "__init__", side_effect=AssertionError("rebuilt")):
+            self.assertIs(exclusions.update(SessionExcludedIds({"a", "b"}, "s1")), first)
+            self.assertIs(exclusions.update(SessionExcludedIds({"c"}, "s2")), second)
+        self.assertEqual(first.tolist(), [True, True, False, False])
+
+        # Beyond max_sessions the least recently used session is dropped
+        exclusions.update(SessionExcludedIds({"d"}, "s3"))
+        self.assertIsNot(exclusions.update(SessionExcludedIds({"a", "b"}, "s1")), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -233,6 +233,27 @@ Will be a tatter'd weed, of small worth held:
                     f"Line numbers should be sequential within Act {act}, Scene {scene}"
                 )
 
+    def test_batched_tagging_keeps_line_order(self):
+        """Lines tagged through nlp.pipe are attached to the right chunks."""
+        try:
+            import spacy
+        except ImportError:
+            self.skipTest("spaCy not installed")
+        from unittest.mock import patch
+        import modules.chunking.line_chunker as line_chunker
+
+        chunker = LineChunker(logger=self.logger, batch_size=2)
+        with patch.object(line_chunker, "nlp", spacy.blank("en"), create=True), \
+                patch.object(line_chunker, "SPACY_AVAILABLE", True):
+            chunks = chunker.chunk_text(self.sonnet_text)
+
+        self.assertEqual(len(chunks), 8)
+        self.assertEqual([c["chunk_id"] for c in chunks], [f"chunk_{i}" for i in range(1, 9)])
+        self.assertEqual(chunks[4]["text"], "When forty winters shall beseige thy brow,")
+        self.assertEqual(chunks[4]["word_count"], 7)
+        self.assertEqual(chunks[4]["line"], 1)
+        self.assertEqual(len(chunks[4]["POS"]), 7)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
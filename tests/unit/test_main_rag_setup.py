@@ -1,6 +1,12 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
+from modules.chunking.chunk_io import write_chunks
 from modules.rag import main_rag_setup
+from modules.rag.index_manifest import IndexManifest, index_version, manifest_dir_for
+from modules.rag.vector_store import DEFAULT_CHROMA_PATH, LOCAL_CHROMA_PATH, default_chroma_path
+from modules.rag.shard_format import write_shard
 
 class TestMainRagSetup(unittest.TestCase):
 
@@ -37,5 +43,243 @@ class TestMainRagSetup(unittest.TestCase):
         mock_embedder.embed_chunks.assert_called_once_with(dummy_chunks)
         mock_store.add_documents.assert_called_once_with(dummy_embedded)
 
+    @patch("modules.rag.main_rag_setup.IndexManifest")
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_pipelined_run_stores_every_batch_in_order(self, mock_embedder_cls, mock_vector_store_cls, mock_manifest_cls):
+        mock_manifest_cls.return_value.model_changed = False
+        chunks = [{"text": f"line {i}", "chunk_id": f"chunk_{i:03d}"} for i in range(7)]
+
+        mock_embedder = MagicMock()
+        mock_embedder.embed_chunks.side_effect = lambda batch: [dict(c, embedding=[0.1]) for c in batch]
+        mock_embedder.last_dispatch_stats = {}
+        mock_embedder.cache = None
+        mock_embedder_cls.return_value = mock_embedder
+        mock_store = MagicMock()
+        mock_vector_store_cls.return_value = mock_store
+
+        with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": __file__}):
+            setup = main_rag_setup.RagSetup(chunk_type="lines", batch_size=3, save_embedded=False)
+        with patch.object(setup, "load_chunks", return_value=chunks), \
+             patch.object(setup, "load_progress", return_value=0), \
+             patch.object(setup, "save_progress"), \
+             patch.object(setup, "save_embedded_chunks"):
+            self.assertTrue(setup.run())
+
+        stored = [c["chunk_id"] for call in mock_store.add_documents.call_args_list for c in call.args[0]]
+        self.assertEqual(stored, [c["chunk_id"] for c in chunks])
+        self.assertEqual(setup.stats["batches_processed"], 3)
+
+    @patch("modules.rag.main_rag_setup.IndexManifest")
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_run_streams_jsonl_chunks_from_checkpoint(self, mock_embedder_cls, mock_vector_store_cls, mock_manifest_cls):
+        mock_manifest_cls.return_value.model_changed = False
+        chunks = [{"text": f"line {i}", "chunk_id": f"chunk_{i:03d}"} for i in range(7)]
+
+        mock_embedder = MagicMock()
+        mock_embedder.embed_chunks.side_effect = lambda batch: [dict(c, embedding=[0.1]) for c in batch]
+        mock_embedder.last_dispatch_stats = {}
+        mock_embedder.cache = None
+        mock_embedder_cls.return_value = mock_embedder
+        mock_store = MagicMock()
+        mock_vector_store_cls.return_value = mock_store
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Configured with the legacy name; the JSONL file next to it is read instead
+            write_chunks(chunks, os.path.join(tmp, "lines.jsonl"), "line")
+            with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": os.path.join(tmp, "lines.json")}):
+                setup = main_rag_setup.RagSetup(chunk_type="lines", batch_size=3, save_embedded=False)
+            with patch.object(setup, "load_progress", return_value=2), \
+                 patch.object(setup, "save_progress"), \
+                 patch.object(setup, "save_embedded_chunks"):
+                self.assertTrue(setup.run())
+
+        embedded = [[c["chunk_id"] for c in call.args[0]] for call in mock_embedder.embed_chunks.call_args_list]
+        self.assertEqual(embedded, [["chunk_002", "chunk_003", "chunk_004"], ["chunk_005", "chunk_006"]])
+        self.assertEqual(setup.stats["chunks_loaded"], 7)
+
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_pipeline_stops_when_chunk_source_raises(self, mock_embedder_cls, mock_vector_store_cls):
+        mock_embedder = MagicMock()
+        mock_embedder.embed_chunks.side_effect = lambda batch: [dict(c, embedding=[0.1]) for c in batch]
+        mock_embedder.last_dispatch_stats = {}
+        mock_embedder_cls.return_value = mock_embedder
+        mock_store = MagicMock()
+        mock_vector_store_cls.return_value = mock_store
+
+        def broken_chunks():
+            for i in range(4):
+                yield {"text": f"line {i}", "chunk_id": f"chunk_{i:03d}"}
+            raise ValueError("malformed JSONL line")
+
+        with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": __file__}):
+            setup = main_rag_setup.RagSetup(chunk_type="lines", batch_size=3, save_embedded=False)
+        stored = []
+        result = setup._run_pipeline(broken_chunks(), lambda end_idx, batch: stored.append(end_idx),
+                                     total_chunks=9)
+
+        self.assertFalse(result)
+        self.assertEqual(stored, [3])
+        self.assertEqual(setup.stats["errors"], 1)
+
+    def test_backpressure_pauses_only_on_latency_spike(self):
+        backpressure = main_rag_setup.InsertBackpressure(max_pause=0.01)
+        with patch("modules.rag.main_rag_setup.time.sleep") as mock_sleep:
+            self.assertEqual(backpressure.after_insert(1.0, 100), 0.0)
+            self.assertEqual(backpressure.after_insert(1.1, 100), 0.0)
+            self.assertEqual(backpressure.after_insert(5.0, 100), 0.01)
+        mock_sleep.assert_called_once_with(0.01)
+
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_incremental_run_embeds_only_changes(self, mock_embedder_cls, mock_vector_store_cls):
+        old = [{"text": "Fair is foul", "chunk_id": "c1"}, {"text": "Out, damned spot", "chunk_id": "c2"},
+               {"text": "Removed line", "chunk_id": "c3"}]
+        new = [{"text": "Fair is foul", "chunk_id": "c1"}, {"text": "Out, damned spot!", "chunk_id": "c2"},
+               {"text": "Brand new line", "chunk_id": "c4"}]
+
+        mock_embedder = MagicMock()
+        mock_embedder.cache_namespace = "test-model"
+        mock_embedder.embed_chunks.side_effect = lambda batch: [dict(c, embedding=[0.1]) for c in batch]
+        mock_embedder.last_dispatch_stats = {}
+        mock_embedder_cls.return_value = mock_embedder
+        mock_store = MagicMock()
+        mock_vector_store_cls.return_value = mock_store
+
+        with tempfile.TemporaryDirectory() as chroma_path:
+            manifest_dir = manifest_dir_for(chroma_path)
+            manifest = IndexManifest("lines", "test-model", manifest_dir=manifest_dir)
+            manifest.record(old)
+            manifest.save()
+
+            with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": __file__}):
+                setup = main_rag_setup.RagSetup(
+                    chunk_type="lines", batch_size=10, save_embedded=False, chroma_path=chroma_path
+                )
+            with patch.object(setup, "load_chunks", return_value=new):
+                self.assertTrue(setup.run_incremental())
+
+            self.assertEqual(mock_vector_store_cls.call_args.kwargs["path"], chroma_path)
+
+            embedded = [c["chunk_id"] for call in mock_embedder.embed_chunks.call_args_list for c in call.args[0]]
+            self.assertEqual(embedded, ["c2", "c4"])
+            mock_store.delete_ids.assert_called_once_with(["c3"])
+            mock_store.add_documents.assert_not_called()
+
+            reloaded = IndexManifest("lines", "test-model", manifest_dir=manifest_dir)
+            self.assertEqual(set(reloaded.hashes), {"c1", "c2", "c4"})
+            self.assertEqual(reloaded.diff(new).to_embed, [])
+
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_collection_from_another_model_is_rebuilt_only_on_request(self, mock_embedder_cls, mock_vector_store_cls):
+        chunks = [{"text": "Fair is foul", "chunk_id": "c1"}, {"text": "Out, damned spot", "chunk_id": "c2"}]
+
+        mock_embedder = MagicMock()
+        mock_embedder.cache_namespace = "local@768"
+        mock_embedder.embed_chunks.side_effect = lambda batch: [dict(c, embedding=[0.1]) for c in batch]
+        mock_embedder.last_dispatch_stats = {}
+        mock_embedder_cls.return_value = mock_embedder
+        mock_store = MagicMock()
+        mock_vector_store_cls.return_value = mock_store
+
+        with tempfile.TemporaryDirectory() as chroma_path:
+            manifest_dir = manifest_dir_for(chroma_path)
+            manifest = IndexManifest("lines", "openai@3072", manifest_dir=manifest_dir)
+            manifest.record(chunks)
+            manifest.save()
+
+            with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": __file__}):
+                refusing = main_rag_setup.RagSetup(
+                    chunk_type="lines", batch_size=10, save_embedded=False, chroma_path=chroma_path
+                )
+                setup = main_rag_setup.RagSetup(
+                    chunk_type="lines", batch_size=10, save_embedded=False, chroma_path=chroma_path, rebuild=True
+                )
+            with patch.object(refusing, "load_chunks", return_value=chunks):
+                self.assertFalse(refusing.run())
+                self.assertFalse(refusing.run_incremental())
+            mock_store.recreate_collection.assert_not_called()
+            mock_embedder.embed_chunks.assert_not_called()
+            self.assertTrue(IndexManifest("lines", "local@768", manifest_dir=manifest_dir).model_changed)
+
+            with patch.object(setup, "load_chunks", return_value=chunks):
+                self.assertTrue(setup.run_incremental())
+
+            mock_store.recreate_collection.assert_called_once_with()
+            mock_store.delete_ids.assert_not_called()
+            embedded = [c["chunk_id"] for call in mock_embedder.embed_chunks.call_args_list for c in call.args[0]]
+            self.assertEqual(embedded, ["c1", "c2"])
+
+            reloaded = IndexManifest("lines", "local@768", manifest_dir=manifest_dir)
+            self.assertFalse(reloaded.model_changed)
+            self.assertEqual(set(reloaded.hashes), {"c1", "c2"})
+
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_shard_insert_updates_manifest_and_index_version(self, mock_embedder_cls, mock_vector_store_cls):
+        chunks = [{"text": f"line {i}", "chunk_id": f"c{i}", "embedding": [0.1 * i, 0.2]} for i in range(3)]
+        mock_embedder = MagicMock()
+        mock_embedder.cache_namespace = "test-model"
+        mock_embedder_cls.return_value = mock_embedder
+        mock_vector_store_cls.return_value.embedding_dimension.return_value = None
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest_dir = manifest_dir_for(tmp)
+            bm25_dir = os.path.join(tmp, "bm25")
+            write_shard(chunks, os.path.join(tmp, "shards", "lines_shard_1"), collection="lines")
+            version = lambda: index_version(manifest_dir=manifest_dir, derived_index_dirs=(bm25_dir,))
+            before = version()
+
+            with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": __file__}):
+                setup = main_rag_setup.RagSetup(chunk_type="lines", batch_size=10, save_embedded=False, chroma_path=tmp)
+            self.assertTrue(setup.run_from_shards(os.path.join(tmp, "shards")))
+
+            self.assertEqual(set(IndexManifest("lines", "test-model", manifest_dir=manifest_dir).hashes),
+                             {"c0", "c1", "c2"})
+            after_insert = version()
+            self.assertNotEqual(before, after_insert)
+
+            # A rebuilt BM25 index also changes the version
+            os.makedirs(os.path.join(bm25_dir, "lines"))
+            with open(os.path.join(bm25_dir, "lines", "manifest.json"), 'w', encoding='utf-8') as f:
+                f.write("{}")
+            self.assertNotEqual(after_insert, version())
+
+
+    @patch("modules.rag.main_rag_setup.VectorStore")
+    @patch("modules.rag.main_rag_setup.EmbeddingGenerator")
+    def test_unmanifested_collection_of_another_width_is_left_alone(self, mock_embedder_cls, mock_vector_store_cls):
+        chunks = [{"text": "Fair is foul", "chunk_id": "c1"}]
+        mock_embedder = MagicMock()
+        mock_embedder.cache_namespace = "local@768"
+        mock_embedder.embed_texts.return_value = [[0.1] * 768]
+        mock_embedder_cls.return_value = mock_embedder
+        mock_store = MagicMock()
+        mock_store.embedding_dimension.return_value = 3072
+        mock_vector_store_cls.return_value = mock_store
+
+        with tempfile.TemporaryDirectory() as chroma_path:
+            with patch.dict(main_rag_setup.INPUT_PATHS, {"lines": __file__}):
+                setup = main_rag_setup.RagSetup(
+                    chunk_type="lines", batch_size=10, save_embedded=False, chroma_path=chroma_path
+                )
+            with patch.object(setup, "load_chunks", return_value=chunks):
+                self.assertFalse(setup.run())
+
+        mock_store.recreate_collection.assert_not_called()
+        mock_store.add_documents.assert_not_called()
+        mock_embedder.embed_chunks.assert_not_called()
+
+    def test_local_backend_defaults_to_its_own_chroma_directory(self):
+        with patch("modules.rag.vector_store.load_dotenv"), patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(default_chroma_path("openai"), DEFAULT_CHROMA_PATH)
+            self.assertEqual(default_chroma_path("local"), LOCAL_CHROMA_PATH)
+            os.environ["CHROMA_PATH"] = "/tmp/elsewhere"
+            self.assertEqual(default_chroma_path("local"), "/tmp/elsewhere")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+from modules.chunking.chunk_io import write_chunks
+from modules.rag.metadata_store import ChunkMetadataStore, build_metadata_store, open_metadata_store
+
+CHUNKS = [
+    {"chunk_id": "l1", "text": "To be, or not to be", "title": "Hamlet", "act": "3", "scene": "1",
+     "line": 56, "word_index": "0,5", "POS": ["PART", "AUX", "CCONJ", "PART", "PART", "AUX"]},
+    {"chunk_id": "l2", "text": "Now is the winter of our discontent", "title": "Richard III", "act": "1",
+     "scene": "1", "line": 1, "word_index": "0,6", "POS": ["ADV", "AUX", "DET", "NOUN", "ADP", "PRON", "NOUN"]},
+    {"chunk_id": "l3", "text": "Shall I compare thee", "title": "Sonnets", "act": None, "scene": None,
+     "line": 1, "word_index": "0,3", "POS": ["AUX", "PRON", "VERB", "PRON"]},
+]
+
+
+class TestChunkMetadataStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        build_metadata_store(CHUNKS, path=self.tmp.name, collection_name="lines")
+        self.store = ChunkMetadataStore(self.tmp.name, "lines")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rows_round_trip(self):
+        self.assertEqual(self.store.count(), 3)
+        row = self.store.row_of("l2")
+        self.assertEqual(row, 1)
+        self.assertEqual(self.store.text(row), "Now is the winter of our discontent")
+        self.assertEqual(self.store.pos(row), CHUNKS[1]["POS"])
+        self.assertEqual(self.store.word_range(row), (0, 6))
+        self.assertEqual(self.store.reference(2), {
+            "chunk_id": "l3", "title": "Sonnets", "act": None, "scene": None, "line": 1, "word_index": "0,3"
+        })
+
+    def test_find_line_treats_missing_act_and_scene_alike(self):
+        self.assertEqual(self.store.find_line("Hamlet", 3, "1", "56"), 0)
+        self.assertEqual(self.store.find_line("Sonnets", "null", "", 1), 2)
+        self.assertIsNone(self.store.find_line("Hamlet", "3", "1", 57))
+        self.assertIsNone(self.store.find_line("Macbeth", "1", "1", 1))
+
+    def test_open_returns_none_when_not_built(self):
+        self.assertIsNone(open_metadata_store("fragments", path=self.tmp.name))
+
+    def test_open_checks_the_store_against_its_chunk_file(self):
+        chunks_path = os.path.join(self.tmp.name, "lines.jsonl")
+        other_path = os.path.join(self.tmp.name, "ground_truth.jsonl")
+        write_chunks(CHUNKS, chunks_path, "line")
+        write_chunks(CHUNKS, other_path, "line")
+        build_metadata_store(CHUNKS, path=self.tmp.name, collection_name="lines", source_path=chunks_path)
+
+        self.assertIsNotNone(open_metadata_store("lines", path=self.tmp.name, source_path=chunks_path))
+        # Built from another file with the same content still does not count
+        self.assertIsNone(open_metadata_store("lines", path=self.tmp.name, source_path=other_path))
+
+        # Re-chunking rewrites the file, which makes the store stale
+        write_chunks(CHUNKS[:2], chunks_path, "line")
+        self.assertIsNone(open_metadata_store("lines", path=self.tmp.name, source_path=chunks_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
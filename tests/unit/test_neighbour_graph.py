@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+import numpy as np
+from modules.rag.neighbour_graph import NeighbourGraph, build_neighbour_graph
+from modules.rag.numpy_store import NumpyVectorStore, build_numpy_store
+
+class TestNeighbourGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(3)
+        self.line_vectors = rng.normal(size=(6, 8)).astype(np.float32)
+        # Each line has two phrases: one close to it, one random
+        phrase_rows = []
+        for i, vec in enumerate(self.line_vectors):
+            phrase_rows.append((f"phrase_{i}_0", f"near {i}", {"source_chunk_id": f"chunk_{i}"}, vec + 0.01))
+            phrase_rows.append((f"phrase_{i}_1", f"far {i}", {"source_chunk_id": f"chunk_{i}"}, rng.normal(size=8) * 5))
+        line_rows = [(f"chunk_{i}", f"line {i}", {"line": i}, vec) for i, vec in enumerate(self.line_vectors)]
+
+        build_numpy_store(iter(line_rows), 6, 8, path=self.tmp.name, collection_name="lines")
+        build_numpy_store(iter(phrase_rows), 12, 8, path=self.tmp.name, collection_name="phrases")
+        self.lines = NumpyVectorStore(path=self.tmp.name, collection_name="lines")
+        self.phrases = NumpyVectorStore(path=self.tmp.name, collection_name="phrases")
+        self.graph_path = f"{self.tmp.name}/graph"
+        build_neighbour_graph(self.lines, {"phrases": self.phrases}, path=self.graph_path, similar_k=2, batch_size=4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_source_children_come_first_then_similar(self):
+        graph = NeighbourGraph(path=self.graph_path)
+        neighbours = graph.neighbours("chunk_2", "phrases")
+
+        self.assertEqual([chunk_id for chunk_id, _ in neighbours[:2]], ["phrase_2_0", "phrase_2_1"])
+        self.assertEqual(neighbours[0][1], 0.0)
+        # Similar edges add other lines' phrases without duplicating the children
+        self.assertEqual(len({chunk_id for chunk_id, _ in neighbours}), len(neighbours))
+        self.assertEqual(graph.neighbours("unknown", "phrases"), [])
+        self.assertEqual(graph.arrays["phrases_similar_rows"].dtype, np.int32)
+
+    def test_get_by_ids_keeps_requested_order(self):
+        result = self.phrases.get_by_ids(["phrase_3_1", "missing", "phrase_0_0"])
+        self.assertEqual(result["ids"], ["phrase_3_1", "phrase_0_0"])
+        self.assertEqual(result["documents"], ["far 3", "near 0"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import tempfile
+import unittest
+import numpy as np
+import os
+from modules.rag.numpy_store import NumpyVectorStore, build_numpy_store
+from modules.rag.filters import SearchConstraints
+from modules.rag.quantization import build_matryoshka_index, quantize_numpy_store, recall_report
+
+class TestNumpyVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(7)
+        self.vectors = rng.normal(size=(300, 16)).astype(np.float32)
+        self.queries = rng.normal(size=(4, 16)).astype(np.float32)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _build(self, **kwargs):
+        rows = (
+            (f"chunk_{i}", f"text {i}", {"line": i}, vec)
+            for i, vec in enumerate(self.vectors)
+        )
+        build_numpy_store(rows, len(self.vectors), 16, path=self.tmp.name, collection_name="lines", **kwargs)
+        return NumpyVectorStore(path=self.tmp.name, collection_name="lines")
+
+    def _brute_force(self, k):
+        dist = ((self.queries[:, None, :] - self.vectors[None, :, :]) ** 2).sum(axis=2)
+        return np.argsort(dist, axis=1)[:, :k], np.sort(dist, axis=1)[:, :k]
+
+    def test_exact_search_matches_brute_force(self):
+        store = self._build()
+        expected_rows, expected_dist = self._brute_force(5)
+
+        results = store.query_many(self.queries.tolist(), n_results=5)
+
+        self.assertEqual(len(results), 4)
+        for q, result in enumerate(results):
+            self.assertEqual(result["ids"], [f"chunk_{r}" for r in expected_rows[q]])
+            np.testing.assert_allclose(result["distances"], expected_dist[q], rtol=1e-4)
+            self.assertEqual(result["metadatas"][0], {"line": int(expected_rows[q][0])})
+            self.assertEqual(result["documents"][0], f"text {expected_rows[q][0]}")
+
+    def test_constraints_mask_rows_in_exact_and_quantized_search(self):
+        rows = (
+            (f"chunk_{i}", f"text {i}", {"line": i, "syllables": i % 12}, vec)
+            for i, vec in enumerate(self.vectors)
+        )
+        directory = build_numpy_store(rows, len(self.vectors), 16, path=self.tmp.name, collection_name="lines")
+        constraints = SearchConstraints(min_syllables=4, max_syllables=6)
+
+        exact = NumpyVectorStore(path=self.tmp.name, collection_name="lines")
+        results = exact.query_many(self.queries.tolist(), n_results=5, constraints=constraints)
+        dist = ((self.queries[:, None, :] - self.vectors[None, :, :]) ** 2).sum(axis=2)
+        dist[:, [i for i in range(300) if not 4 <= i % 12 <= 6]] = np.inf
+        for q, result in enumerate(results):
+            self.assertEqual(result["ids"], [f"chunk_{r}" for r in np.argsort(dist[q])[:5]])
+
+        quantize_numpy_store(directory, "int8")
+        quantized = NumpyVectorStore(path=self.tmp.name, collection_name="lines")
+        for result in quantized.query_many(self.queries.tolist(), n_results=5, constraints=constraints):
+            self.assertEqual(len(result["ids"]), 5)
+            self.assertTrue(all(4 <= m["syllables"] <= 6 for m in result["metadatas"]))
+
+    def test_excluded_ids_are_skipped_and_bitset_follows_updates(self):
+        store = self._build()
+        expected_rows, _ = self._brute_force(3)
+        used = {f"chunk_{expected_rows[0][0]}"}
+
+        first = store.query_many(self.queries[:1].tolist(), n_results=2, exclude_ids=used)[0]
+        self.assertEqual(first["ids"], [f"chunk_{r}" for r in expected_rows[0][1:3]])
+
+        used.add(f"chunk_{expected_rows[0][1]}")
+        second = store.query_many(self.queries[:1].tolist(), n_results=1, exclude_ids=used)[0]
+        self.assertEqual(second["ids"], [f"chunk_{expected_rows[0][2]}"])
+
+        # A new session's empty set clears the bitset
+        fresh = store.query_many(self.queries[:1].tolist(), n_results=1, exclude_ids=set())[0]
+        self.assertEqual(fresh["ids"], [f"chunk_{expected_rows[0][0]}"])
+
+    def test_ivf_with_all_lists_probed_is_exact(self):
+        store = self._build(nlist=8)
+        store.nprobe = 8
+        expected_rows, _ = self._brute_force(3)
+
+        results = store.query_many(self.queries.tolist(), n_results=3)
+
+        for q, result in enumerate(results):
+            self.assertEqual(result["ids"], [f"chunk_{r}" for r in expected_rows[q]])
+
+    def test_float16_storage_keeps_ranking_close(self):
+        store = self._build(dtype="float16")
+        expected_rows, _ = self._brute_force(1)
+
+        results = store.query_many(self.queries.tolist(), n_results=1)
+
+        self.assertEqual(store.vectors.dtype, np.float16)
+        hits = sum(r["ids"][0] == f"chunk_{expected_rows[q][0]}" for q, r in enumerate(results))
+        self.assertGreaterEqual(hits, 3)
+    def test_int8_quantization_with_rerank_returns_exact_distances(self):
+        self._build()
+        directory = os.path.join(self.tmp.name, "lines")
+        quantize_numpy_store(directory, "int8")
+        store = NumpyVectorStore(path=self.tmp.name, collection_name="lines", rerank_factor=4)
+        expected_rows, expected_dist = self._brute_force(5)
+
+        results = store.query_many(self.queries.tolist(), n_results=5)
+
+        self.assertEqual(store.quantizer.kind, "int8")
+        self.assertEqual(store.quantizer.codes.dtype, np.int8)
+        for q, result in enumerate(results):
+            self.assertEqual(result["ids"], [f"chunk_{r}" for r in expected_rows[q]])
+            np.testing.assert_allclose(result["distances"], expected_dist[q], rtol=1e-4)
+
+    def test_pq_quantization_recalls_nearest_neighbour(self):
+        self._build()
+        quantize_numpy_store(os.path.join(self.tmp.name, "lines"), "pq", pq_subspaces=4)
+        store = NumpyVectorStore(path=self.tmp.name, collection_name="lines", rerank_factor=10)
+        expected_rows, _ = self._brute_force(1)
+
+        results = store.query_many(self.queries.tolist(), n_results=1)
+
+        self.assertEqual(store.quantizer.codes.shape, (300, 4))
+        hits = sum(r["ids"][0] == f"chunk_{expected_rows[q][0]}" for q, r in enumerate(results))
+        self.assertGreaterEqual(hits, 3)
+
+    def test_recall_report_covers_each_setting(self):
+        report = recall_report(self.vectors, [{"kind": "int8"}, {"kind": "pq", "m": 4}],
+                               num_queries=20, k=5, rerank_factors=(1, 4))
+
+        self.assertEqual(len(report), 4)
+        int8_rows = [r for r in report if r["kind"] == "int8"]
+        self.assertEqual(int8_rows[0]["bytes_per_vector"], 20)
+        self.assertGreaterEqual(int8_rows[1]["recall@5"], 0.9)
+        self.assertEqual([r["compression"] for r in report if r["kind"] == "pq"], [16.0, 16.0])
+
+    def test_matryoshka_coarse_search_reranks_at_full_width(self):
+        self._build()
+        build_matryoshka_index(os.path.join(self.tmp.name, "lines"), dims=8)
+        store = NumpyVectorStore(path=self.tmp.name, collection_name="lines", coarse_dims=8, rerank_factor=20)
+        expected_rows, expected_dist = self._brute_force(3)
+
+        results = store.query_many(self.queries.tolist(), n_results=3)
+
+        self.assertEqual(store.quantizer.kind, "matryoshka")
+        self.assertEqual(store.quantizer.codes.shape, (300, 8))
+        for q, result in enumerate(results):
+            self.assertEqual(len(result["ids"]), 3)
+            # Whatever the shortlist holds, reported distances are full-width
+            for chunk_id, dist in zip(result["ids"], result["distances"]):
+                row = int(chunk_id.split("_")[1])
+                self.assertAlmostEqual(dist, float(((self.queries[q] - self.vectors[row]) ** 2).sum()), places=3)
+        hits = sum(r["ids"][0] == f"chunk_{expected_rows[q][0]}" for q, r in enumerate(results))
+        self.assertGreaterEqual(hits, 3)
+
+    def test_missing_matryoshka_dims_falls_back_to_full_width(self):
+        store = self._build()
+        store = NumpyVectorStore(path=self.tmp.name, collection_name="lines", coarse_dims=8)
+        self.assertIsNone(store.quantizer)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import tempfile
+from unittest.mock import patch
+
+from modules.rag.filters import SearchConstraints
+from modules.rag.used_map import UsedMap
+from modules.translator.rag_caller import DEFAULT_CONSTRAINTS, RagCaller, _slice_result
+
+
+def _result(prefix, n):
+    return {
+        "ids": [f"{prefix}{i}" for i in range(n)],
+        "documents": [f"{prefix} doc {i}" for i in range(n)],
+        "metadatas": [{"title": "Hamlet", "line": i} for i in range(n)],
+        "distances": [0.1 * i for i in range(n)],
+    }
+
+
+def _fake_search(modern_line, top_k, prepared=None, constraints=None, exclude_ids=None):
+    return {
+        "original_line": modern_line,
+        "search_chunks": {
+            "line": _result("l", top_k),
+            "phrases": [_result("p", top_k)],
+            "fragments": [_result("f", top_k)],
+        },
+    }
+
+
+class TestRagCallerMemo(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("modules.translator.rag_caller.ShakespeareSearchEngine")
+        self.engine = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.engine.prepare_query.return_value = {"plan": {}, "vectors": {}}
+        self.engine.search_line.side_effect = _fake_search
+        self.engine.hybrid_search.side_effect = _fake_search
+        self.rag = RagCaller()
+
+    def test_smaller_requests_are_served_from_memo(self):
+        first = self.rag.retrieve_all("To be or not to be", top_k=5)
+        again = self.rag.retrieve_all("  To be or not  to be ", top_k=1)
+        by_line = self.rag.retrieve_by_line("To be or not to be", top_k=3)
+
+        self.assertEqual(self.engine.search_line.call_count, 1)
+        self.assertEqual(self.engine.prepare_query.call_count, 1)
+        self.assertEqual(len(first["line"]), 5)
+        self.assertEqual(len(again["line"]), 1)
+        self.assertEqual(len(again["fragments"]), 1)
+        self.assertEqual([c.text for c in by_line], ["l doc 0", "l doc 1", "l doc 2"])
+
+    def test_larger_requests_page_and_reuse_query_vectors(self):
+        self.rag.retrieve_all("A line", top_k=5)
+        self.rag.retrieve_all("A line", top_k=15)
+        self.rag.retrieve_all("A line", top_k=20)
+
+        fetched = [call.args[1] for call in self.engine.search_line.call_args_list]
+        self.assertEqual(fetched, [10, 20])
+        self.assertEqual(self.engine.prepare_query.call_count, 1)
+
+        self.rag.hybrid_search("A line", top_k=15)
+        self.assertEqual(self.engine.hybrid_search.call_count, 1)
+        self.assertEqual(self.engine.prepare_query.call_count, 1)
+
+    def test_constraints_are_pushed_down_and_memoized_separately(self):
+        self.rag.retrieve_all("A line", top_k=5)
+        short = SearchConstraints(max_syllables=6, exclude_proper_nouns=True)
+        self.rag.retrieve_by_fragment("A line", top_k=5, constraints=short)
+        self.rag.retrieve_by_fragment("A line", top_k=3, constraints=short)
+
+        passed = [call.kwargs["constraints"] for call in self.engine.search_line.call_args_list]
+        self.assertEqual(passed, [DEFAULT_CONSTRAINTS, short])
+
+    def test_used_chunks_are_excluded_at_retrieval_and_from_memo(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        used_map = UsedMap(storage_dir=tmp.name)
+        used_map.load("t1")
+        self.rag.used_map = used_map
+
+        first = self.rag.retrieve_all("A line", top_k=3)
+        self.assertEqual(first["line"][0].reference["chunk_id"], "l0")
+
+        used_map.mark_used("Hamlet|1|1|0", [0, 4], chunk_id="l0")
+        again = self.rag.retrieve_all("A line", top_k=3)
+        self.assertEqual([c.reference["chunk_id"] for c in again["line"]], ["l1", "l2", "l3"])
+        self.assertEqual(self.engine.search_line.call_count, 1)
+        self.assertIs(self.engine.search_line.call_args.kwargs["exclude_ids"], used_map.used_chunk_ids())
+
+    def test_reset_memo_forgets_previous_session(self):
+        self.rag.retrieve_all("A line", top_k=5)
+        self.rag.reset_memo()
+        self.rag.retrieve_all("A line", top_k=5)
+        self.assertEqual(self.engine.search_line.call_count, 2)
+        self.assertEqual(self.rag.memo_stats, {"hits": 0, "misses": 1})
+
+    def test_session_results_persist_until_the_index_changes(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with patch("modules.translator.rag_caller.index_version", return_value="v1"):
+            self.rag.start_session("t1", cache_dir=tmp.name)
+            self.rag.retrieve_all("A line", top_k=5)
+
+            resumed = RagCaller()
+            resumed.start_session("t1", cache_dir=tmp.name)
+            again = resumed.retrieve_all("A line", top_k=5)
+        self.assertEqual(self.engine.search_line.call_count, 1)
+        self.assertEqual([c.text for c in again["line"]][:2], ["l doc 0", "l doc 1"])
+        self.assertEqual(resumed.result_cache.hits, 1)
+
+        with patch("modules.translator.rag_caller.index_version", return_value="v2"):
+            rebuilt = RagCaller()
+            rebuilt.start_session("t1", cache_dir=tmp.name)
+            rebuilt.retrieve_all("A line", top_k=5)
+        self.assertEqual(self.engine.search_line.call_count, 2)
+        for caller in (self.rag, resumed, rebuilt):
+            caller.result_cache.close()
+
+    def test_slice_fused_result_keeps_entries_ranked_within_k(self):
+        fused = {"ids": ["a", "b", "c"], "documents": ["A", "B", "C"], "metadatas": [{}, {}, {}],
+                 "distances": [0.0, 0.2, 0.4], "best_ranks": [0, 3, 1]}
+        sliced = _slice_result(fused, 2)
+        self.assertEqual(sliced["ids"], ["a", "c"])
+        self.assertEqual(sliced["best_ranks"], [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
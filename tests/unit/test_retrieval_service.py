@@ -0,0 +1,109 @@
+import os
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from modules.rag.filters import SearchConstraints
+from modules.rag.retrieval_service import RetrievalClient, RetrievalService, create_server
+from modules.translator.rag_caller import RagCaller
+
+
+def _chunks(line, top_k):
+    ids = [f"{line[:4]}_{i}" for i in range(top_k)]
+    result = {"ids": ids, "documents": ids, "metadatas": [{"line": i} for i in range(top_k)],
+              "distances": [0.1 * i for i in range(top_k)]}
+    return {"search_chunks": {"line": result, "phrases": [result], "fragments": []}}
+
+
+class TestRetrievalService(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = MagicMock()
+        self.engine.prepare_queries.side_effect = lambda lines: [{"plan": line} for line in lines]
+        self.engine.search_line.side_effect = lambda line, top_k, **kwargs: _chunks(line, top_k)
+        self.engine.hybrid_search.side_effect = lambda line, top_k, **kwargs: _chunks(line, top_k)
+        self.service = RetrievalService(engine=self.engine)
+        self.server = create_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_batch_embeds_once_and_caches_prepared_queries(self):
+        client = RetrievalClient(self.url)
+        constraints = SearchConstraints(max_syllables=6, exclude_proper_nouns=True)
+        results = client.search_many([
+            {"line": "Good morrow", "top_k": 2},
+            {"line": "Farewell now", "top_k": 3, "mode": "hybrid", "constraints": {"max_syllables": 6,
+             "exclude_proper_nouns": True}, "exclude_ids": ["x"]},
+        ])
+        self.assertEqual(len(results[0]["line"]["ids"]), 2)
+        self.assertEqual(len(results[1]["phrases"][0]["ids"]), 3)
+        self.engine.prepare_queries.assert_called_once_with(["Good morrow", "Farewell now"])
+        kwargs = self.engine.hybrid_search.call_args.kwargs
+        self.assertEqual(kwargs["constraints"], constraints)
+        self.assertEqual(kwargs["exclude_ids"], frozenset({"x"}))
+
+        client.search(" Good  morrow ", top_k=1)
+        self.assertEqual(self.engine.prepare_queries.call_count, 1)
+        self.assertEqual(client.health()["prepared_hits"], 1)
+
+    def test_session_sends_only_new_used_ids_and_resyncs(self):
+        client = RetrievalClient(self.url)
+        other = RetrievalClient(self.url)
+        used = {"a", "b"}
+        sent = []
+        search_batch = self.service.search_batch
+        def recording_search_batch(requests, session=None):
+            sent.append(dict(session))
+            return search_batch(requests, session)
+        self.service.search_batch = recording_search_batch
+
+        client.search("Good morrow", exclude_ids=used)
+        other.search("Good morrow", exclude_ids={"z"})
+        used.add("c")
+        client.search("Farewell now", exclude_ids=used)
+
+        self.assertEqual(sent[2]["added"], ["c"])
+        self.assertFalse(sent[2]["reset"])
+        excluded = self.engine.search_line.call_args.kwargs["exclude_ids"]
+        self.assertEqual(excluded, frozenset({"a", "b", "c"}))
+        self.assertEqual(excluded.session_id, client.session_id)
+
+        # A service that lost the session gets the full set again
+        self.service._sessions.clear()
+        used.add("d")
+        client.search("Farewell now", exclude_ids=used)
+        self.assertEqual((sent[3]["added"], sent[3]["reset"]), (["d"], False))
+        self.assertEqual((sent[4]["added"], sent[4]["reset"]), (["a", "b", "c", "d"], True))
+        self.assertEqual(self.engine.search_line.call_args.kwargs["exclude_ids"], frozenset(used))
+
+        # A shrunken set (new translation) resets the session
+        client.search("Good morrow", exclude_ids={"x"})
+        self.assertEqual((sent[5]["added"], sent[5]["reset"]), (["x"], True))
+
+    def test_rag_caller_thin_mode_prefetches_in_one_round_trip(self):
+        rag = RagCaller(service_url=self.url)
+        self.assertIsNone(rag.search_engine)
+
+        rag.prefetch(["Good morrow", "Farewell now"])
+        candidates = rag.retrieve_all("Farewell now", top_k=5)
+
+        self.assertEqual(len(candidates["line"]), 5)
+        self.assertEqual(self.service.stats["batches"], 1)
+        self.assertEqual(self.service.stats["requests"], 2)
+
+    @patch("modules.rag.retrieval_service.load_dotenv")
+    def test_rag_caller_reads_service_url_after_import(self, mock_load_dotenv):
+        with patch.dict(os.environ, {"RETRIEVAL_SERVICE_URL": self.url}):
+            rag = RagCaller()
+
+        mock_load_dotenv.assert_called()
+        self.assertIsNone(rag.search_engine)
+        self.assertEqual(rag.client.port, self.server.server_port)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,7 @@ class TestSearchEngine(unittest.TestCase):
     ):
         # Mocks
         embedder_instance = mock_embedder.return_value
-        embedder_instance.embed_texts.return_value = [[0.1, 0.2]]
+        embedder_instance.embed_texts.return_value = [[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]]
 
         # Phrase and fragment chunkers return 1 chunk each
         mock_phrase_chunker.return_value.chunk_from_line_chunks.return_value = [
@@ -23,10 +23,11 @@ class TestSearchEngine(unittest.TestCase):
             {"text": "frag B", "chunk_id": "f1"}
         ]
 
-        # Vector stores always return this:
-        mock_vector_store.return_value.collection.query.return_value = {
-            "documents": ["mock doc"], "metadatas": ["meta"], "distances": [0.42]
-        }
+        # Vector stores return one normalized result per query vector
+        mock_vector_store.return_value.query_many.side_effect = lambda vectors, n_results, constraints=None, exclude_ids=None: [
+            {"ids": ["id"], "documents": ["mock doc"], "metadatas": [{}], "distances": [0.42]}
+            for _ in vectors
+        ]
 
         # Instantiate engine
         engine = ShakespeareSearchEngine()
@@ -42,7 +43,10 @@ class TestSearchEngine(unittest.TestCase):
         self.assertIn("fragments", result["search_chunks"])
 
         # Check that embedding and chunking were called correctly
-        self.assertGreaterEqual(embedder_instance.embed_texts.call_count, 3)
+        # Line, phrase and fragment are embedded together in one batched request
+        embedder_instance.embed_texts.assert_called_once_with(
+            ["To be or not to be", "phrase A", "frag B"]
+        )
         self.assertEqual(
             len(result["search_chunks"]["phrases"]),
             1,
@@ -54,5 +58,70 @@ class TestSearchEngine(unittest.TestCase):
             "Should return one result per fragment chunk"
         )
 
+    @patch("modules.rag.search_engine.EmbeddingGenerator")
+    @patch("modules.rag.search_engine.VectorStore")
+    @patch("modules.rag.search_engine.PhraseChunker")
+    @patch("modules.rag.search_engine.FragmentChunker")
+    def test_hybrid_search_fuses_bm25_without_extra_embeddings(
+        self, mock_fragment_chunker, mock_phrase_chunker, mock_vector_store, mock_embedder
+    ):
+        embedder_instance = mock_embedder.return_value
+        embedder_instance.embed_texts.side_effect = lambda texts: [[0.1, 0.2] for _ in texts]
+        mock_phrase_chunker.return_value.chunk_from_line_chunks.return_value = [
+            {"text": "phrase A", "chunk_id": "p1"}
+        ]
+        mock_fragment_chunker.return_value.chunk_from_line_chunks.return_value = []
+        mock_vector_store.return_value.query_many.side_effect = lambda vectors, n_results, constraints=None, exclude_ids=None: [
+            {"ids": ["v1", "shared"], "documents": ["vector doc", "shared doc"],
+             "metadatas": [{}, {}], "distances": [0.3, 0.4]}
+            for _ in vectors
+        ]
+        bm25 = MagicMock()
+        bm25.search.return_value = {"ids": ["shared", "b1"], "documents": ["shared doc", "lexical doc"],
+                                    "metadatas": [{}, {}], "distances": [0.0, 0.5]}
+        bm25.search_many.side_effect = lambda queries, top_k, constraints=None, exclude_ids=None: [bm25.search.return_value for _ in queries]
+
+        engine = ShakespeareSearchEngine()
+        engine._bm25_indexes = {"lines": bm25, "phrases": bm25}
+        result = engine.hybrid_search("Sweet love conquers death", top_k=2)
+
+        embedder_instance.embed_texts.assert_called_once_with(["Sweet love conquers death", "phrase A"])
+        # Found by both legs, so it ranks first after fusion
+        self.assertEqual(result["search_chunks"]["line"]["ids"], ["shared", "v1"])
+        self.assertEqual(result["search_chunks"]["line"]["distances"][0], 0.0)
+        phrases = result["search_chunks"]["phrases"]
+        # One fused result for "phrase A", then the whole line's lexical matches
+        self.assertEqual(len(phrases), 2)
+        self.assertEqual(phrases[0]["ids"], ["shared", "v1"])
+        self.assertEqual(phrases[1]["ids"], ["shared", "b1"])
+        bm25.search_many.assert_called_once_with(["Sweet love conquers death", "phrase A"], 2, None, None)
+
+    @patch("modules.rag.search_engine.EmbeddingGenerator")
+    @patch("modules.rag.search_engine.VectorStore")
+    @patch("modules.rag.search_engine.PhraseChunker")
+    @patch("modules.rag.search_engine.FragmentChunker")
+    def test_expand_from_lines_walks_graph_without_queries(
+        self, mock_fragment_chunker, mock_phrase_chunker, mock_vector_store, mock_embedder
+    ):
+        graph = MagicMock()
+        graph.neighbours.side_effect = lambda line_id, level: {
+            ("l1", "phrases"): [("p1", 0.0), ("p2", 0.5)],
+            ("l2", "phrases"): [("p2", 0.1), ("p3", 0.2)],
+        }.get((line_id, level), [])
+        mock_vector_store.return_value.get_by_ids.side_effect = lambda ids: {
+            "ids": list(ids), "documents": [f"doc {i}" for i in ids], "metadatas": [{} for _ in ids]
+        }
+
+        engine = ShakespeareSearchEngine()
+        engine._neighbour_graph = graph
+        expanded = engine.expand_from_lines([("l1", 0.2), ("l2", 0.3)], limit=2, exclude_ids={"p1"})
+
+        self.assertEqual(expanded["phrases"]["ids"], ["p2", "p3"])
+        self.assertAlmostEqual(expanded["phrases"]["distances"][0], 0.4)
+        self.assertEqual(expanded["fragments"]["ids"], [])
+        mock_vector_store.return_value.query_many.assert_not_called()
+        embedder_instance = mock_embedder.return_value
+        embedder_instance.embed_texts.assert_not_called()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from modules.rag import shard_format
+
+
+class TestShardFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.chunks = [
+            {"chunk_id": f"frag_{i}", "text": f"fragment {i}", "title": "Macbeth", "line": i,
+             "embedding": [float(i), 0.5, -1.0]}
+            for i in range(5)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_round_trip_preserves_order_and_fields(self):
+        path = os.path.join(self.tmp_dir, "fragments_shard_1")
+        manifest = shard_format.write_shard(self.chunks, path, collection="fragments")
+
+        self.assertEqual(manifest["count"], 5)
+        self.assertEqual(manifest["dim"], 3)
+        self.assertTrue(shard_format.is_shard(path))
+
+        batches = list(shard_format.iter_shard_batches(path, batch_size=2))
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+        loaded = [chunk for batch in batches for chunk in batch]
+        self.assertEqual(loaded, self.chunks)
+
+    def test_float16_shard_is_smaller_and_close(self):
+        path = os.path.join(self.tmp_dir, "half")
+        shard_format.write_shard(self.chunks, path, dtype="float16")
+        records, matrix = shard_format.read_shard(path)
+
+        self.assertEqual(matrix.dtype, np.float16)
+        self.assertEqual(records[3]["chunk_id"], "frag_3")
+        np.testing.assert_allclose(matrix[3].astype(np.float32), [3.0, 0.5, -1.0], atol=1e-3)
+
+    def test_checksum_mismatch_is_detected(self):
+        path = os.path.join(self.tmp_dir, "corrupt")
+        shard_format.write_shard(self.chunks, path)
+        with open(os.path.join(path, shard_format.CHUNKS_FILE), "a", encoding="utf-8") as f:
+            f.write("\n")
+
+        with self.assertRaises(ValueError):
+            shard_format.read_shard(path)
+
+    def test_list_shards_natural_order_and_legacy_json(self):
+        for n in (10, 2, 1):
+            shard_format.write_shard(self.chunks[:1], os.path.join(self.tmp_dir, f"fragments_shard_{n}"))
+        legacy = os.path.join(self.tmp_dir, "fragments_shard_3.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump(self.chunks, f)
+
+        names = [os.path.basename(p) for p in shard_format.list_shards(self.tmp_dir)]
+        self.assertEqual(names, ["fragments_shard_1", "fragments_shard_2", "fragments_shard_10"])
+        self.assertEqual(shard_format.load_embedded_chunks(legacy), self.chunks)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from modules.chunking import sharded_chunking
+from modules.chunking.chunk_io import ChunkFile
+from modules.chunking.sharded_chunking import chunk_sharded, shift_chunk_id, split_works
+from modules.chunking.unified_pipeline import OUTPUT_FILES, chunk_file
+
+TEMPEST = """THE TEMPEST
+
+ACT I
+SCENE I. On a ship at sea.
+
+MASTER.
+Boatswain!
+
+BOATSWAIN.
+Here, master: what cheer?
+"""
+
+MACBETH = """THE TRAGEDY OF MACBETH
+
+ACT I
+SCENE I. An open Place.
+
+FIRST WITCH.
+When shall we three meet again
+In thunder, lightning, or in rain?
+"""
+
+PREAMBLE = "Prepared from the folio text.\n\n"
+
+
+class TestShardedChunking(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp.name, "ready.txt")
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        self._write_input(PREAMBLE + TEMPEST + "\n" + MACBETH)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write_input(self, text):
+        with open(self.input_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _read_outputs(self, directory):
+        outputs = {}
+        for chunk_type, filename in OUTPUT_FILES.items():
+            outputs[chunk_type] = list(ChunkFile(os.path.join(directory, filename)))
+        return outputs
+
+    def test_split_works_at_titles(self):
+        works = split_works(PREAMBLE + TEMPEST + "\n" + MACBETH)
+        self.assertEqual([w.title for w in works], ["Unknown", "THE TEMPEST", "THE TRAGEDY OF MACBETH"])
+        self.assertTrue(works[2].text.startswith("THE TRAGEDY OF MACBETH"))
+        self.assertEqual(shift_chunk_id("fragment_chunk_3_1", 100), "fragment_chunk_103_1")
+        self.assertEqual(shift_chunk_id("chunk_3", 2), "chunk_5")
+
+    def test_merged_output_matches_single_run_and_reuses_cache(self):
+        single_dir = os.path.join(self.tmp.name, "single")
+        sharded_dir = os.path.join(self.tmp.name, "sharded")
+        chunk_file(self.input_path, single_dir)
+
+        stats = chunk_sharded(self.input_path, sharded_dir, self.cache_dir, workers=2)
+        self.assertEqual((stats["works"], stats["chunked"], stats["cached"]), (3, 3, 0))
+        merged = self._read_outputs(sharded_dir)
+        self.assertEqual(merged, self._read_outputs(single_dir))
+        self.assertEqual([c["chunk_id"] for c in merged["line"]], [f"chunk_{n}" for n in range(1, 6)])
+
+        # Nothing changed: every work comes from the cache and the output is the same
+        stats = chunk_sharded(self.input_path, sharded_dir, self.cache_dir, workers=2)
+        self.assertEqual((stats["chunked"], stats["cached"]), (0, 3))
+        self.assertEqual(self._read_outputs(sharded_dir), merged)
+
+        # Only the edited work is chunked again; ids after it still follow on
+        self._write_input(PREAMBLE + TEMPEST.replace("what cheer?", "what cheer?\nGood, speak to the mariners.")
+                          + "\n" + MACBETH)
+        stats = chunk_sharded(self.input_path, sharded_dir, self.cache_dir, workers=1, prune=True)
+        self.assertEqual((stats["chunked"], stats["cached"]), (1, 2))
+        lines = self._read_outputs(sharded_dir)["line"]
+        self.assertEqual(lines[-1]["chunk_id"], "chunk_6")
+        self.assertEqual(lines[-1]["title"], "THE TRAGEDY OF MACBETH")
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+
+    def test_failed_work_leaves_no_cache_entry(self):
+        def fail_midway(text, writers):
+            writers["line"].write([{"chunk_id": "chunk_1", "text": "Boatswain!"}])
+            raise RuntimeError("parser crashed")
+
+        chunker = MagicMock()
+        chunker.run.side_effect = fail_midway
+        os.makedirs(self.cache_dir)
+        with patch.object(sharded_chunking, "_worker_chunker", chunker):
+            with self.assertRaises(RuntimeError):
+                sharded_chunking._chunk_work(("abc", "THE TEMPEST", TEMPEST, self.cache_dir, 1))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
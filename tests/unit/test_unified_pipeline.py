@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from modules.chunking.chunk_io import ChunkFile
+from modules.chunking.line_chunker import LineChunker
+from modules.chunking.phrase_chunker import PhraseChunker
+from modules.chunking.fragment_chunker import FragmentChunker
+from modules.chunking.text_utils import count_syllables, normalize_quotes
+from modules.chunking.unified_pipeline import OUTPUT_FILES, chunk_file
+
+PLAY_TEXT = """
+THE TRAGEDY OF ROMEO AND JULIET
+
+ACT I
+SCENE I. Verona. A public place.
+
+SAMPSON.
+Gregory, on my word, we’ll not carry coals.
+
+GREGORY.
+No, for then we should be colliers.
+
+SAMPSON.
+I mean, an we be in choler, we'll draw.
+
+GREGORY.
+Ay, while you live, draw your neck out of collar.
+"""
+
+
+class TestUnifiedPipeline(unittest.TestCase):
+
+    def test_single_pass_matches_separate_chunkers(self):
+        line_chunks = LineChunker().chunk_text(PLAY_TEXT)
+        expected = {
+            "line": line_chunks,
+            "phrase": PhraseChunker().chunk_from_line_chunks(line_chunks),
+            "fragment": FragmentChunker().chunk_from_line_chunks(line_chunks),
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, "ready.txt")
+            with open(input_path, 'w', encoding='utf-8') as f:
+                f.write(PLAY_TEXT)
+            # Batches of 3 lines make the last batch a partial one
+            counts = chunk_file(input_path, tmp, batch_size=3)
+
+            for chunk_type, filename in OUTPUT_FILES.items():
+                chunks = ChunkFile(os.path.join(tmp, filename))
+                self.assertEqual(chunks.index["chunk_type"], chunk_type)
+                self.assertEqual(list(chunks), expected[chunk_type])
+                self.assertEqual(len(chunks), counts[chunk_type])
+                chunks.close()
+
+        self.assertEqual(counts["line"], 4)
+        self.assertIn("we'll", expected["line"][0]["text"])
+
+    def test_text_utils(self):
+        self.assertEqual(normalize_quotes("‘Tis “so”"), "'Tis \"so\"")
+        self.assertEqual(count_syllables(","), 0)
+        self.assertEqual(count_syllables("the"), 1)
+        self.assertEqual(count_syllables("Gregory"), 3)
+        self.assertEqual(count_syllables("collide"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import os
 import json
+import tempfile
 from modules.rag.used_map import UsedMap
 
 class TestUsedMap(unittest.TestCase):
@@ -42,5 +43,40 @@ class TestUsedMap(unittest.TestCase):
         new_instance = UsedMap(filepath=self.test_file)
         self.assertTrue(new_instance.was_used("chunk_abc", "test_context"))
 
+class TestUsedChunkIds(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.used_map = UsedMap(storage_dir=self.tmp.name)
+        self.used_map.load("scene1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunk_ids_are_tracked_saved_and_reset(self):
+        self.used_map.mark_used("Hamlet|3|1|56", [0, 5], chunk_id="chunk_12")
+        self.used_map.mark_used("Hamlet|3|1|57", [0, 2])
+        self.assertEqual(set(self.used_map.used_chunk_ids()), {"chunk_12"})
+
+        self.used_map.save()
+        reloaded = UsedMap(storage_dir=self.tmp.name)
+        reloaded.load("scene1")
+        self.assertEqual(set(reloaded.used_chunk_ids()), {"chunk_12"})
+        self.assertTrue(reloaded.was_used("Hamlet|3|1|56", [0, 5]))
+
+        reloaded.reset()
+        self.assertEqual(set(reloaded.used_chunk_ids()), set())
+
+    def test_deduplicated_row_is_excluded_after_all_occurrences(self):
+        self.used_map.mark_used("Hamlet|1|2|10", [0, 2], chunk_id="row_1", provenance_count=2)
+        self.used_map.mark_used("Hamlet|1|2|10", [0, 2], chunk_id="row_1", provenance_count=2)
+        self.assertEqual(set(self.used_map.used_chunk_ids()), set())
+
+        self.used_map.save()
+        reloaded = UsedMap(storage_dir=self.tmp.name)
+        reloaded.load("scene1")
+        reloaded.mark_used("Lear|4|1|3", [5, 7], chunk_id="row_1", provenance_count=2)
+        self.assertEqual(set(reloaded.used_chunk_ids()), {"row_1"})
+
 if __name__ == "__main__":
     unittest.main()
@@ -50,5 +50,46 @@ class TestVectorStore(unittest.TestCase):
         mock_collection.query.assert_called_once()
         self.assertIn("documents", results)
 
+    @patch("modules.rag.vector_store.chromadb.PersistentClient")
+    def test_query_many_sends_one_call_and_normalizes(self, mock_client):
+        mock_collection = MagicMock()
+        mock_collection.query.return_value = {
+            "ids": [["a1", "a2"], ["b1"]],
+            "documents": [["doc a1", "doc a2"], ["doc b1"]],
+            "metadatas": [[{"line": 1}, {"line": 2}], [{"line": 3}]],
+            "distances": [[0.1, 0.2], [0.3]],
+        }
+        mock_client.return_value.get_or_create_collection.return_value = mock_collection
+
+        store = VectorStore()
+        results = store.query_many([[0.1, 0.2], [0.3, 0.4]], n_results=2)
+
+        mock_collection.query.assert_called_once()
+        self.assertEqual(len(mock_collection.query.call_args[1]["query_embeddings"]), 2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["documents"], ["doc a1", "doc a2"])
+        self.assertEqual(results[1]["metadatas"], [{"line": 3}])
+        self.assertEqual(results[1]["distances"], [0.3])
+
+    @patch("modules.rag.vector_store.chromadb.PersistentClient")
+    def test_query_many_overfetches_to_skip_excluded_ids(self, mock_client):
+        ranked = [f"c{i}" for i in range(10)]
+
+        def query(query_embeddings, n_results, include):
+            ids = ranked[:n_results]
+            return {"ids": [ids], "documents": [ids], "metadatas": [[{}] * len(ids)],
+                    "distances": [[float(i) for i in range(len(ids))]]}
+
+        mock_collection = MagicMock()
+        mock_collection.query.side_effect = query
+        mock_client.return_value.get_or_create_collection.return_value = mock_collection
+
+        store = VectorStore()
+        results = store.query_many([[0.1, 0.2]], n_results=2, exclude_ids={"c0", "c1", "c2", "c4"})
+
+        self.assertEqual(results[0]["ids"], ["c3", "c5"])
+        # First fetch (4 rows) came back short, the retry doubled it
+        self.assertEqual([c.kwargs["n_results"] for c in mock_collection.query.call_args_list], [4, 6])
+
 if __name__ == "__main__":
     unittest.main()